@@ -0,0 +1,304 @@
+import os
+import re
+import sys
+import csv
+import json
+import ctypes
+import time
+import shutil
+import threading
+
+
+class AnnotationJournal:
+    """
+    Crash-safe autosave of the annotations of one session.
+
+    Every add, remove, edit, recolour and hide change is appended as a json
+    line to a journal segment as it happens. A writer thread writes
+    the lines in batches and fsyncs them every sync_interval seconds.
+    When the journal holds at least compact_after entries and more
+    than the last snapshot, the state is captured and the writer
+    starts a new segment and writes the snapshot csv next to it, then
+    deletes the older files. snapshot.N.csv holds everything before
+    journal.N.jsonl, so the state can always be rebuilt from the
+    newest snapshot and the segments from there on.
+
+    The snapshot has the columns of an annotation file plus the
+    journal id, kind and hide state of every marking.
+    """
+    sync_interval = 1.0
+    compact_after = 5000
+    snapshot_fields = ['journal id', 'kind', 'hide']
+    file_pattern = re.compile(r'(snapshot|journal)\.(\d+)\.(csv|jsonl)$')
+
+    def __init__(self, session_dir, field_names, get_row, get_markings):
+        self.session_dir = session_dir
+        self.field_names = field_names
+        self.get_row = get_row
+        self.get_markings = get_markings
+        self.ids = {}
+        self.next_id = 0
+        self.num_entries = 0
+        self.snapshot_size = 0
+        self.segment = 0
+        self.unsaved = False
+        self.error = None
+        self.pending = []
+        self.closing = False
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        os.makedirs(session_dir, exist_ok=True)
+        with open(os.path.join(session_dir, 'pid'), 'w') as fo:
+            fo.write(str(os.getpid()))
+        self.journal_file = open(self.get_file('journal', self.segment), 'a', encoding='utf-8')
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    @staticmethod
+    def get_session_dir(autosave_dir):
+        return os.path.join(autosave_dir, '%s-%d' % (time.strftime('%Y%m%d-%H%M%S'), os.getpid()))
+
+    def get_file(self, kind, segment):
+        extension = 'csv' if kind == 'snapshot' else 'jsonl'
+        return os.path.join(self.session_dir, '%s.%06d.%s' % (kind, segment, extension))
+
+    @staticmethod
+    def get_color(marking):
+        return marking.color.red, marking.color.green, marking.color.blue, marking.color.alpha
+
+    def add(self, kind, marking):
+        journal_id = self.next_id
+        self.next_id += 1
+        self.ids[marking] = journal_id
+        row = ['' if value is None else str(value) for value in self.get_row(kind, marking, self.get_color(marking))]
+        self.append({'op': 'add', 'id': journal_id, 'kind': kind, 'row': row, 'hide': marking.hide})
+
+    def add_saved(self, markings):
+        """
+        Take (kind, marking) pairs loaded from a saved file into the journal.
+
+        They are not changes, so they only go into a snapshot and do
+        not make the session unsaved.
+        """
+        for _, marking in markings:
+            self.ids[marking] = self.next_id
+            self.next_id += 1
+        if markings:
+            self.compact()
+
+    def update(self, kind, marking):
+        """
+        Record the new row of a marking that was edited.
+        """
+        journal_id = self.ids.get(marking)
+        if journal_id is not None:
+            row = ['' if value is None else str(value) for value in self.get_row(kind, marking, self.get_color(marking))]
+            self.append({'op': 'update', 'id': journal_id, 'row': row})
+
+    def remove(self, marking):
+        journal_id = self.ids.pop(marking, None)
+        if journal_id is not None:
+            self.append({'op': 'remove', 'id': journal_id})
+
+    def change(self, marking):
+        """
+        Record the colour and hide state of a marking.
+        """
+        journal_id = self.ids.get(marking)
+        if journal_id is not None:
+            self.append({'op': 'change', 'id': journal_id, 'color': self.get_color(marking), 'hide': marking.hide})
+
+    def append(self, entry):
+        with self.lock:
+            self.pending.append(json.dumps(entry) + '\n')
+        self.unsaved = True
+        self.num_entries += 1
+        if self.num_entries >= self.compact_after and self.num_entries > self.snapshot_size:
+            self.compact()
+
+    def compact(self):
+        """
+        Capture the state and let the writer thread save it as a snapshot.
+
+        Only references and the mutable colour and hide values are
+        copied here, the rows are formatted by the writer thread.
+        """
+        state = [(self.ids[marking], kind, marking, self.get_color(marking), marking.hide)
+                 for kind, marking in self.get_markings() if marking in self.ids]
+        with self.lock:
+            self.pending.append(state)
+        self.num_entries = 0
+        self.snapshot_size = len(state)
+        self.wake.set()
+
+    def mark_saved(self):
+        self.unsaved = False
+
+    def close(self):
+        """
+        Write the remaining entries and stop the writer.
+
+        The session is removed when everything has been saved.
+        """
+        with self.lock:
+            self.closing = True
+        self.wake.set()
+        self.thread.join()
+        if not self.unsaved and self.error is None:
+            shutil.rmtree(self.session_dir, ignore_errors=True)
+
+    def run(self):
+        closing = False
+        while not closing:
+            self.wake.wait(self.sync_interval)
+            self.wake.clear()
+            with self.lock:
+                pending, self.pending = self.pending, []
+                closing = self.closing
+            if self.error is not None:
+                continue
+            try:
+                for item in pending:
+                    if isinstance(item, str):
+                        self.journal_file.write(item)
+                    else:
+                        self.sync()
+                        self.write_snapshot(item)
+                self.sync()
+            except OSError as e:
+                self.error = e
+                print("Autosave of annotations failed: %s" % e)
+        self.journal_file.close()
+
+    def sync(self):
+        self.journal_file.flush()
+        os.fsync(self.journal_file.fileno())
+
+    def write_snapshot(self, state):
+        """
+        Start a new journal segment and save the state before it as a snapshot.
+
+        The snapshot is written to a temporary file and renamed, so it
+        is complete or not there at all.
+        """
+        self.journal_file.close()
+        self.segment += 1
+        self.journal_file = open(self.get_file('journal', self.segment), 'a', encoding='utf-8')
+        snapshot_file = self.get_file('snapshot', self.segment)
+        temp_file = snapshot_file + '.tmp'
+        with open(temp_file, 'w', newline='', encoding='utf-8') as csv_file:
+            writer = csv.writer(csv_file, delimiter=',')
+            writer.writerow(self.field_names + self.snapshot_fields)
+            for journal_id, kind, marking, color, hide in state:
+                writer.writerow(self.get_row(kind, marking, color) + [journal_id, kind, hide])
+            csv_file.flush()
+            os.fsync(csv_file.fileno())
+        os.replace(temp_file, snapshot_file)
+        for file in os.listdir(self.session_dir):
+            match = self.file_pattern.match(file)
+            if match and int(match.group(2)) < self.segment:
+                os.remove(os.path.join(self.session_dir, file))
+
+    @staticmethod
+    def is_running(pid):
+        """
+        Check if a process is running. Processes that can not be checked are taken as running.
+        """
+        if sys.platform == 'win32':
+            return AnnotationJournal.is_running_windows(pid)
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except OSError:
+            return True
+        return True
+
+    @staticmethod
+    def is_running_windows(pid):
+        kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+        kernel32.OpenProcess.restype = ctypes.c_void_p
+        process_query_limited_information = 0x1000
+        still_active = 259
+        error_invalid_parameter = 87
+        handle = kernel32.OpenProcess(process_query_limited_information, False, pid)
+        if not handle:
+            # An invalid parameter means there is no process with the pid,
+            # any other error, like access denied, that it can not be checked.
+            return ctypes.get_last_error() != error_invalid_parameter
+        try:
+            exit_code = ctypes.c_ulong()
+            if not kernel32.GetExitCodeProcess(ctypes.c_void_p(handle), ctypes.byref(exit_code)):
+                return True
+            return exit_code.value == still_active
+        finally:
+            kernel32.CloseHandle(ctypes.c_void_p(handle))
+
+    @classmethod
+    def find_sessions(cls, autosave_dir):
+        """
+        Get the sessions left behind by instances that did not close.
+        """
+        if not os.path.isdir(autosave_dir):
+            return []
+        sessions = []
+        for name in sorted(os.listdir(autosave_dir)):
+            session_dir = os.path.join(autosave_dir, name)
+            try:
+                with open(os.path.join(session_dir, 'pid')) as fi:
+                    pid = int(fi.read())
+            except (OSError, ValueError):
+                continue
+            if pid != os.getpid() and not cls.is_running(pid):
+                sessions.append(session_dir)
+        return sessions
+
+    @classmethod
+    def read_session(cls, session_dir, field_names):
+        """
+        Rebuild the rows of a session from its newest snapshot and the journal after it.
+
+        Every row is a dict with the columns of an annotation file and
+        kind and hide. A line cut off by a crash ends its segment.
+        """
+        snapshots = []
+        segments = []
+        for file in os.listdir(session_dir):
+            match = cls.file_pattern.match(file)
+            if match:
+                (snapshots if match.group(1) == 'snapshot' else segments).append((int(match.group(2)), file))
+        rows = {}
+        start = 0
+        if snapshots:
+            start, snapshot_file = max(snapshots)
+            with open(os.path.join(session_dir, snapshot_file), 'r', newline='', encoding='utf-8') as csv_file:
+                for row in csv.DictReader(csv_file):
+                    row['hide'] = row['hide'] == 'True'
+                    rows[int(row.pop('journal id'))] = row
+        for segment, journal_file in sorted(segments):
+            if segment < start:
+                continue
+            with open(os.path.join(session_dir, journal_file), 'r', encoding='utf-8') as fi:
+                for line in fi:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        break
+                    cls.apply_entry(rows, entry, field_names)
+        return list(rows.values())
+
+    @staticmethod
+    def apply_entry(rows, entry, field_names):
+        if entry['op'] == 'add':
+            row = dict(zip(field_names, entry['row']))
+            row.update({'kind': entry['kind'], 'hide': entry['hide']})
+            rows[entry['id']] = row
+        elif entry['op'] == 'remove':
+            rows.pop(entry['id'], None)
+        elif entry['id'] not in rows:
+            return
+        elif entry['op'] == 'update':
+            rows[entry['id']].update(zip(field_names, entry['row']))
+        else:
+            rows[entry['id']].update(zip(('red', 'green', 'blue', 'alpha'), (str(value) for value in entry['color'])))
+            rows[entry['id']]['hide'] = entry['hide']
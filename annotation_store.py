@@ -0,0 +1,268 @@
+import bisect
+from collections import defaultdict
+import numpy as np
+
+
+class DrawItem:
+    """
+    A marking as VideoDrawHandler reads it: [marking, color, hide].
+
+    The values are read from the marking when drawn, so color and hide
+    changes show without rebuilding the draw lists.
+    """
+    __slots__ = ('mark',)
+
+    def __init__(self, mark):
+        self.mark = mark
+
+    def __getitem__(self, idx):
+        return (self.mark.marking, self.mark.color, self.mark.hide)[idx]
+
+    def __len__(self):
+        return 3
+
+    def __iter__(self):
+        return iter((self.mark.marking, self.mark.color, self.mark.hide))
+
+
+class DrawList(list):
+    """
+    The draw items of one kind of marking in one video.
+
+    Items are removed by moving the last item into their place, so
+    adding and removing are O(1) and the list can be handed to
+    VideoDrawHandler as it is.
+    """
+    def __init__(self):
+        super().__init__()
+        self.positions = {}
+
+    def add(self, marking):
+        self.positions[marking] = len(self)
+        self.append(DrawItem(marking))
+
+    def discard(self, marking):
+        idx = self.positions.pop(marking, None)
+        if idx is None:
+            return
+        last = self.pop()
+        if idx < len(self):
+            self[idx] = last
+            self.positions[last.mark] = idx
+
+
+class FrameGrid:
+    """
+    Uniform grid over the markings of one frame for hit testing.
+
+    Coordinates are normalised by the widget size every marking was
+    drawn at, so markings drawn at different window sizes share the
+    grid. A point is put in the cell it is in and a line in every cell
+    it passes through, sampled at a quarter cell.
+    """
+    __slots__ = ('cells', 'marking_cells', 'segments')
+    size = 32
+
+    def __init__(self):
+        self.cells = defaultdict(dict)
+        self.marking_cells = {}
+        self.segments = {}
+
+    def __len__(self):
+        return len(self.marking_cells)
+
+    @staticmethod
+    def get_segment(marking):
+        """
+        Get start and end of a marking normalised to [0, 1], the same point twice for points.
+        """
+        mark = marking.marking
+        if len(mark) == 5:
+            start = end = (mark[0] / mark[2], mark[1] / mark[3])
+        else:
+            start = (mark[0] / mark[4], mark[1] / mark[5])
+            end = (mark[2] / mark[4], mark[3] / mark[5])
+        return np.array(start, dtype=np.float64), np.array(end, dtype=np.float64)
+
+    def get_cell(self, point):
+        return tuple(np.clip((np.asarray(point) * self.size).astype(int), 0, self.size - 1).tolist())
+
+    def add(self, marking):
+        start, end = self.get_segment(marking)
+        num_samples = int(np.ceil(np.abs(end - start).max() * self.size * 4)) + 1
+        samples = start + np.linspace(0, 1, num_samples)[:, np.newaxis] * (end - start)
+        cells = set(map(tuple, np.clip((samples * self.size).astype(int), 0, self.size - 1).tolist()))
+        for cell in cells:
+            self.cells[cell][marking] = None
+        self.marking_cells[marking] = cells
+        self.segments[marking] = np.concatenate((start, end))
+
+    def remove(self, marking):
+        self.segments.pop(marking, None)
+        for cell in self.marking_cells.pop(marking, ()):
+            markings = self.cells[cell]
+            markings.pop(marking, None)
+            if not markings:
+                del self.cells[cell]
+
+    def query(self, point, radius):
+        """
+        Get the markings in the cells within radius (normalised x and y) of point and their segments.
+        """
+        (x0, y0) = self.get_cell(point - radius)
+        (x1, y1) = self.get_cell(point + radius)
+        found = {}
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                found.update(self.cells.get((x, y), {}))
+        markings = list(found)
+        return markings, np.array([self.segments[marking] for marking in markings]).reshape(-1, 4)
+
+
+class AnnotationStore:
+    """
+    All markings, indexed by kind, video, tracker name and video position.
+
+    Every index is a dict used as an ordered set, so markings are
+    added and removed in O(1) and kept in the order they were made,
+    which is the order they are saved in.
+    """
+    kinds = ('points', 'lines')
+
+    def __init__(self):
+        self.markings = {kind: {} for kind in self.kinds}
+        self.kind_of = {}
+        self.by_video = defaultdict(dict)
+        self.by_name = defaultdict(dict)
+        self.by_position = defaultdict(lambda: defaultdict(dict))
+        self.draw_lists = defaultdict(lambda: {kind: DrawList() for kind in self.kinds})
+        self.frame_grids = {}
+        self.sorted_positions = {}
+
+    def __len__(self):
+        return len(self.kind_of)
+
+    def __contains__(self, marking):
+        return marking in self.kind_of
+
+    def __getitem__(self, kind):
+        return list(self.markings[kind])
+
+    def add(self, kind, marking):
+        self.markings[kind][marking] = None
+        self.kind_of[marking] = kind
+        self.by_video[marking.video][marking] = None
+        self.by_name[marking.name][marking] = None
+        position = self.get_position(marking)
+        if position not in self.by_position[marking.video]:
+            self.sorted_positions.pop(marking.video, None)
+        self.by_position[marking.video][position][marking] = None
+        self.frame_grids.setdefault((marking.video, position), FrameGrid()).add(marking)
+        self.draw_lists[marking.video][kind].add(marking)
+
+    def remove(self, marking):
+        kind = self.kind_of.pop(marking, None)
+        if kind is None:
+            return False
+        del self.markings[kind][marking]
+        self.discard(self.by_video, marking.video, marking)
+        self.discard(self.by_name, marking.name, marking)
+        position = self.get_position(marking)
+        positions = self.by_position[marking.video]
+        self.discard(positions, position, marking)
+        if position not in positions:
+            self.sorted_positions.pop(marking.video, None)
+        if not positions:
+            del self.by_position[marking.video]
+        frame_grid = self.frame_grids[(marking.video, position)]
+        frame_grid.remove(marking)
+        if not frame_grid:
+            del self.frame_grids[(marking.video, position)]
+        self.draw_lists[marking.video][kind].discard(marking)
+        return True
+
+    @staticmethod
+    def discard(index, key, marking):
+        markings = index.get(key)
+        if markings is not None:
+            markings.pop(marking, None)
+            if not markings:
+                del index[key]
+
+    @staticmethod
+    def get_position(marking):
+        return int(marking.marking[-1])
+
+    def get_kind(self, marking):
+        return self.kind_of.get(marking)
+
+    def get_by_video(self, video):
+        return list(self.by_video.get(video, ()))
+
+    def get_by_name(self, name):
+        return list(self.by_name.get(name, ()))
+
+    def get_by_position(self, video, start, end=None):
+        """
+        Get the markings of a video with video position (ns) in [start, end], or at start if no end is given.
+        """
+        positions = self.by_position.get(video, {})
+        if end is None:
+            return list(positions.get(int(start), ()))
+        sorted_positions = self.get_positions(video)
+        return [marking for position in sorted_positions[bisect.bisect_left(sorted_positions, start):bisect.bisect_right(sorted_positions, end)]
+                for marking in positions[position]]
+
+    def update(self, marking):
+        """
+        Index a marking again after its coordinates were changed.
+        """
+        frame_grid = self.frame_grids[(marking.video, self.get_position(marking))]
+        frame_grid.remove(marking)
+        frame_grid.add(marking)
+
+    def get_positions(self, video):
+        positions = self.sorted_positions.get(video)
+        if positions is None:
+            positions = sorted(self.by_position.get(video, ()))
+            self.sorted_positions[video] = positions
+        return positions
+
+    def hit_test(self, video, position, tolerance, point, size, radius):
+        """
+        Find the marking nearest to a point on the widget.
+
+        Markings of the video within tolerance (ns) of position are
+        tested. point and radius are in pixels of a widget of the
+        given size. Hidden markings are not drawn, so they are left
+        out. Returns the marking and the distance to its start and
+        end, or None if no marking is within radius.
+        """
+        positions = self.get_positions(video)
+        size = np.asarray(size, dtype=np.float64)
+        point = np.asarray(point, dtype=np.float64)
+        best = None
+        for idx in range(bisect.bisect_left(positions, position - tolerance), bisect.bisect_right(positions, position + tolerance)):
+            markings, segments = self.frame_grids[(video, positions[idx])].query(point / size, radius / size)
+            shown = np.array([not marking.hide for marking in markings], dtype=np.bool_)
+            if not np.all(shown):
+                markings = [marking for marking, is_shown in zip(markings, shown) if is_shown]
+                segments = segments[shown]
+            if not markings:
+                continue
+            start = segments[:, 0:2] * size
+            end = segments[:, 2:4] * size
+            direction = end - start
+            length_squared = np.einsum('ij,ij->i', direction, direction)
+            t = np.clip(np.einsum('ij,ij->i', point - start, direction) / np.where(length_squared > 0, length_squared, 1), 0, 1)
+            distances = np.linalg.norm(start + t[:, np.newaxis] * direction - point, axis=1)
+            i = int(np.argmin(distances))
+            if distances[i] <= radius and (best is None or distances[i] < best[0]):
+                best = (distances[i], markings[i], np.linalg.norm(point - start[i]), np.linalg.norm(point - end[i]))
+        return None if best is None else best[1:]
+
+    def get_draw_lists(self, video):
+        """
+        Get the points and lines draw lists of a video, updated in place as markings are added and removed.
+        """
+        return self.draw_lists[video]
@@ -0,0 +1,275 @@
+import os
+import csv
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from pose_store import PoseStore
+
+
+class CsvLogParser:
+    """
+    Parse DJI flight logs converted to csv into a PoseStore.
+
+    The file is read in chunks of complete lines with the NUL
+    bytes stripped on the fly, so the source file is left
+    untouched. Within a chunk the needed columns are cut out
+    of the raw bytes and converted in bulk by NumPy. Lines with
+    quoted fields fall back to the csv module.
+
+    With jobs other than 1 the chunks are parsed in a process pool,
+    jobs=None using all cores. The default of 1 parses them in
+    this process, as the headless tools already parse one log per
+    process.
+    """
+    time_field = 'CUSTOM.updateTime'
+    float_fields = ('OSD.height [m]', 'GIMBAL.yaw', 'GIMBAL.pitch', 'GIMBAL.roll', 'OSD.latitude', 'OSD.longitude')
+    video_field = 'CUSTOM.isVideo'
+    encoding = 'iso8859_10'
+    number_chars = np.zeros(256, dtype=np.bool_)
+    number_chars[np.frombuffer(b'\x000123456789.-+eE', dtype=np.uint8)] = True
+    word_masks = np.array([(1 << 8 * num_bytes) - 1 for num_bytes in range(9)], dtype=np.uint64)
+
+    def __init__(self, chunk_size=1 << 24, jobs=1):
+        self.chunk_size = chunk_size
+        self.jobs = jobs
+        self.field_idx = None
+        self.num_commas = None
+
+    def parse(self, log_file):
+        columns = [[] for _ in range(len(self.float_fields) + 2)]
+        with open(log_file, 'rb') as fi:
+            header = fi.readline()
+        field_names = next(csv.reader([header.replace(b'\x00', b'').decode(self.encoding).rstrip('\r\n')]), [])
+        self.field_idx = [field_names.index(name) for name in (self.time_field,) + self.float_fields + (self.video_field,)]
+        self.num_commas = header.count(b',')
+        ranges = self.get_chunk_ranges(log_file, len(header))
+        if self.jobs == 1 or len(ranges) < 2:
+            results = [self.parse_range(log_file, chunk_range) for chunk_range in ranges]
+        else:
+            with ProcessPoolExecutor(max_workers=self.jobs) as executor:
+                results = list(executor.map(self.parse_range, [log_file] * len(ranges), ranges))
+        for result in results:
+            for column, values in zip(columns, result):
+                column.append(values)
+        time, height, yaw, pitch, roll, lat, lon, is_video = [np.concatenate(column) if column else [] for column in columns]
+        return PoseStore(time, height, np.radians(yaw), np.radians(pitch), np.radians(roll), lat, lon, is_video)
+
+    def get_chunk_ranges(self, log_file, start):
+        """
+        Split the file from start on into byte ranges of chunk_size or more that end after a newline.
+        """
+        ranges = []
+        size = os.path.getsize(log_file)
+        with open(log_file, 'rb') as fi:
+            while start < size:
+                fi.seek(start + self.chunk_size - 1)
+                fi.readline()
+                end = min(fi.tell(), size)
+                ranges.append((start, end))
+                start = end
+        return ranges
+
+    def parse_range(self, log_file, chunk_range):
+        """
+        Parse the lines in a byte range of the file with the NUL bytes stripped.
+        """
+        start, end = chunk_range
+        with open(log_file, 'rb') as fi:
+            fi.seek(start)
+            data = fi.read(end - start)
+        if not data.endswith(b'\n'):
+            data += b'\n'
+        if data.find(b'\x00') >= 0:
+            data = data.replace(b'\x00', b'')
+        return self.parse_chunk(data)
+
+    def parse_chunk(self, chunk):
+        buffer = np.frombuffer(chunk, dtype=np.uint8)
+        newlines = np.flatnonzero(buffer == ord('\n'))
+        commas = np.flatnonzero(buffer == ord(','))
+        line_starts = np.concatenate(([0], newlines[:-1] + 1))
+        line_ends = newlines - (buffer[np.maximum(newlines - 1, 0)] == ord('\r'))
+        non_empty = line_ends > line_starts
+        line_starts = line_starts[non_empty]
+        line_ends = line_ends[non_empty]
+        first_comma = np.searchsorted(commas, line_starts)
+        regular = np.searchsorted(commas, line_ends) - first_comma == self.num_commas
+        quotes = self.find_all(chunk, b'"')
+        if len(quotes):
+            regular &= np.searchsorted(quotes, line_ends) == np.searchsorted(quotes, line_starts)
+        fields = [self.cut_field(buffer, commas, line_starts[regular], line_ends[regular], first_comma[regular], idx)
+                  for idx in self.field_idx]
+        if not np.all(regular):
+            fields = self.merge_irregular_lines(chunk, line_starts, line_ends, regular, fields)
+        has_time = fields[0][1] > 0
+        if not np.all(has_time):
+            fields = [(chars[has_time], widths[has_time]) for chars, widths in fields]
+        time = self.parse_update_time(self.as_bytes(*fields[0]))
+        values = []
+        valid = np.ones(len(time), dtype=np.bool_)
+        for chars, widths in fields[1:-1]:
+            value, value_valid = self.to_float(chars, widths)
+            values.append(value)
+            valid &= value_valid
+        is_video = fields[-1][1] > 0
+        return [time[valid]] + [value[valid] for value in values] + [is_video[valid]]
+
+    def cut_field(self, buffer, commas, line_starts, line_ends, first_comma, idx):
+        """
+        Cut field number idx out of lines with no quotes.
+
+        Returns the characters as an (N, width) array padded with
+        zeros together with the length of every field. The fields
+        are read as 8 byte words, which is much faster than taking
+        the characters one by one.
+        """
+        if idx == 0:
+            starts = line_starts
+        else:
+            starts = commas[first_comma + idx - 1] + 1
+        if idx == self.num_commas:
+            ends = line_ends
+        else:
+            ends = commas[first_comma + idx]
+        widths = ends - starts
+        num_words = max(-(-int(widths.max()) // 8) if len(widths) else 0, 1)
+        word_offsets = 8 * np.arange(num_words)
+        if len(starts) and int(starts.max()) + 8 * num_words <= len(buffer):
+            words = np.ndarray((len(buffer) - 7,), dtype='<u8', buffer=buffer, strides=(1,))
+            chars = words[starts[:, np.newaxis] + word_offsets]
+            chars &= self.word_masks[np.clip(widths[:, np.newaxis] - word_offsets, 0, 8)]
+            return chars.view(np.uint8), widths
+        offsets = np.arange(8 * num_words)
+        chars = np.take(buffer, starts[:, np.newaxis] + offsets, mode='clip')
+        chars[offsets >= widths[:, np.newaxis]] = 0
+        return chars, widths
+
+    @staticmethod
+    def find_all(chunk, char):
+        """
+        Find a character that is rare in the logs, like the quote.
+
+        Searching with bytes.find is much faster than a full NumPy
+        scan when there are only a few.
+        """
+        positions = []
+        position = chunk.find(char)
+        while position >= 0:
+            positions.append(position)
+            position = chunk.find(char, position + 1)
+        return np.array(positions, dtype=np.int64)
+
+    def merge_irregular_lines(self, chunk, line_starts, line_ends, regular, fields):
+        irregular_lines = [chunk[start:end].decode(self.encoding) for start, end in zip(line_starts[~regular], line_ends[~regular])]
+        rows = list(csv.reader(irregular_lines))
+        merged = []
+        for (chars, widths), idx in zip(fields, self.field_idx):
+            irregular_field = np.array([row[idx].encode(self.encoding) for row in rows], dtype=np.bytes_)
+            width = max(chars.shape[1], irregular_field.dtype.itemsize)
+            merged_chars = np.zeros((len(regular), width), dtype=np.uint8)
+            merged_chars[regular, :chars.shape[1]] = chars
+            merged_chars[~regular, :irregular_field.dtype.itemsize] = irregular_field.view(np.uint8).reshape(len(rows), -1)
+            merged_widths = np.zeros(len(regular), dtype=widths.dtype)
+            merged_widths[regular] = widths
+            merged_widths[~regular] = [len(row[idx].encode(self.encoding)) for row in rows]
+            merged.append((merged_chars, merged_widths))
+        return merged
+
+    @staticmethod
+    def as_bytes(chars, widths):
+        return np.ascontiguousarray(chars).view('S%d' % chars.shape[1]).ravel()
+
+    @staticmethod
+    def to_float(chars, widths):
+        """
+        Convert a column to floats in bulk.
+
+        Fields made of number characters only are converted in one
+        go by NumPy. The rest, including empty fields, go through
+        float() one at a time and are marked as invalid if that fails.
+        """
+        field = CsvLogParser.as_bytes(chars, widths)
+        try:
+            return field.astype(np.float64), np.ones(len(field), dtype=np.bool_)
+        except ValueError:
+            pass
+        plain = np.all(CsvLogParser.number_chars[chars], axis=1) & (widths > 0)
+        values = np.zeros(len(field), dtype=np.float64)
+        valid = np.zeros(len(field), dtype=np.bool_)
+        try:
+            values[plain] = field[plain].astype(np.float64)
+            valid[plain] = True
+        except ValueError:
+            plain[:] = False
+        for i in np.flatnonzero(~plain):
+            try:
+                values[i] = float(field[i])
+                valid[i] = True
+            except ValueError:
+                pass
+        return values, valid
+
+    @staticmethod
+    def parse_update_time(field):
+        """
+        Parse 'YYYY/MM/DD HH:MM:SS[.ffffff]' strings to local time stamps.
+
+        Gives the same result as datetime.strptime(...).timestamp()
+        without creating a datetime object per row.
+        """
+        width = field.dtype.itemsize
+        if len(field) == 0:
+            return np.zeros(0, dtype=np.float64)
+        if width < 19:
+            field = field.astype('S19')
+            width = 19
+        chars = np.ascontiguousarray(field).view(np.uint8).reshape(len(field), width).astype(np.int32)
+        lengths = np.count_nonzero(chars, axis=1)
+        digits = chars - ord('0')
+        separators = {4: '/', 7: '/', 10: ' ', 13: ':', 16: ':'}
+        is_digit = (digits >= 0) & (digits <= 9)
+        ok = (lengths == 19) | ((lengths > 20) & (lengths <= 26))
+        for position in range(19):
+            if position in separators:
+                ok &= chars[:, position] == ord(separators[position])
+            else:
+                ok &= is_digit[:, position]
+        if width > 19:
+            fraction_positions = np.arange(20, width)
+            in_fraction = fraction_positions < lengths[:, np.newaxis]
+            ok &= (lengths == 19) | (chars[:, 19] == ord('.'))
+            ok &= np.all(is_digit[:, 20:] | ~in_fraction, axis=1)
+            fraction = np.sum(np.where(in_fraction, digits[:, 20:], 0) * 10.0 ** -(fraction_positions - 19), axis=1)
+            fraction = np.round(fraction * 1e6) / 1e6
+        else:
+            fraction = np.zeros(len(field))
+        chars = np.where(ok[:, np.newaxis], chars, ord('0'))
+        digits = chars - ord('0')
+
+        def number(start, stop):
+            return np.sum(digits[:, start:stop] * 10 ** np.arange(stop - start - 1, -1, -1), axis=1)
+        years = (number(0, 4) - 1970).astype('M8[Y]')
+        months = (years.astype('M8[M]') + (number(5, 7) - 1).astype('m8[M]'))
+        days = months.astype('M8[D]') + (number(8, 10) - 1).astype('m8[D]')
+        seconds = days.astype(np.int64) * 86400 + number(11, 13) * 3600 + number(14, 16) * 60 + number(17, 19)
+        seconds = np.where(ok, seconds, 0)
+        time = seconds + CsvLogParser.local_utc_offset(seconds) + fraction
+        for i in np.flatnonzero(~ok):
+            time[i] = CsvLogParser.strptime(field[i].decode(CsvLogParser.encoding))
+        return time
+
+    @staticmethod
+    def strptime(update_time):
+        try:
+            return datetime.strptime(update_time, '%Y/%m/%d %H:%M:%S.%f').timestamp()
+        except ValueError:
+            return datetime.strptime(update_time, '%Y/%m/%d %H:%M:%S').timestamp()
+
+    @staticmethod
+    def local_utc_offset(naive_seconds):
+        """
+        Offset to convert naive local seconds to time stamps, following daylight saving time.
+        """
+        hours, inverse = np.unique(naive_seconds // 3600, return_inverse=True)
+        offsets = np.array([(datetime(1970, 1, 1) + timedelta(hours=hour)).timestamp() - hour * 3600 for hour in hours.tolist()])
+        return offsets[inverse.ravel()]
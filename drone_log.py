@@ -1,14 +1,17 @@
 import os
 import sys
 import subprocess
-import csv
 import numpy as np
 from itertools import product
-from datetime import datetime
 from matplotlib.backends.backend_gtk3 import NavigationToolbar2GTK3
 from matplotlib.backends.backend_gtk3agg import FigureCanvasGTK3Agg as FigureCanvas
 from matplotlib.figure import Figure
 from gtk_modules.dialogs import ProgressDialog
+from pose_store import PoseStore
+from csv_log_parser import CsvLogParser
+from log_cache import LogCache
+from srt_telemetry import SrtTelemetry
+from frame_pose_table import FramePoseTable
 import gi
 gi.require_version('Gtk', '3.0')
 from gi.repository import Gtk, GObject
@@ -17,10 +20,15 @@ from gi.repository import Gtk, GObject
 class DroneLog:
     def __init__(self):
         self.log_file = None
-        self.drone_log_data = {}
-        self.log_time_list = []
+        self.log_key = None
+        self.converted_log = None
+        self.log_cache = LogCache()
+        self.pose_store = PoseStore()
+        self.srt_telemetry = None
+        self.video_pose_store = None
+        self.frame_pose_table = None
+        self.frame_rate = None
         self.video_list = []
-        self.plot_list = []
         self.video_start_time = 0
         self.video_lat_lon = None
         self.video_length_difference_to_logfile = 10
@@ -30,9 +38,27 @@ class DroneLog:
 
     def set_video_length(self, video_length):
         self.video_length = video_length
+        self.frame_pose_table = None
+
+    def set_frame_rate(self, frame_rate):
+        self.frame_rate = frame_rate
+        self.frame_pose_table = None
+
+    def set_height_difference(self, height_difference):
+        self.height_difference = height_difference
+        self.build_frame_pose_table()
 
     def set_video_start_time(self, video_start_time):
         self.video_start_time = video_start_time
+        self.build_video_pose_store()
+
+    def set_srt_file(self, srt_file):
+        if srt_file is None:
+            self.srt_telemetry = None
+        else:
+            self.srt_telemetry = SrtTelemetry().parse(srt_file)
+        self.video_pose_store = None
+        self.frame_pose_table = None
 
     def get_csv_log_generator(self, log_file, window):
         progress_dialog = ProgressDialog(window, 'Loading log', 2)
@@ -82,80 +108,46 @@ class DroneLog:
             dialog.destroy()
 
     def convert_log(self, log_file):
-        path = os.path.join('temp', 'drone_log.csv')
+        """
+        Get a txt log ready for parse_log, from the cache or TXTlogToCSVtool.
+        """
+        self.log_file = log_file
+        self.log_key = self.log_cache.get_key(log_file)
+        self.converted_log = self.log_cache.get_converted_log(self.log_key)
+        if self.log_cache.has_pose_store(self.log_key):
+            return
+        self.run_txt_log_to_csv_tool()
+
+    def run_txt_log_to_csv_tool(self):
+        path = self.converted_log
         if os.path.isfile(path):
-            os.remove(path)
+            return
+        temp_path = path + '.%d.tmp' % os.getpid()
         if sys.platform == 'linux':
-            cmd = 'wine drone_log/TXTlogToCSVtool "' + log_file + '" "' + path + '"'
+            cmd = 'wine drone_log/TXTlogToCSVtool "' + self.log_file + '" "' + temp_path + '"'
         else:
-            cmd = 'drone_log\\TXTlogToCSVtool "' + log_file + '" "' + path + '"'
-        self.log_file = log_file
+            cmd = 'drone_log\\TXTlogToCSVtool "' + self.log_file + '" "' + temp_path + '"'
         subprocess.call(cmd, shell=True)
-
-    @staticmethod
-    def remove_null_bytes(log):
-        with open(log, 'rb') as fi:
-            data = fi.read()
-        with open(log, 'wb') as fo:
-            fo.write(data.replace(b'\x00', b''))
+        if os.path.isfile(temp_path):
+            os.replace(temp_path, path)
 
     def parse_log(self, log=None):
-        self.drone_log_data = {}
-        self.log_time_list = []
-        self.video_list = []
-        self.plot_list = []
-        if log is None:
-            log = os.path.join('temp', 'drone_log.csv')
-        self.remove_null_bytes(log)
-        with open(log, encoding='iso8859_10') as csv_file:
-            reader = csv.reader(csv_file, delimiter=',')
-            field_names = reader.__next__()
-            update_time_idx = field_names.index('CUSTOM.updateTime')
-            gimbal_pitch_idx = field_names.index('GIMBAL.pitch')
-            gimbal_yaw_idx = field_names.index('GIMBAL.yaw')
-            gimbal_roll_idx = field_names.index('GIMBAL.roll')
-            height_idx = field_names.index('OSD.height [m]')
-            video_idx = field_names.index('CUSTOM.isVideo')
-            latitude_idx = field_names.index('OSD.latitude')
-            longitude_idx = field_names.index('OSD.longitude')
-            video_start = None
-            video_end = None
-            time = None
-            last_is_video = ''
-            for row in reader:
-                if row[update_time_idx] != '':
-                    try:
-                        time = datetime.strptime(row[update_time_idx], '%Y/%m/%d %H:%M:%S.%f').timestamp()
-                        date_time = datetime.strptime(row[update_time_idx], '%Y/%m/%d %H:%M:%S.%f')
-                    except ValueError:
-                        time = datetime.strptime(row[update_time_idx], '%Y/%m/%d %H:%M:%S').timestamp()
-                        date_time = datetime.strptime(row[update_time_idx], '%Y/%m/%d %H:%M:%S')
-                    try:
-                        height = float(row[height_idx])
-                        pitch = float(row[gimbal_pitch_idx]) * np.pi / 180
-                        yaw = float(row[gimbal_yaw_idx]) * np.pi / 180
-                        roll = float(row[gimbal_roll_idx]) * np.pi / 180
-                        yaw_pitch_roll = (yaw, pitch, roll)
-                        latitude = float(row[latitude_idx])
-                        longitude = float(row[longitude_idx])
-                    except ValueError:
-                        continue
-                    pos = (latitude, longitude)
-                    self.drone_log_data.update({time: (height, yaw_pitch_roll, pos, date_time)})
-                    self.log_time_list.append(time)
-                    self.plot_list.append((float(row[gimbal_yaw_idx]), float(row[gimbal_pitch_idx]), float(row[gimbal_roll_idx]), height))
-                    is_video = row[video_idx]
-                    if is_video and video_start is None:
-                        video_start = time
-                    if not is_video and last_is_video:
-                        video_end = time
-                    if video_start and video_end:
-                        self.video_list.append((video_start, video_end))
-                        video_start = None
-                        video_end = None
-                    last_is_video = is_video
-            if video_start and video_end is None:
-                self.video_list.append((video_start, time))
+        """
+        Load the pose store of a csv log, or of the txt log prepared by convert_log.
+
+        When the cached pose store of a txt log was evicted or can not
+        be loaded, the log is converted again.
+        """
+        if log is not None:
+            self.log_key = self.log_cache.get_key(log)
+        self.pose_store = self.log_cache.load_pose_store(self.log_key)
+        if self.pose_store is None and log is None:
+            self.run_txt_log_to_csv_tool()
+        if self.pose_store is None:
+            self.pose_store = CsvLogParser(jobs=None).parse(log if log is not None else self.converted_log)
+            self.log_cache.save_pose_store(self.log_key, self.pose_store)
+        self.video_list = self.pose_store.get_recordings()
+        self.frame_pose_table = None
 
     def get_video_start_time(self):
         """
@@ -165,6 +157,9 @@ class DroneLog:
         locate the recording with a duration similar to the
         length of the loaded video or a location.
         """
+        if self.srt_telemetry is not None and self.srt_telemetry.has_time():
+            self.get_video_start_time_from_srt()
+            return
         keep_diff = np.inf
         video_start_time = 0
         print('\n      video length: %f' % self.video_length)
@@ -172,7 +167,8 @@ class DroneLog:
             print('    Video location: (%f, %f)' % (self.video_lat_lon[0], self.video_lat_lon[1]))
         for recording in self.video_list:
             if self.video_lat_lon:
-                _, _, pos, _ = self.drone_log_data[recording[0]]
+                idx = self.pose_store.get_nearest_index(recording[0])
+                pos = (self.pose_store.lat[idx], self.pose_store.lon[idx])
                 diff = abs(pos[0] - self.video_lat_lon[0]) + abs(pos[1] - self.video_lat_lon[1])
                 print('recording location: (%f, %f)' % (pos[0], pos[1]))
             else:
@@ -184,44 +180,98 @@ class DroneLog:
                 keep_diff = diff
         self.video_start_time = video_start_time
         self.video_length_difference_to_logfile = keep_diff
+        self.build_video_pose_store()
+        self.show_warning_if_video_and_log_does_not_match()
+
+    def get_video_start_time_from_srt(self):
+        """
+        Get start time of the loaded video from the time stamps in its SRT file.
+
+        The difference to the log file is how many seconds of the
+        video are outside the log, all of it if the log is empty.
+        """
+        self.video_start_time = self.srt_telemetry.get_video_start_time()
+        print('\n    video start time from SRT file: %f' % self.video_start_time)
+        video_end_time = self.video_start_time + self.video_length
+        if len(self.pose_store) > 0:
+            self.video_length_difference_to_logfile = (max(self.pose_store.time[0] - self.video_start_time, 0) +
+                                                       max(video_end_time - self.pose_store.time[-1], 0))
+        else:
+            self.video_length_difference_to_logfile = self.video_length
+        self.build_video_pose_store()
         self.show_warning_if_video_and_log_does_not_match()
 
-    def get_data(self, time):
-        diff = np.Inf
-        height = None
-        rotation = None
-        pos = None
-        date_time = None
-        for time_stamp, height_and_rotation_and_pos_and_time in self.drone_log_data.items():
-            t = time_stamp - self.video_start_time
-            d = abs(time - t)
-            if d < diff:
-                height = (height_and_rotation_and_pos_and_time[0] + self.height_difference)
-                rotation = height_and_rotation_and_pos_and_time[1]
-                pos = height_and_rotation_and_pos_and_time[2]
-                date_time = height_and_rotation_and_pos_and_time[3]
-                diff = d
-        return height, rotation, pos, date_time
+    def build_video_pose_store(self):
+        """
+        Build the pose store of the SRT file, with the values missing from it filled in from the log.
+
+        Without samples in the log the SRT file is not used, as the
+        missing values would stay NaN.
+        """
+        if self.srt_telemetry is None or len(self.srt_telemetry.video_time) == 0 or len(self.pose_store) == 0:
+            self.video_pose_store = None
+        else:
+            self.video_pose_store = self.srt_telemetry.get_pose_store(self.video_start_time, self.pose_store)
+        self.build_frame_pose_table()
+
+    def build_frame_pose_table(self):
+        """
+        Look up the pose of every frame of the video, when both video and log are open.
+        """
+        if self.frame_rate is None or self.video_length <= 0 or len(self.get_pose_store()) == 0:
+            self.frame_pose_table = None
+            return
+        self.frame_pose_table = FramePoseTable.build(self, self.frame_rate, int(round(self.video_length * self.frame_rate)))
+
+    def get_pose_store(self):
+        if self.video_pose_store is not None:
+            return self.video_pose_store
+        return self.pose_store
+
+    def get_data_array(self, times, interpolate=False):
+        """
+        Get drone data for an array of video times in seconds.
+
+        Returns arrays of height (N), yaw/pitch/roll (N, 3) and
+        lat/lon (N, 2), optionally interpolated between samples.
+        """
+        log_times = np.asarray(times, dtype=np.float64) + self.video_start_time
+        height, rotation, pos = self.get_pose_store().get_poses(log_times, interpolate)
+        return height + self.height_difference, rotation, pos
+
+    def get_data(self, time, interpolate=False):
+        if self.frame_pose_table is not None and not interpolate:
+            data = self.frame_pose_table.get_data(time)
+            if data is not None:
+                return data
+        pose_store = self.get_pose_store()
+        if len(pose_store) == 0:
+            return None, None, None, None
+        height, rotation, pos = self.get_data_array(np.array([time]), interpolate)
+        idx = pose_store.get_nearest_index(time + self.video_start_time)
+        date_time = pose_store.get_date_time(idx)
+        return float(height[0]), tuple(rotation[0].tolist()), tuple(pos[0].tolist()), date_time
 
     def plot_log_data(self):
         self.plot_win = PlotWindow()
         self.plot_win.connect('click_on_plot', self._update_video_start_time)
-        self.plot_win.plot(self.log_time_list, self.plot_list, self.video_list)
+        self.plot_win.plot(self.pose_store, self.video_list)
         self.update_video_plot()
 
     def update_video_plot(self):
-        self.plot_win.update_video_length_plot(self.video_start_time - self.log_time_list[0], self.video_length)
+        self.plot_win.update_video_length_plot(self.video_start_time - self.pose_store.time[0], self.video_length)
         self.update_plot(0)
 
     def update_plot(self, time):
         if self.plot_win:
-            self.plot_win.update_plot(time + self.video_start_time - self.log_time_list[0])
+            self.plot_win.update_plot(time + self.video_start_time - self.pose_store.time[0])
 
     def update_video_start_time(self, video_start_time):
         self._update_video_start_time(None, video_start_time)
 
     def _update_video_start_time(self, _, video_start_time):
-        self.video_start_time = video_start_time + self.log_time_list[0]
+        self.video_start_time = video_start_time + self.pose_store.time[0]
+        self.build_video_pose_store()
         if self.plot_win:
             self.plot_win.update_video_length_plot(video_start_time, self.video_length)
             self.update_plot(0)
@@ -231,7 +281,18 @@ class NavigationToolbar(NavigationToolbar2GTK3):
     # Only display the buttons we need
     toolitems = [t for t in NavigationToolbar2GTK3.toolitems if
                  t[0] in ('Home', 'Zoom', 'Save', 'Back', 'Forward')]
-    pass
+
+    def save_figure(self, *args):
+        # The cursors are animated to be blitted, which leaves them out of saved figures
+        animated = self.canvas.figure.findobj(lambda artist: artist.get_animated())
+        for artist in animated:
+            artist.set_animated(False)
+        try:
+            return super().save_figure(*args)
+        finally:
+            for artist in animated:
+                artist.set_animated(True)
+            self.canvas.draw_idle()
 
 
 class PlotWindow(Gtk.Window):
@@ -246,6 +307,7 @@ class PlotWindow(Gtk.Window):
         self.f = Figure(figsize=(5, 4), dpi=100)
         self.canvas = FigureCanvas(self.f)
         self.f.canvas.mpl_connect('pick_event', self.on_pick)
+        self.f.canvas.mpl_connect('draw_event', self.on_draw)
         vbox = Gtk.VBox()
         self.add(vbox)
         vbox.pack_start(self.canvas, True, True, 0)
@@ -260,55 +322,112 @@ class PlotWindow(Gtk.Window):
         self.height_time = None
         self.start_time_stamp = None
         self.video_list = None
+        self.background = None
+        self.series = []
         self.show_all()
 
     def on_destroy(self, *_):
         self.window_closed = True
 
-    def plot(self, time_stamps, data, video_list):
+    def plot(self, pose_store, video_list):
         self.video_list = video_list
-        self.start_time_stamp = time_stamps[0]
-        time = [t - time_stamps[0] for t in time_stamps]
-        yaw, pitch, roll, height = zip(*data)
+        self.start_time_stamp = pose_store.time[0]
+        time = pose_store.time - self.start_time_stamp
         self.axarr = self.f.subplots(nrows=2, ncols=2)
-        self.plot_yaw(self.axarr, yaw, time)
-        self.plot_pitch(self.axarr, pitch, time)
-        self.plot_roll(self.axarr, roll, time)
-        self.plot_height(self.axarr, height, time)
+        self.plot_yaw(self.axarr, np.degrees(pose_store.yaw), time)
+        self.plot_pitch(self.axarr, np.degrees(pose_store.pitch), time)
+        self.plot_roll(self.axarr, np.degrees(pose_store.roll), time)
+        self.plot_height(self.axarr, pose_store.height, time)
+        self.canvas.mpl_connect('resize_event', self.on_resize)
+
+    @staticmethod
+    def decimate(time, values, x_range, num_bins):
+        """
+        Reduce a series to the min and max of num_bins time bins over x_range.
+
+        Drawing the min and max of every pixel column gives the same
+        envelope as drawing all samples. The samples just outside the
+        range are kept, so the line reaches the edges.
+        """
+        start = max(np.searchsorted(time, x_range[0], 'left') - 1, 0)
+        end = min(np.searchsorted(time, x_range[1], 'right') + 1, len(time))
+        time = time[start:end]
+        values = values[start:end]
+        if len(time) <= 2 * num_bins:
+            return time, values
+        edges = np.unique(np.searchsorted(time, np.linspace(time[0], time[-1], num_bins + 1)[:-1]))
+        decimated_time = np.append(np.repeat(time[edges], 2), time[-1])
+        decimated_values = np.empty(2 * len(edges) + 1)
+        decimated_values[0:-1:2] = np.fmin.reduceat(values, edges)
+        decimated_values[1:-1:2] = np.fmax.reduceat(values, edges)
+        decimated_values[-1] = values[-1]
+        return decimated_time, decimated_values
+
+    def add_series(self, ax, values, time, wrap=None):
+        """
+        Plot a series through decimation of the visible x-range.
+
+        With wrap given, the series is also drawn shifted by every
+        multiple of wrap that puts it inside the visible y-range.
+        """
+        line, = ax.plot(*self.get_series_data(ax, time, values, wrap, (time[0], time[-1])), 'blue')
+        self.series.append((ax, line, time, values, wrap))
+        ax.callbacks.connect('xlim_changed', self.on_lim_changed)
+        if wrap is not None:
+            ax.callbacks.connect('ylim_changed', self.on_lim_changed)
+
+    def get_series_data(self, ax, time, values, wrap, x_range=None):
+        if x_range is None:
+            x_range = ax.get_xlim()
+        num_bins = max(int(ax.bbox.width), 100)
+        decimated_time, decimated_values = self.decimate(time, values, x_range, num_bins)
+        if wrap is None or len(decimated_values) == 0:
+            return decimated_time, decimated_values
+        y_range = sorted(ax.get_ylim())
+        first = int(np.ceil((y_range[0] - np.nanmax(decimated_values)) / wrap))
+        last = int(np.floor((y_range[1] - np.nanmin(decimated_values)) / wrap))
+        offsets = np.arange(first, last + 1) * wrap
+        copies = decimated_values + offsets[:, np.newaxis]
+        copies = np.hstack((copies, np.full((len(offsets), 1), np.nan)))
+        copy_time = np.tile(np.append(decimated_time, np.nan), len(offsets))
+        return copy_time, copies.ravel()
+
+    def update_series(self, axes=None):
+        for ax, line, time, values, wrap in self.series:
+            if axes is None or ax is axes:
+                line.set_data(*self.get_series_data(ax, time, values, wrap))
+
+    def on_lim_changed(self, ax):
+        self.update_series(ax)
+
+    def on_resize(self, _):
+        self.update_series()
 
     @staticmethod
     def shift_yaw(yaw):
-        new_yaw = []
-        last_point = 0
-        shift = 0
-        for point in yaw:
-            if (last_point > 150 and point < -150) or (last_point < -150 and point > 150):
-                if point < 0:
-                    shift += 360
-                else:
-                    shift -= 360
-            new_point = point + shift
-            last_point = point
-            new_yaw.append(new_point)
-        return new_yaw
+        """
+        Unwrap the yaw where it jumps between above 150 and below -150 degrees.
+        """
+        yaw = np.asarray(yaw, dtype=np.float64)
+        last = np.concatenate(([0], yaw[:-1]))
+        shifts = np.where((last > 150) & (yaw < -150), 360, 0) - np.where((last < -150) & (yaw > 150), 360, 0)
+        return yaw + np.cumsum(shifts)
 
     def plot_yaw(self, axarr, yaw, time):
         new_yaw = self.shift_yaw(yaw)
-        for offset in range(-10 * 360, 10 * 360 + 1, 360):
-            yaw_with_offset = [x + offset for x in new_yaw]
-            axarr[0, 0].plot(time, yaw_with_offset, 'blue')
         axarr[0, 0].set_ylim([-200, 200])
+        self.add_series(axarr[0, 0], new_yaw, time, wrap=360)
         axarr[0, 0].set_xlim([0, time[-1]])
         axarr[0, 0].set_xlabel('Seconds')
         axarr[0, 0].set_ylabel('Degrees')
         axarr[0, 0].xaxis.set_ticks(np.arange(0, time[-1], 60))
         for video in self.video_list:
             axarr[0, 0].axvspan(xmin=video[0] - self.start_time_stamp, xmax=video[1] - self.start_time_stamp, color='#bbbbbb', picker=1)
-        self.yaw_time = axarr[0, 0].axvline(x=0, color='red', linewidth=2)
+        self.yaw_time = axarr[0, 0].axvline(x=0, color='red', linewidth=2, animated=True)
         axarr[0, 0].set_title('Yaw')
 
     def plot_pitch(self, axarr, pitch, time):
-        axarr[0, 1].plot(time, pitch, 'blue')
+        self.add_series(axarr[0, 1], pitch, time)
         axarr[0, 1].set_ylim([-100, 30])
         axarr[0, 1].set_xlim([0, time[-1]])
         axarr[0, 1].set_xlabel('Seconds')
@@ -316,11 +435,11 @@ class PlotWindow(Gtk.Window):
         axarr[0, 1].xaxis.set_ticks(np.arange(0, time[-1], 60))
         for video in self.video_list:
             axarr[0, 1].axvspan(xmin=video[0] - self.start_time_stamp, xmax=video[1] - self.start_time_stamp, color='#bbbbbb', picker=1)
-        self.pitch_time = axarr[0, 1].axvline(x=0, color='red', linewidth=2)
+        self.pitch_time = axarr[0, 1].axvline(x=0, color='red', linewidth=2, animated=True)
         axarr[0, 1].set_title('Pitch')
 
     def plot_roll(self, axarr, roll, time):
-        axarr[1, 1].plot(time, roll, 'blue')
+        self.add_series(axarr[1, 1], roll, time)
         axarr[1, 1].set_ylim([-180, 180])
         axarr[1, 1].set_xlim([0, time[-1]])
         axarr[1, 1].set_xlabel('Seconds')
@@ -328,11 +447,11 @@ class PlotWindow(Gtk.Window):
         axarr[1, 1].xaxis.set_ticks(np.arange(0, time[-1], 60))
         for video in self.video_list:
             axarr[1, 1].axvspan(xmin=video[0] - self.start_time_stamp, xmax=video[1] - self.start_time_stamp, color='#bbbbbb', picker=1)
-        self.roll_time = axarr[1, 1].axvline(x=0, color='red', linewidth=2)
+        self.roll_time = axarr[1, 1].axvline(x=0, color='red', linewidth=2, animated=True)
         axarr[1, 1].set_title('Roll')
 
     def plot_height(self, axarr, height, time):
-        axarr[1, 0].plot(time, height, 'blue')
+        self.add_series(axarr[1, 0], height, time)
         axarr[1, 0].set_xlim([0, time[-1]])
         axarr[1, 0].set_xlabel('Seconds')
         axarr[1, 0].set_ylabel('Meters')
@@ -340,23 +459,51 @@ class PlotWindow(Gtk.Window):
         ylim = axarr[1, 0].get_ylim()
         for video in self.video_list:
             axarr[1, 0].axvspan(xmin=video[0] - self.start_time_stamp, xmax=video[1] - self.start_time_stamp, color='#bbbbbb', picker=1)
-        self.height_time = axarr[1, 0].axvline(x=0, color='red', linewidth=2)
+        self.height_time = axarr[1, 0].axvline(x=0, color='red', linewidth=2, animated=True)
         axarr[1, 0].set_ylim(ylim)
         axarr[1, 0].set_title('Height')
 
+    def get_animated_artists(self):
+        return [self.yaw_time, self.pitch_time, self.roll_time, self.height_time] + [plot for plot in self.video_length_plots if plot]
+
+    def on_draw(self, event):
+        """
+        Save the background after a full draw and draw the cursors on it.
+
+        Full draws happen after zoom, pan and resize, so the background
+        always matches the axes.
+        """
+        if event.canvas is not self.canvas or self.yaw_time is None:
+            return
+        self.background = self.canvas.copy_from_bbox(self.f.bbox)
+        self.draw_animated()
+
+    def draw_animated(self):
+        for artist in self.get_animated_artists():
+            artist.axes.draw_artist(artist)
+
     def update_plot(self, time):
-        self.yaw_time.set_xdata(time)
-        self.pitch_time.set_xdata(time)
-        self.roll_time.set_xdata(time)
-        self.height_time.set_xdata(time)
-        self.canvas.draw()
+        """
+        Move the cursors by blitting them on the saved background.
+        """
+        self.yaw_time.set_xdata([time, time])
+        self.pitch_time.set_xdata([time, time])
+        self.roll_time.set_xdata([time, time])
+        self.height_time.set_xdata([time, time])
+        if self.background is None:
+            self.canvas.draw()
+        else:
+            self.canvas.restore_region(self.background)
+            self.draw_animated()
+            self.canvas.blit(self.f.bbox)
         self.canvas.flush_events()
 
     def update_video_length_plot(self, video_start, video_length):
         for plot in self.video_length_plots:
             if plot:
                 plot.remove()
-        self.video_length_plots = [self.axarr[x, y].axvspan(xmin=video_start, xmax=video_start + video_length, ymin=0, ymax=0.1, color='#99ff99') for x, y in product(range(2), range(2))]
+        self.video_length_plots = [self.axarr[x, y].axvspan(xmin=video_start, xmax=video_start + video_length, ymin=0, ymax=0.1, color='#99ff99',
+                                                            animated=True) for x, y in product(range(2), range(2))]
 
     def on_pick(self, event):
         video_start = np.min(event.artist.get_xy(), axis=0)[0]
@@ -1,14 +1,27 @@
 import csv
+import time
 import numpy as np
 import scipy.io as sio
 import utm
 import cv2
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 
 
 class Fov:
+    horizon_cache_size = 256
+    angle_quantum = 1e-4
+    undistortion_step = 8
+    utm_zone_letters = 'CDEFGHJKLMNPQRSTUVWXX'
+
     def __init__(self):
         self.image_size = None
+        self.image_size_key = None
+        self.horizon_cache = OrderedDict()
+        self.horizon_projected = 0
+        self.horizon_cached = 0
+        self.horizon_projection_time = 0
+        self.undistortion_table = None
+        self.undistortion_grid = None
         self.horizontal_fov = None
         self.vertical_fov = None
         self.camera_matrix = None
@@ -17,15 +30,66 @@ class Fov:
         self.dist_coefficients = None
 
     def set_image_size(self, width, height):
+        if self.image_size_key == (width, height):
+            return
+        self.image_size_key = (width, height)
         if self.camera_matrix is not None:
-            corners = np.array([[[0, 0], [width, 0], [width, height], [0, height]]], dtype=np.float32)
-            undist_corners = cv2.undistortPoints(corners, self.camera_matrix, self.dist_coefficients, P=self.camera_matrix)[0]
+            self.build_undistortion_table(width, height)
+            undist_corners = self.undistort_points(np.array([[0, 0], [width, 0], [width, height], [0, height]], dtype=np.float64))
             w = (undist_corners[1][0] - undist_corners[0][0] + undist_corners[2][0] - undist_corners[3][0]) / 2
             h = (undist_corners[3][1] - undist_corners[0][1] + undist_corners[2][1] - undist_corners[1][1]) / 2
             self.image_size = (w, h)
         else:
+            self.undistortion_table = None
             self.image_size = (width, height)
 
+    def build_undistortion_table(self, width, height):
+        """
+        Undistort a grid of points covering the image once, for bilinear lookup later.
+
+        tests/test_fov.py checks that the lookup matches
+        cv2.undistortPoints within 0.05 pixels.
+        """
+        x = np.linspace(0, width, int(np.ceil(width / self.undistortion_step)) + 1)
+        y = np.linspace(0, height, int(np.ceil(height / self.undistortion_step)) + 1)
+        grid = np.stack(np.meshgrid(x, y), axis=-1)
+        self.undistortion_grid = (x, y)
+        self.undistortion_table = np.ascontiguousarray(np.moveaxis(self.undistort_points_cv2(grid.reshape(-1, 2)).reshape(grid.shape), -1, 0))
+
+    def undistort_points_cv2(self, image_points):
+        image_points = np.asarray(image_points, dtype=np.float32).reshape(-1, 1, 2)
+        return cv2.undistortPoints(image_points, self.camera_matrix, self.dist_coefficients, P=self.camera_matrix).reshape(-1, 2).astype(np.float64)
+
+    def undistort_points(self, image_points):
+        """
+        Undistort an (N, 2) array of image points by bilinear lookup in the undistortion table.
+
+        Points outside the image are undistorted by OpenCV.
+        """
+        image_points = np.asarray(image_points, dtype=np.float64).reshape(-1, 2)
+        if self.undistortion_table is None:
+            return self.undistort_points_cv2(image_points)
+        x, y = self.undistortion_grid
+        fx = image_points[:, 0] / (x[1] - x[0])
+        fy = image_points[:, 1] / (y[1] - y[0])
+        inside = (fx >= 0) & (fx <= len(x) - 1) & (fy >= 0) & (fy <= len(y) - 1)
+        col = np.minimum(np.maximum(fx, 0).astype(np.intp), len(x) - 2)
+        row = np.minimum(np.maximum(fy, 0).astype(np.intp), len(y) - 2)
+        wx = fx - col
+        wy = fy - row
+        idx = row * len(x) + col
+        undist_points = np.empty_like(image_points)
+        for axis, table in enumerate(self.undistortion_table):
+            table = table.ravel()
+            top_left = table[idx]
+            top = top_left + (table[idx + 1] - top_left) * wx
+            bottom_left = table[idx + len(x)]
+            bottom = bottom_left + (table[idx + len(x) + 1] - bottom_left) * wx
+            undist_points[:, axis] = top + (bottom - top) * wy
+        if not np.all(inside):
+            undist_points[~inside] = self.undistort_points_cv2(image_points[~inside])
+        return undist_points
+
     def set_fov_from_file(self, fov_file):
         with open(fov_file, 'r') as csv_file:
             reader = csv.reader(csv_file, delimiter=',')
@@ -35,6 +99,7 @@ class Fov:
             row = reader.__next__()
             self.horizontal_fov = (float(row[horizontal_fov_idx])) * np.pi / 180
             self.vertical_fov = (float(row[vertical_fov_idx])) * np.pi / 180
+        self.horizon_cache.clear()
 
     def set_camera_params(self, mat_file):
         mat_contents = sio.loadmat(mat_file, squeeze_me=True)
@@ -42,10 +107,13 @@ class Fov:
         if self.camera_matrix[0, 2] == 0:
             self.camera_matrix = np.transpose(self.camera_matrix)
         self.dist_coefficients = np.append(mat_contents['dist_coeff'], [0, 0])
+        self.image_size_key = None
+        self.horizon_cache.clear()
 
     def set_fov(self, horizontal_fov, vertical_fov):
         self.horizontal_fov = horizontal_fov * np.pi / 180
         self.vertical_fov = vertical_fov * np.pi / 180
+        self.horizon_cache.clear()
 
     @staticmethod
     def roll(roll):
@@ -62,64 +130,147 @@ class Fov:
     def rotation(self, yaw, pitch, roll):
         return np.matmul(self.yaw(yaw), np.matmul(self.pitch(pitch), self.roll(roll)))
 
+    @staticmethod
+    def rotations(yaw, pitch, roll):
+        """
+        Rotation matrices (N, 3, 3) for arrays of yaw, pitch and roll, same as rotation.
+        """
+        zeros = np.zeros_like(yaw)
+        ones = np.ones_like(yaw)
+        yaw_matrices = np.stack([np.cos(yaw), -np.sin(yaw), zeros, np.sin(yaw), np.cos(yaw), zeros, zeros, zeros, ones], axis=-1).reshape(-1, 3, 3)
+        pitch_matrices = np.stack([ones, zeros, zeros, zeros, np.cos(pitch), -np.sin(pitch), zeros, np.sin(pitch), np.cos(pitch)], axis=-1).reshape(-1, 3, 3)
+        roll_matrices = np.stack([np.cos(roll), zeros, np.sin(roll), zeros, ones, zeros, -np.sin(roll), zeros, np.cos(roll)], axis=-1).reshape(-1, 3, 3)
+        return np.matmul(yaw_matrices, np.matmul(pitch_matrices, roll_matrices))
+
     def get_unit_vector(self, image_point):
+        return self.get_unit_vectors(np.array([image_point]))[0]
+
+    def get_unit_vectors(self, image_points):
+        image_points = np.asarray(image_points, dtype=np.float64).reshape(-1, 2)
         if self.camera_matrix is not None:
-            undist_point = cv2.undistortPoints(np.array([[image_point]], dtype=np.float32), self.camera_matrix, self.dist_coefficients, P=self.camera_matrix)[0][0]
+            undist_points = self.undistort_points(image_points)
         else:
-            undist_point = image_point
+            undist_points = image_points
         image_center = np.array([self.image_size[0]/2, self.image_size[1]/2])
-        image_point_from_center = undist_point - image_center
+        image_points_from_center = undist_points - image_center
         image_plane_width_in_meters = np.tan(self.horizontal_fov/2)*2
         image_plane_height_in_meters = np.tan(self.vertical_fov/2)*2
-        x = image_point_from_center[0] / self.image_size[0] * image_plane_width_in_meters
-        y = 1
-        z = - image_point_from_center[1] / self.image_size[1] * image_plane_height_in_meters
-        vector = np.array([x, y, z])
-        return vector
+        x = image_points_from_center[:, 0] / self.image_size[0] * image_plane_width_in_meters
+        y = np.ones(len(image_points_from_center))
+        z = - image_points_from_center[:, 1] / self.image_size[1] * image_plane_height_in_meters
+        vectors = np.stack((x, y, z), axis=-1)
+        return vectors
 
     @staticmethod
     def grouped(iterable, n):
         return zip(*[iter(iterable)] * n)
 
     def get_horizon_and_world_corners(self, world_point_dict, yaw_pitch_roll):
+        """
+        Project the horizon lines to image line segments for a drone rotation.
+
+        The angles are rounded to angle_quantum and the result is kept
+        in a small LRU cache, so redrawing a paused frame or scrubbing
+        over the same frames does not project the lines again. The
+        time spent projecting is counted, see get_horizon_counters.
+        """
+        start_time = time.perf_counter()
+        yaw_pitch_roll = tuple(np.round(np.asarray(yaw_pitch_roll, dtype=np.float64) / self.angle_quantum).astype(np.int64).tolist())
+        key = (id(world_point_dict), yaw_pitch_roll, self.image_size)
+        image_points = self.horizon_cache.get(key)
+        if image_points is not None:
+            self.horizon_cache.move_to_end(key)
+            self.horizon_cached += 1
+            self.horizon_projection_time += time.perf_counter() - start_time
+            return image_points
+        image_points = self.project_horizon(world_point_dict, np.array(yaw_pitch_roll) * self.angle_quantum)
+        self.horizon_projected += 1
+        self.horizon_projection_time += time.perf_counter() - start_time
+        self.horizon_cache[key] = image_points
+        if len(self.horizon_cache) > self.horizon_cache_size:
+            self.horizon_cache.popitem(last=False)
+        return image_points
+
+    def get_horizon_counters(self):
+        """
+        Get the horizon frames projected and taken from the cache, and the mean time per frame in milliseconds.
+        """
+        num_frames = self.horizon_projected + self.horizon_cached
+        return {'projected': self.horizon_projected, 'cached': self.horizon_cached,
+                'mean time [ms]': 1000 * self.horizon_projection_time / num_frames if num_frames else 0}
+
+    def project_horizon(self, world_point_dict, yaw_pitch_roll):
+        """
+        Project all line segments of all horizon lines in one go.
+
+        The points of every line are taken in pairs, and a segment is
+        only drawn when both its points are in front of the camera.
+        """
         image_plane_width_in_meters = np.tan(self.horizontal_fov / 2) * 2
         image_plane_height_in_meters = np.tan(self.vertical_fov / 2) * 2
         yaw_pitch_roll = (-yaw_pitch_roll[0], yaw_pitch_roll[1], yaw_pitch_roll[2])
         rotation_matrix = self.rotation(*yaw_pitch_roll)
+        directions = list(world_point_dict.keys())
+        segments = []
+        for world_points in world_point_dict.values():
+            world_points = np.asarray(world_points, dtype=np.float64).reshape(-1, 3)
+            segments.append(world_points[:len(world_points) // 2 * 2].reshape(-1, 2, 3))
+        direction_idx = np.repeat(np.arange(len(directions)), [len(segment) for segment in segments])
+        segments = np.concatenate(segments) if segments else np.zeros((0, 2, 3))
+        rotated_segments = np.matmul(segments, rotation_matrix)
+        visible = np.all(rotated_segments[:, :, 1] >= 0, axis=1)
+        rotated_segments = rotated_segments[visible]
+        direction_idx = direction_idx[visible]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rotated_segments = rotated_segments / rotated_segments[:, :, 1:2]
+        image_point_x = rotated_segments[:, :, 0] / image_plane_width_in_meters * self.image_size[0] + self.image_size[0]/2
+        image_point_y = - rotated_segments[:, :, 2] / image_plane_height_in_meters * self.image_size[1] + self.image_size[1]/2
+        image_segments = np.stack((image_point_x, image_point_y), axis=-1)
         image_points = defaultdict(list)
-        for direction, world_points in world_point_dict.items():
-            for world_point1, world_point2 in self.grouped(world_points, 2):
-                world_rotated_vector1 = np.matmul(np.transpose(rotation_matrix), world_point1)
-                world_rotated_vector2 = np.matmul(np.transpose(rotation_matrix), world_point2)
-                if world_rotated_vector1[1] >= 0 <= world_rotated_vector2[1]:
-                    image_point_par = []
-                    for vector in [world_rotated_vector1, world_rotated_vector2]:
-                        vector = vector / vector[1]
-                        image_point_x = vector[0] / image_plane_width_in_meters * self.image_size[0] + self.image_size[0]/2
-                        image_point_y = - vector[2] / image_plane_height_in_meters * self.image_size[1] + self.image_size[1]/2
-                        image_point_par.append(np.array((image_point_x, image_point_y)))
-                    image_points[direction].append(image_point_par)
+        for idx, image_segment in zip(direction_idx.tolist(), image_segments):
+            image_points[directions[idx]].append(list(image_segment))
         return image_points
 
     def get_world_point(self, image_point, drone_height, yaw_pitch_roll, pos, return_zone=False):
-        unit_vector = self.get_unit_vector(image_point)
+        world_points, zone = self.get_world_points(np.array([image_point]), drone_height, yaw_pitch_roll, pos, True)
+        if return_zone:
+            return world_points[0], zone
+        else:
+            return world_points[0]
+
+    def get_world_points(self, image_points, drone_height, yaw_pitch_roll, pos, return_zone=False):
+        """
+        Project an (N, 2) array of image points seen from one drone pose to (N, 2) easting and northing.
+        """
+        unit_vectors = self.get_unit_vectors(image_points)
         yaw_pitch_roll = (-yaw_pitch_roll[0], yaw_pitch_roll[1], yaw_pitch_roll[2])
         rotation_matrix = self.rotation(*yaw_pitch_roll)
-        rotated_vector = np.matmul(rotation_matrix, unit_vector)
-        ground_vector = rotated_vector / rotated_vector[2] * -drone_height
+        rotated_vectors = np.matmul(unit_vectors, np.transpose(rotation_matrix))
+        ground_vectors = rotated_vectors / rotated_vectors[:, 2:] * -drone_height
         east_north_zone = self.convert_gps(*pos)
-        world_point = ground_vector[:2] + np.array(east_north_zone[:2])
+        world_points = ground_vectors[:, :2] + np.array(east_north_zone[:2])
         if return_zone:
-            return world_point, east_north_zone[2:]
+            return world_points, east_north_zone[2:]
         else:
-            return world_point
+            return world_points
+
+    def get_world_points_with_poses(self, image_points, drone_heights, yaw_pitch_rolls, positions):
+        """
+        Project N image points, each seen from its own drone pose.
 
-    def get_world_points(self, image_points, drone_height, yaw_pitch_roll, pos):
-        world_points = []
-        for image_point in image_points:
-            world_point = self.get_world_point(image_point, drone_height, yaw_pitch_roll, pos)
-            world_points.append(world_point)
-        return world_points
+        drone_heights is (N), yaw_pitch_rolls (N, 3) and positions
+        (N, 2) lat/lon. Returns (N, 2) easting and northing together
+        with the zone numbers and zone letters of the points.
+        """
+        unit_vectors = self.get_unit_vectors(image_points)
+        yaw_pitch_rolls = np.asarray(yaw_pitch_rolls, dtype=np.float64).reshape(-1, 3)
+        positions = np.asarray(positions, dtype=np.float64).reshape(-1, 2)
+        rotation_matrices = self.rotations(-yaw_pitch_rolls[:, 0], yaw_pitch_rolls[:, 1], yaw_pitch_rolls[:, 2])
+        rotated_vectors = np.einsum('nij,nj->ni', rotation_matrices, unit_vectors)
+        ground_vectors = rotated_vectors / rotated_vectors[:, 2:] * -np.asarray(drone_heights, dtype=np.float64).reshape(-1, 1)
+        east, north, zone_numbers, zone_letters = self.convert_gps_array(positions[:, 0], positions[:, 1])
+        world_points = ground_vectors[:, :2] + np.stack((east, north), axis=-1)
+        return world_points, zone_numbers, zone_letters
 
     def get_gps_point(self, image_point, drone_height, yaw_pitch_roll, pos):
         world_point, zone = self.get_world_point(image_point, drone_height, yaw_pitch_roll, pos, True)
@@ -131,6 +282,75 @@ class Fov:
         east_north_zone = utm.from_latlon(lat, lon)
         return east_north_zone
 
+    @staticmethod
+    def get_zones(lat, lon):
+        """
+        UTM zone numbers and letters for arrays of lat/lon, by the same rules as utm.
+        """
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = (np.asarray(lon, dtype=np.float64) % 360 + 540) % 360 - 180
+        zone_numbers = ((lon + 180) / 6).astype(np.int64) + 1
+        norway = (56 <= lat) & (lat < 64) & (3 <= lon) & (lon < 12)
+        zone_numbers[norway] = 32
+        svalbard = (72 <= lat) & (lat <= 84) & (lon >= 0) & (lon < 42)
+        zone_numbers[svalbard] = np.array([31, 33, 35, 37])[np.searchsorted([9, 21, 33], lon[svalbard], side='right')]
+        zone_letters = np.array(list(Fov.utm_zone_letters))[np.clip((lat + 80).astype(np.int64) >> 3, 0, len(Fov.utm_zone_letters) - 1)]
+        return zone_numbers, zone_letters
+
+    @staticmethod
+    def group_by_zone(zone_numbers, zone_letters):
+        """
+        Yield zone number, zone letter and the indices of the entries in that zone.
+        """
+        zone_numbers = np.asarray(zone_numbers)
+        zone_letters = np.asarray(zone_letters)
+        zones, inverse = np.unique(np.char.add(zone_numbers.astype('U2'), zone_letters.astype('U1')), return_inverse=True)
+        if len(zones) == 1:
+            yield int(zone_numbers.flat[0]), str(zone_letters.flat[0]), slice(None)
+            return
+        order = np.argsort(inverse.ravel(), kind='stable')
+        bounds = np.searchsorted(inverse.ravel()[order], np.arange(len(zones) + 1))
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            idx = order[start:stop]
+            yield int(zone_numbers[idx[0]]), str(zone_letters[idx[0]]), idx
+
+    @staticmethod
+    def convert_gps_array(lat, lon):
+        """
+        Convert arrays of lat/lon to easting, northing, zone numbers and zone letters.
+
+        Points are grouped by UTM zone and every group is converted in
+        one call, so flights crossing a zone border get the right zone
+        for every point. The results are in the order of the input.
+        """
+        lat = np.asarray(lat, dtype=np.float64).ravel()
+        lon = np.asarray(lon, dtype=np.float64).ravel()
+        zone_numbers, zone_letters = Fov.get_zones(lat, lon)
+        east = np.empty(len(lat))
+        north = np.empty(len(lat))
+        if len(lat) == 0:
+            return east, north, zone_numbers, zone_letters
+        for zone_number, zone_letter, idx in Fov.group_by_zone(zone_numbers, zone_letters):
+            east[idx], north[idx] = utm.from_latlon(lat[idx], lon[idx], zone_number, zone_letter)[:2]
+        return east, north, zone_numbers, zone_letters
+
+    @staticmethod
+    def convert_utm_array(east, north, zone_numbers, zone_letters):
+        """
+        Convert arrays of easting and northing in the given zones to lat/lon, in the order of the input.
+        """
+        east = np.asarray(east, dtype=np.float64).ravel()
+        north = np.asarray(north, dtype=np.float64).ravel()
+        zone_numbers = np.broadcast_to(zone_numbers, east.shape)
+        zone_letters = np.broadcast_to(zone_letters, east.shape)
+        lat = np.empty(len(east))
+        lon = np.empty(len(east))
+        if len(east) == 0:
+            return lat, lon
+        for zone_number, zone_letter, idx in Fov.group_by_zone(zone_numbers, zone_letters):
+            lat[idx], lon[idx] = utm.to_latlon(east[idx], north[idx], zone_number, zone_letter)
+        return lat, lon
+
     @staticmethod
     def convert_utm(east, north, zone):
         lat, lon = utm.to_latlon(east, north, *zone)
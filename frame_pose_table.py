@@ -0,0 +1,77 @@
+import csv
+from datetime import datetime
+import numpy as np
+
+
+class FramePoseTable:
+    """
+    The drone pose of every frame of a video.
+
+    Built once from the drone log when the video start time or start
+    height changes, so the overlay and the markings look the pose of
+    a frame up by index instead of searching the log. Holds the
+    height, yaw/pitch/roll (radians) and lat/lon of the log sample
+    nearest to every frame, like DroneLog.get_data, and the time of
+    that sample.
+    """
+    field_names = ['frame', 'video time', 'log time', 'drone height', 'drone yaw', 'drone pitch', 'drone roll',
+                   'drone lat', 'drone lon']
+
+    def __init__(self, frame_rate, log_time, height, rotation, pos):
+        self.frame_rate = frame_rate
+        self.log_time = log_time
+        self.height = height
+        self.rotation = rotation
+        self.pos = pos
+
+    @classmethod
+    def build(cls, drone_log, frame_rate, num_frames):
+        times = np.arange(num_frames) / frame_rate
+        height, rotation, pos = drone_log.get_data_array(times)
+        pose_store = drone_log.get_pose_store()
+        log_time = pose_store.time[pose_store.get_nearest_index(times + drone_log.video_start_time)]
+        return cls(frame_rate, np.asarray(log_time, dtype=np.float64), height, rotation, pos)
+
+    def __len__(self):
+        return len(self.height)
+
+    def get_frame(self, time):
+        """
+        Get the frame shown at a video time in seconds, or None outside the video.
+        """
+        frame = int(round(time * self.frame_rate))
+        if 0 <= frame < len(self.height):
+            return frame
+        return None
+
+    def get_data(self, time):
+        """
+        Get height, rotation, position and date time of the frame at a video time, like DroneLog.get_data.
+        """
+        frame = self.get_frame(time)
+        if frame is None:
+            return None
+        return (float(self.height[frame]), tuple(self.rotation[frame].tolist()), tuple(self.pos[frame].tolist()),
+                datetime.fromtimestamp(self.log_time[frame]))
+
+    def save_csv(self, csv_file):
+        with open(csv_file, 'w', newline='') as fo:
+            writer = csv.writer(fo, delimiter=',')
+            writer.writerow(self.field_names)
+            frames = np.arange(len(self))
+            columns = np.column_stack((frames, frames / self.frame_rate, self.log_time, self.height, self.rotation, self.pos))
+            for frame, row in zip(frames.tolist(), columns.tolist()):
+                writer.writerow([frame] + row[1:])
+
+    def save_npz(self, npz_file):
+        np.savez(npz_file, frame_rate=self.frame_rate, video_time=np.arange(len(self)) / self.frame_rate, log_time=self.log_time,
+                 height=self.height, rotation=self.rotation, pos=self.pos)
+
+    def save(self, file):
+        """
+        Save as npz or else csv, by the extension of the file.
+        """
+        if file.lower().endswith('.npz'):
+            self.save_npz(file)
+        else:
+            self.save_csv(file)
@@ -0,0 +1,174 @@
+import os
+import sys
+import shutil
+import hashlib
+from pose_store import PoseStore
+from csv_log_parser import CsvLogParser
+
+
+class UnsupportedLogError(Exception):
+    pass
+
+
+class LogCache:
+    """
+    Per user cache of converted and parsed flight logs.
+
+    Entries are keyed by a hash of the content of the source log,
+    so the same flight is only converted and parsed once, no matter
+    where the file is stored. Every entry is a directory holding the
+    converted csv and the PoseStore columns as .npy files that are
+    memory-mapped when loaded. When the cache grows beyond max_size
+    the least recently used entries are removed.
+    """
+    format_version = 1
+
+    def __init__(self, cache_dir=None, max_size=2 * 1024 ** 3):
+        if cache_dir is None:
+            cache_dir = self.get_default_cache_dir()
+        self.cache_dir = os.path.join(cache_dir, 'logs-v%d' % self.format_version)
+        self.paths_dir = os.path.join(cache_dir, 'paths')
+        self.max_size = max_size
+
+    @staticmethod
+    def get_default_cache_dir():
+        if sys.platform == 'win32':
+            base = os.environ.get('LOCALAPPDATA', os.path.expanduser('~'))
+        else:
+            base = os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache'))
+        return os.path.join(base, 'porpoisetracker')
+
+    def get_key(self, log_file):
+        """
+        Get the content hash of a log file.
+
+        The hash is remembered by path, size and modification time,
+        so an unchanged file is only read once.
+        """
+        stat = os.stat(log_file)
+        file_id = '%s|%d|%d' % (os.path.abspath(log_file), stat.st_size, stat.st_mtime_ns)
+        path_file = os.path.join(self.paths_dir, hashlib.blake2b(file_id.encode(), digest_size=20).hexdigest())
+        try:
+            with open(path_file) as fi:
+                return fi.read()
+        except OSError:
+            pass
+        log_hash = hashlib.blake2b(digest_size=20)
+        with open(log_file, 'rb') as fi:
+            for block in iter(lambda: fi.read(1 << 20), b''):
+                log_hash.update(block)
+        key = log_hash.hexdigest()
+        try:
+            os.makedirs(self.paths_dir, exist_ok=True)
+            with open(path_file, 'w') as fo:
+                fo.write(key)
+        except OSError:
+            pass
+        return key
+
+    def get_entry_dir(self, key):
+        entry_dir = os.path.join(self.cache_dir, key)
+        os.makedirs(entry_dir, exist_ok=True)
+        return entry_dir
+
+    def get_converted_log(self, key):
+        return os.path.join(self.get_entry_dir(key), 'drone_log.csv')
+
+    def has_pose_store(self, key):
+        return os.path.isdir(os.path.join(self.cache_dir, key, 'pose_store'))
+
+    def load_pose_store(self, key):
+        pose_store_dir = os.path.join(self.cache_dir, key, 'pose_store')
+        if not os.path.isdir(pose_store_dir):
+            return None
+        try:
+            pose_store = PoseStore.load(pose_store_dir)
+        except (OSError, ValueError):
+            # Remove the broken entry, so it is saved again when the log is parsed.
+            shutil.rmtree(pose_store_dir, ignore_errors=True)
+            return None
+        self.touch(key)
+        return pose_store
+
+    def save_pose_store(self, key, pose_store):
+        """
+        Save the columns to a temporary directory and move it in place.
+
+        The rename makes the entry appear complete or not at all, also
+        when two instances parse the same log at the same time.
+        """
+        entry_dir = self.get_entry_dir(key)
+        temp_dir = os.path.join(entry_dir, 'pose_store.%d.tmp' % os.getpid())
+        os.makedirs(temp_dir, exist_ok=True)
+        pose_store.save(temp_dir)
+        try:
+            os.rename(temp_dir, os.path.join(entry_dir, 'pose_store'))
+        except OSError:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+        self.touch(key)
+        self.evict(keep=key)
+
+    def get_pose_store(self, log_file):
+        """
+        Get the pose store of a log without the GUI.
+
+        Csv logs are parsed if they are not in the cache, and txt logs
+        when they have been converted before. Raises UnsupportedLogError
+        for txt logs that need TXTlogToCSVtool and have not been
+        converted yet.
+        """
+        key = self.get_key(log_file)
+        pose_store = self.load_pose_store(key)
+        if pose_store is not None:
+            return pose_store
+        if log_file.endswith('.csv'):
+            pose_store = CsvLogParser().parse(log_file)
+        elif os.path.isfile(self.get_converted_log(key)):
+            pose_store = CsvLogParser().parse(self.get_converted_log(key))
+        else:
+            raise UnsupportedLogError('Not converted with TXTlogToCSVtool yet')
+        self.save_pose_store(key, pose_store)
+        return pose_store
+
+    def touch(self, key):
+        try:
+            os.utime(os.path.join(self.cache_dir, key))
+        except OSError:
+            pass
+
+    @staticmethod
+    def get_size(directory):
+        size = 0
+        for root, _, files in os.walk(directory):
+            for file in files:
+                try:
+                    size += os.path.getsize(os.path.join(root, file))
+                except OSError:
+                    pass
+        return size
+
+    def evict(self, keep=None):
+        """
+        Remove least recently used entries until the cache fits in max_size.
+        """
+        if not os.path.isdir(self.cache_dir):
+            return
+        entries = []
+        for key in os.listdir(self.cache_dir):
+            entry_dir = os.path.join(self.cache_dir, key)
+            try:
+                entries.append((os.path.getmtime(entry_dir), self.get_size(entry_dir), entry_dir))
+            except OSError:
+                pass
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, entry_dir in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            if keep is not None and entry_dir == os.path.join(self.cache_dir, keep):
+                continue
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total_size -= size
+
+    def clear(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        shutil.rmtree(self.paths_dir, ignore_errors=True)
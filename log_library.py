@@ -0,0 +1,239 @@
+import os
+import json
+import hashlib
+import argparse
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import numpy as np
+from scipy.spatial import cKDTree
+from log_cache import LogCache, UnsupportedLogError
+from survey_ingest import SurveyIngest, read_log
+
+
+class LogLibrary:
+    """
+    Persistent index of the recordings in all flight logs of a folder.
+
+    The start and end time and start location of every recording are
+    kept in a json file in the log cache, with the size and modification
+    time of the log they came from. update parses new and changed logs
+    in a process pool and drops deleted ones, so only the logs that
+    changed since the last update are read.
+
+    Recordings are found by the time stamps of the video, through
+    recording start times sorted by time, and by the video location,
+    through a k-d tree of the start locations. Location differences
+    are the sum of the lat and lon differences, like in
+    DroneLog.get_video_start_time.
+    """
+    format_version = 1
+    location_radius = 0.001
+    time_tolerance = 60
+
+    def __init__(self, log_dir, cache_dir=None, jobs=None):
+        if cache_dir is None:
+            cache_dir = LogCache.get_default_cache_dir()
+        self.log_dir = os.path.abspath(log_dir)
+        dir_hash = hashlib.blake2b(self.log_dir.encode(), digest_size=20).hexdigest()
+        self.index_file = os.path.join(cache_dir, 'library-v%d' % self.format_version, dir_hash + '.json')
+        self.jobs = jobs
+        self.num_changed = 0
+        self.logs = {}
+        self.recordings = []
+        self.starts = np.zeros(0)
+        self.ends = np.zeros(0)
+        self.time_order = np.zeros(0, dtype=np.int64)
+        self.max_duration = 0
+        self.tree = None
+        self.tree_idx = np.zeros(0, dtype=np.int64)
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as fi:
+                self.logs = json.load(fi)['logs']
+        except (OSError, ValueError, KeyError):
+            self.logs = {}
+        self.build_index()
+
+    def save(self):
+        """
+        Write the index to a temporary file and move it in place.
+        """
+        os.makedirs(os.path.dirname(self.index_file), exist_ok=True)
+        temp_file = self.index_file + '.%d.tmp' % os.getpid()
+        with open(temp_file, 'w', encoding='utf-8') as fo:
+            json.dump({'log dir': self.log_dir, 'logs': self.logs}, fo)
+        os.replace(temp_file, self.index_file)
+
+    def find_changed_logs(self):
+        """
+        Get the logs that are new or changed since they were indexed, and drop deleted logs from the index.
+        """
+        log_files = [log_file for log_file in SurveyIngest.find_files([self.log_dir], SurveyIngest.log_extensions)
+                     if SurveyIngest.is_log_file(log_file)]
+        found = {}
+        for log_file in log_files:
+            stat = os.stat(log_file)
+            found[os.path.relpath(log_file, self.log_dir)] = (stat.st_size, stat.st_mtime_ns)
+        for name in list(self.logs):
+            if name not in found:
+                del self.logs[name]
+        return {name: file_id for name, file_id in found.items()
+                if name not in self.logs or (self.logs[name]['size'], self.logs[name]['mtime']) != file_id}
+
+    def update(self):
+        """
+        Parse the new and changed logs in parallel and save the index.
+
+        Returns the number of logs that were parsed.
+        """
+        for _ in self.update_generator():
+            pass
+        return self.num_changed
+
+    def update_generator(self, timeout=None):
+        """
+        Parse the new and changed logs in parallel and save the index, yielding the number of logs done so far.
+
+        The first 0 is yielded when the changed logs are found and
+        num_changed is set. After that it yields every time it has
+        waited for the pool, at most timeout seconds, so with a timeout
+        of 0 it can be polled from a GLib timeout without blocking. The
+        index is saved even if the update is stopped half way, keeping
+        the logs parsed so far.
+        """
+        changed = self.find_changed_logs()
+        self.num_changed = len(changed)
+        yield 0
+        try:
+            if changed:
+                with ProcessPoolExecutor(max_workers=self.jobs) as executor:
+                    futures = {executor.submit(read_log, os.path.join(self.log_dir, name)): name for name in changed}
+                    pending = set(futures)
+                    done = 0
+                    while pending:
+                        finished, pending = wait(pending, timeout, FIRST_COMPLETED)
+                        for future in finished:
+                            done += 1
+                            self.add_result(futures[future], future, changed, '[%d/%d]' % (done, len(changed)))
+                        yield done
+        finally:
+            self.save()
+        self.build_index()
+
+    def add_result(self, name, future, changed, counter):
+        """
+        Add the recordings of a parsed log to the index.
+
+        A log that fails for any reason, including a crashed worker, is
+        reported and left out, so it is parsed again at the next update.
+        """
+        try:
+            result = future.result()
+        except UnsupportedLogError:
+            print("%s Skipping '%s', open it in PorpoiseTracker once to convert it" % (counter, name))
+            return
+        except Exception as e:
+            print("%s Error reading '%s': %s" % (counter, name, e))
+            return
+        size, mtime = changed[name]
+        self.logs[name] = {'size': size, 'mtime': mtime, 'start': result['start'], 'end': result['end'],
+                           'recordings': result['recordings']}
+        print("%s Indexed log '%s', %d recordings" % (counter, name, len(result['recordings'])))
+
+    def build_index(self):
+        self.recordings = [(name, start, end, lat, lon) for name in sorted(self.logs)
+                           for start, end, lat, lon in self.logs[name]['recordings']]
+        recordings = np.array([recording[1:] for recording in self.recordings], dtype=np.float64).reshape(-1, 4)
+        self.time_order = np.argsort(recordings[:, 0], kind='stable')
+        self.starts = recordings[self.time_order, 0]
+        self.ends = recordings[self.time_order, 1]
+        self.max_duration = float(np.max(self.ends - self.starts)) if len(self.starts) else 0
+        located = np.isfinite(recordings[:, 2:4]).all(axis=1)
+        self.tree_idx = np.flatnonzero(located)
+        self.tree = cKDTree(recordings[located, 2:4]) if len(self.tree_idx) else None
+
+    def __len__(self):
+        return len(self.recordings)
+
+    def get_by_time(self, start, end):
+        """
+        Get the recordings overlapping the time stamps [start, end].
+        """
+        first = np.searchsorted(self.starts, start - self.max_duration, 'left')
+        last = np.searchsorted(self.starts, end, 'right')
+        overlapping = np.flatnonzero(self.ends[first:last] >= start) + first
+        return self.time_order[overlapping].tolist()
+
+    def get_by_location(self, lat_lon, radius=None):
+        """
+        Get the recordings starting within radius of lat_lon, or the nearest one if there are none.
+        """
+        if self.tree is None:
+            return []
+        found = self.tree.query_ball_point(lat_lon, self.location_radius if radius is None else radius, p=1)
+        if not found:
+            found = [self.tree.query(lat_lon, p=1)[1]]
+        return self.tree_idx[found].tolist()
+
+    def find_recording(self, length, lat_lon=None, creation_time=None):
+        """
+        Find the recording that best matches a video.
+
+        With a creation time, only recordings within time_tolerance of
+        the video are used, if there are any. Of those, the one
+        starting nearest to the video location is chosen, without a
+        location the one nearest in time, and without either the one
+        nearest in length. Returns the log file, recording start,
+        match method and difference, or None if the library is empty.
+        """
+        candidates = []
+        if creation_time is not None:
+            candidates = self.get_by_time(creation_time - length - self.time_tolerance, creation_time + length + self.time_tolerance)
+        if lat_lon is not None and (candidates or self.tree is not None):
+            if not candidates:
+                candidates = self.get_by_location(lat_lon)
+            differences = [abs(self.recordings[idx][3] - lat_lon[0]) + abs(self.recordings[idx][4] - lat_lon[1]) for idx in candidates]
+            method = 'location'
+        elif candidates:
+            differences = [max(self.recordings[idx][1] - creation_time, creation_time - self.recordings[idx][2], 0) for idx in candidates]
+            method = 'time'
+        else:
+            candidates = range(len(self.recordings))
+            differences = [abs(self.recordings[idx][2] - self.recordings[idx][1] - length) for idx in candidates]
+            method = 'length'
+        if not differences:
+            return None
+        differences = np.nan_to_num(np.array(differences, dtype=np.float64), nan=np.inf)
+        best = int(np.argmin(differences))
+        name, start = self.recordings[candidates[best]][:2]
+        return {'log file': os.path.join(self.log_dir, name), 'start': start, 'method': method, 'difference': float(differences[best])}
+
+    @staticmethod
+    def parse_creation_time(creation_time):
+        """
+        Parse a creation_time tag to a time stamp.
+
+        Drones write the local time in the tag although it is marked
+        as UTC, so it is read as local time, like the time stamps of
+        the flight logs.
+        """
+        try:
+            return datetime.strptime(creation_time[:19], '%Y-%m-%dT%H:%M:%S').timestamp()
+        except (TypeError, ValueError):
+            return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build or update the index of a folder of flight logs')
+    parser.add_argument('log_dir', type=str, help='Folder with drone logs')
+    parser.add_argument('--jobs', type=int, default=None, help='Number of processes, default is the number of cores')
+    args = parser.parse_args()
+    log_library = LogLibrary(args.log_dir, jobs=args.jobs)
+    num_parsed = log_library.update()
+    print('%d logs parsed, %d recordings in %d logs' % (num_parsed, len(log_library), len(log_library.logs)))
+
+
+if __name__ == '__main__':
+    main()
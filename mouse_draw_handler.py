@@ -1,6 +1,9 @@
 from collections import defaultdict, namedtuple
 import numpy as np
 from tracked_object import MarkObject
+from annotation_store import AnnotationStore
+from annotation_journal import AnnotationJournal
+from video_exporter import VideoExporter
 import csv
 import cv2
 import gi
@@ -9,7 +12,13 @@ from gi.repository import Gdk
 
 
 class MouseDrawHandler:
-    def __init__(self, mouse, draw_handler, video, drone_log, fov, grid_handler, allow_draw):
+    field_names = ['name', 'length', 'time', 'lat', 'lon', 'easting', 'northing', 'zone', 'drone height', 'drone yaw', 'drone pitch', 'drone roll',
+                   'drone lat', 'drone lon', 'x1', 'y1', 'x2', 'y2', 'width', 'height', 'video position',
+                   'red', 'green', 'blue', 'alpha', 'video name', 'log file', 'FOV file']
+    select_radius = 8
+    select_time_tolerance = 0.02
+
+    def __init__(self, mouse, draw_handler, video, drone_log, fov, grid_handler, allow_draw, request_draw):
         self.data_tuple = namedtuple('data', ['length', 'time', 'lat', 'lon', 'easting', 'northing', 'zone', 'drone_height',
                                               'drone_yaw', 'drone_pitch', 'drone_roll', 'drone_lat', 'drone_lon'])
         self.window = None
@@ -26,11 +35,15 @@ class MouseDrawHandler:
         self.grid_handler = grid_handler
         self.grid_handler.remove_marking_func = self.remove_marking
         self.grid_handler.update_draw_markings_func = self.update_draw_markings
+        self.grid_handler.marking_changed_func = self.marking_changed
         self.allow_draw = allow_draw
+        self.request_draw = request_draw
         self.last_pressed = None
+        self.editing = None
         self.current_pos = None
         self.size = None
-        self.markings = defaultdict(list)
+        self.markings = AnnotationStore()
+        self.journal = None
         self.color = Gdk.RGBA(1, 0, 0, 1)
         self.video = None
         self.log_file = None
@@ -48,9 +61,11 @@ class MouseDrawHandler:
     def toggle_draw_horizon(self):
         if self.draw_handler.horizon is not None:
             self.draw_handler.horizon = None
+            self.grid_handler.update_status('Horizon: %(projected)d frames projected, %(cached)d from cache, %(mean time [ms]).2f ms per frame' %
+                                            self.fov.get_horizon_counters(), 'ok')
         else:
             self.draw_handler.horizon = self.draw_horizon
-        self.video_handler.emit_draw_signal()
+        self.request_draw()
 
     def draw_horizon(self, position):
         self.fov.set_image_size(*self.video_handler.video_size)
@@ -63,28 +78,32 @@ class MouseDrawHandler:
 
     @staticmethod
     def get_horizon_dict():
-        world_points = defaultdict(list)
-        for x in np.linspace(-np.pi, np.pi, 100):
-            point = (0, np.cos(x), np.sin(x))
-            world_points['NS'].append(point)
-        for x in np.linspace(-np.pi, np.pi, 100):
-            point = (np.cos(x), 0, np.sin(x))
-            world_points['EW'].append(point)
-        for x in np.linspace(-np.pi, np.pi, 100):
-            point = (np.cos(x), np.sin(x), 0)
-            world_points['pitch0'].append(point)
-        for x in np.linspace(-np.pi, np.pi, 100):
-            point = (np.cos(x) / np.sqrt(2), np.sin(x) / np.sqrt(2), -1 / np.sqrt(2))
-            world_points['pitch45'].append(point)
+        x = np.linspace(-np.pi, np.pi, 100)
+        zeros = np.zeros_like(x)
+        world_points = dict()
+        world_points['NS'] = np.stack((zeros, np.cos(x), np.sin(x)), axis=-1)
+        world_points['EW'] = np.stack((np.cos(x), zeros, np.sin(x)), axis=-1)
+        world_points['pitch0'] = np.stack((np.cos(x), np.sin(x), zeros), axis=-1)
+        world_points['pitch45'] = np.stack((np.cos(x) / np.sqrt(2), np.sin(x) / np.sqrt(2), zeros - 1 / np.sqrt(2)), axis=-1)
         return world_points
 
     def pressed(self, event, x, y, width, height):
+        if self.video_handler.player_paused:
+            hit = self.markings.hit_test(self.video, self.video_handler.get_position(), self.select_time_tolerance * 1e9,
+                                         (x, y), (width, height), self.select_radius)
+            if hit is not None:
+                self.last_pressed = np.array([x, y])
+                self.size = (width, height)
+                self.select_marking(*hit)
+                return
         if self.video_handler.player_paused and self.allow_draw():
             self.last_pressed = np.array([x, y])
             self.size = (width, height)
 
     def released(self, event, x, y):
-        if self.video_handler.player_paused and self.allow_draw():
+        if self.editing is not None:
+            self.finish_edit(x, y)
+        elif self.video_handler.player_paused and self.allow_draw():
             dist = np.linalg.norm(self.last_pressed - np.array([x, y]))
             position = self.video_handler.get_position()
             if dist < 5:
@@ -92,126 +111,220 @@ class MouseDrawHandler:
             else:
                 self.add_line(x, y, position)
 
+    def select_marking(self, marking, start_distance, end_distance):
+        """
+        Select a marking clicked on the frame and grab it for dragging.
+
+        A line is dragged by the end point within select_radius of the
+        click, or moved as a whole if it was clicked elsewhere. Markings
+        are only edited when drawing is allowed.
+        """
+        self.grid_handler.select_marking(marking)
+        handle = None
+        if self.allow_draw():
+            if self.markings.get_kind(marking) == 'points':
+                handle = 'move'
+            elif start_distance <= self.select_radius and start_distance <= end_distance:
+                handle = 'start'
+            elif end_distance <= self.select_radius:
+                handle = 'end'
+            else:
+                handle = 'move'
+        self.editing = (marking, handle, marking.marking.astype(np.float64))
+
+    def drag_marking(self, x, y):
+        marking, handle, original = self.editing
+        delta = (np.array([x, y]) - self.last_pressed) * original[-3:-1] / self.size
+        draw_mark = original.copy()
+        if handle in ('start', 'move'):
+            draw_mark[0:2] += delta
+        if handle in ('end', 'move') and self.markings.get_kind(marking) == 'lines':
+            draw_mark[2:4] += delta
+        marking.marking = draw_mark
+        self.request_draw()
+
+    def finish_edit(self, x, y):
+        """
+        Recompute the geo data of a dragged marking and index it again.
+        """
+        marking, handle, original = self.editing
+        if handle is None:
+            self.editing = None
+            return
+        if np.linalg.norm(self.last_pressed - np.array([x, y])) < 5:
+            self.editing = None
+            marking.marking = original
+            self.request_draw()
+            return
+        self.drag_marking(x, y)
+        self.editing = None
+        marking.data = self.get_marking_data(marking.marking)
+        marking.log_file = self.log_file
+        marking.fov_file = self.fov_file
+        self.markings.update(marking)
+        if self.journal is not None:
+            self.journal.update(self.markings.get_kind(marking), marking)
+        self.grid_handler.update_marking(marking)
+        self.request_draw()
+
+    def get_marking_data(self, draw_mark):
+        """
+        Project a point [x, y, width, height, position] or line [x1, y1, x2, y2, width, height, position] drawn on the widget.
+        """
+        position = draw_mark[-1]
+        drone_data = self.drone_log.get_data(position * 1e-9)
+        scale = self.video_handler.video_size[0] / draw_mark[-3]
+        self.fov.set_image_size(*self.video_handler.video_size)
+        if len(draw_mark) == 5:
+            scaled_image_points = np.array([draw_mark[0:2]]) * scale
+        else:
+            scaled_image_points = np.array([draw_mark[2:4], draw_mark[0:2]]) * scale
+            scaled_image_points = np.vstack((scaled_image_points, np.mean(scaled_image_points, axis=0)))
+        world_points, zone = self.fov.get_world_points(scaled_image_points, *drone_data[:3], True)
+        length = np.linalg.norm(world_points[1]-world_points[0]) if len(draw_mark) > 5 else None
+        world_point = world_points[-1]
+        latlon = self.fov.convert_utm(world_point[0], world_point[1], zone)
+        return self.data_tuple(length, drone_data[-1], latlon[0], latlon[1], world_point[0], world_point[1], zone,
+                               drone_data[0], drone_data[1][0], drone_data[1][1], drone_data[1][2],
+                               drone_data[2][0], drone_data[2][1])
+
     def add_line(self, x, y, position):
         if self.allow_draw():
             draw_mark = np.array([self.last_pressed[0], self.last_pressed[1],
                                   x, y, self.size[0], self.size[1], position])
-            drone_data = self.drone_log.get_data(position * 1e-9)
-            image_points = np.array([[x, y], [self.last_pressed[0], self.last_pressed[1]]])
-            scale = self.video_handler.video_size[0] / self.size[0]
-            scaled_image_points = image_points * scale
-            self.fov.set_image_size(*self.video_handler.video_size)
-            world_points = self.fov.get_world_points(scaled_image_points, *drone_data[:3])
-            length = np.linalg.norm(world_points[1]-world_points[0])
-            scaled_image_point = np.mean(scaled_image_points, axis=0)
-            world_point, zone = self.fov.get_world_point(scaled_image_point, drone_data[0], drone_data[1], drone_data[2], True)
-            latlon = self.fov.convert_utm(world_point[0], world_point[1], zone)
-            data = self.data_tuple(length, drone_data[-1], latlon[0], latlon[1], world_point[0], world_point[1], zone,
-                                   drone_data[0], drone_data[1][0], drone_data[1][1], drone_data[1][2],
-                                   drone_data[2][0], drone_data[2][1])
+            data = self.get_marking_data(draw_mark)
             line = MarkObject(self.grid_handler.current_name, self.color, draw_mark, data, self.video, self.log_file, self.fov_file)
             self.grid_handler.add_marking(line)
-            self.markings['lines'].append(line)
-            self.update_draw_lines()
+            self.add_marking('lines', line)
             self.draw_handler.signals.emit('line_draw', None)
 
     def add_point(self, x, y, position):
         if self.allow_draw():
             draw_mark = np.array([x, y, self.size[0], self.size[1], position])
-            drone_data = self.drone_log.get_data(position * 1e-9)
-            image_point = np.array([x, y])
-            scale = self.video_handler.video_size[0] / self.size[0]
-            scaled_image_point = image_point * scale
-            self.fov.set_image_size(*self.video_handler.video_size)
-            world_point, zone = self.fov.get_world_point(scaled_image_point, drone_data[0], drone_data[1], drone_data[2], True)
-            latlon = self.fov.convert_utm(world_point[0], world_point[1], zone)
-            data = self.data_tuple(None, drone_data[-1], latlon[0], latlon[1], world_point[0], world_point[1], zone,
-                                   drone_data[0], drone_data[1][0], drone_data[1][1], drone_data[1][2],
-                                   drone_data[2][0], drone_data[2][1])
+            data = self.get_marking_data(draw_mark)
             point = MarkObject(self.grid_handler.current_name, self.color, draw_mark, data, self.video, self.log_file, self.fov_file)
             self.grid_handler.add_marking(point)
-            self.markings['points'].append(point)
-            self.update_draw_points()
+            self.add_marking('points', point)
             self.draw_handler.signals.emit('point_draw', None)
 
+    def add_marking(self, kind, marking, journal=True):
+        self.markings.add(kind, marking)
+        if self.journal is not None and journal:
+            self.journal.add(kind, marking)
+
     def remove_marking(self, marking):
-        for mark in self.markings['points']:
-            if mark == marking:
-                self.markings['points'].remove(mark)
-                break
-        for mark in self.markings['lines']:
-            if mark == marking:
-                self.markings['lines'].remove(mark)
-                break
-        self.update_draw_markings()
+        self.markings.remove(marking)
+        if self.journal is not None:
+            self.journal.remove(marking)
+        self.request_draw()
+
+    def marking_changed(self, marking):
+        if self.journal is not None:
+            self.journal.change(marking)
+
+    def start_journal(self, session_dir):
+        """
+        Autosave every change of the annotations to a journal in session_dir.
+        """
+        self.journal = AnnotationJournal(session_dir, self.field_names, self.get_row, self.get_all_markings)
+        for kind, marking in self.get_all_markings():
+            self.journal.add(kind, marking)
+
+    def get_all_markings(self):
+        return [(kind, marking) for kind in self.markings.kinds for marking in self.markings[kind]]
+
+    def recover_journal(self, session_dir):
+        """
+        Add the markings of a session left behind by a crash.
+        """
+        self.grid_handler.begin_bulk_load()
+        try:
+            for row in AnnotationJournal.read_session(session_dir, self.field_names):
+                if row['kind'] == 'lines':
+                    self.add_line_from_csv(row)
+                else:
+                    self.add_point_from_csv(row)
+        finally:
+            self.grid_handler.end_bulk_load()
 
     def update_draw_markings(self):
         self.update_draw_lines()
         self.update_draw_points()
-        self.video_handler.emit_draw_signal()
+        self.request_draw()
 
     def update_draw_points(self):
-        points = []
-        for p in self.markings['points']:
-            if p.video == self.video:
-                points.append([p.marking, p.color, p.hide])
-        self.draw_handler.points = points
+        self.draw_handler.points = self.markings.get_draw_lists(self.video)['points']
 
     def update_draw_lines(self):
-        lines = []
-        for l in self.markings['lines']:
-            if l.video == self.video:
-                lines.append([l.marking, l.color, l.hide])
-        self.draw_handler.lines = lines
+        self.draw_handler.lines = self.markings.get_draw_lists(self.video)['lines']
 
     def move(self, event, x, y):
-        if self.video_handler.player_paused:
+        if self.editing is not None:
+            if self.editing[1] is not None:
+                self.drag_marking(x, y)
+        elif self.video_handler.player_paused:
             if self.allow_draw():
                 self.current_pos = np.array([x, y])
                 position = self.video_handler.get_position()
                 self.draw_handler.signals.emit('line_draw_live', self.last_pressed[0], self.last_pressed[1],
                                                x, y, self.size[0], self.size[1], position)
 
+    @staticmethod
+    def get_row(kind, marking, color):
+        """
+        Get the annotation file row of a marking with the given (red, green, blue, alpha).
+        """
+        if kind == 'points':
+            draw_mark = [marking.marking[0], marking.marking[1], None, None]
+            draw_mark.extend(marking.marking[2:])
+        else:
+            draw_mark = list(marking.marking)
+        row = [marking.name]
+        row.extend(marking.data)
+        row.extend(draw_mark)
+        row.extend(color)
+        row.append(marking.video)
+        row.append(marking.log_file)
+        row.append(marking.fov_file)
+        return row
+
     def save(self, filename):
         with open(filename, 'w') as csv_file:
             writer = csv.writer(csv_file, delimiter=',')
-            header = ['name', 'length', 'time', 'lat', 'lon', 'easting', 'northing', 'zone', 'drone height', 'drone yaw', 'drone pitch', 'drone roll',
-                      'drone lat', 'drone lon', 'x1', 'y1', 'x2', 'y2', 'width', 'height', 'video position',
-                      'red', 'green', 'blue', 'alpha', 'video name', 'log file', 'FOV file']
-            writer.writerow(header)
-            for p in self.markings['points']:
-                marking = [p.marking[0], p.marking[1], None, None]
-                marking.extend(p.marking[2:])
-                row = [p.name]
-                row.extend(p.data)
-                row.extend(marking)
-                color = [p.color.red, p.color.green, p.color.blue, p.color.alpha]
-                row.extend(color)
-                row.append(p.video)
-                row.append(p.log_file)
-                row.append(p.fov_file)
-                writer.writerow(row)
-            for l in self.markings['lines']:
-                row = [l.name]
-                row.extend(l.data)
-                row.extend(l.marking)
-                color = [l.color.red, l.color.green, l.color.blue, l.color.alpha]
-                row.extend(color)
-                row.append(l.video)
-                row.append(l.log_file)
-                row.append(l.fov_file)
-                writer.writerow(row)
+            writer.writerow(self.field_names)
+            for kind in ('points', 'lines'):
+                for marking in self.markings[kind]:
+                    writer.writerow(self.get_row(kind, marking, (marking.color.red, marking.color.green, marking.color.blue, marking.color.alpha)))
+        if self.journal is not None:
+            self.journal.mark_saved()
 
     def open_annotations(self, filename):
-        with open(filename, 'r') as csv_file:
-            reader = csv.DictReader(csv_file)
-            for row in reader:
-                if row.get('length'):
-                    self.add_line_from_csv(row)
-                else:
-                    self.add_point_from_csv(row)
+        """
+        Add the markings of a file.
 
-    def add_line_from_csv(self, row):
+        They are already saved, so the journal takes them as saved in
+        a snapshot instead of recording them as changes.
+        """
+        loaded = []
+        self.grid_handler.begin_bulk_load()
+        try:
+            with open(filename, 'r') as csv_file:
+                reader = csv.DictReader(csv_file)
+                for row in reader:
+                    if row.get('length'):
+                        loaded.append(('lines', self.add_line_from_csv(row, journal=False)))
+                    else:
+                        loaded.append(('points', self.add_point_from_csv(row, journal=False)))
+        finally:
+            self.grid_handler.end_bulk_load()
+            if self.journal is not None:
+                self.journal.add_saved(loaded)
+
+    @staticmethod
+    def is_hidden(row):
+        return row.get('hide') in (True, 'True')
+
+    def add_line_from_csv(self, row, journal=True):
         draw_mark = np.array([float(row.get('x1', 0)), float(row.get('y1', 0)), float(row.get('x2', 0)), float(row.get('y2', 0)),
                               float(row.get('width', 0)), float(row.get('height', 0)), int(float(row.get('video position', 0)))])
         data = self.data_tuple(float(row.get('length', 0)), row.get('time'), float(row.get('lat', 0)), float(row.get('lon', 0)),
@@ -220,11 +333,12 @@ class MouseDrawHandler:
                                float(row.get('drone lat', 0)), float(row.get('drone lon', 0)))
         color = Gdk.RGBA(float(row.get('red', 1)), float(row.get('green', 0)), float(row.get('blue', 0)), float(row.get('alpha', 1)))
         line = MarkObject(row.get('name'), color, draw_mark, data, row.get('video name'), row.get('log file', ''), row.get('FOV file', ''))
+        line.hide = self.is_hidden(row)
         self.grid_handler.add_marking_from_csv(line)
-        self.markings['lines'].append(line)
-        self.update_draw_lines()
+        self.add_marking('lines', line, journal)
+        return line
 
-    def add_point_from_csv(self, row):
+    def add_point_from_csv(self, row, journal=True):
         draw_mark = np.array([float(row.get('x1', 0)), float(row.get('y1', 0)), float(row.get('width', 0)), float(row.get('height', 0)), int(float(row.get('video position', 0)))])
         data = self.data_tuple(None, row.get('time'), float(row.get('lat', 0)), float(row.get('lon', 0)),
                                float(row.get('easting', 0)), float(row.get('northing', 0)), row.get('zone'),
@@ -232,46 +346,47 @@ class MouseDrawHandler:
                                float(row.get('drone lat', 0)), float(row.get('drone lon', 0)))
         color = Gdk.RGBA(float(row.get('red', 1)), float(row.get('green', 0)), float(row.get('blue', 0)), float(row.get('alpha', 1)))
         point = MarkObject(row.get('name'), color, draw_mark, data, row.get('video name'), row.get('log file', ''), row.get('FOV file', ''))
+        point.hide = self.is_hidden(row)
         self.grid_handler.add_marking_from_csv(point)
-        self.markings['points'].append(point)
-        self.update_draw_points()
+        self.add_marking('points', point, journal)
+        return point
 
-    def export_video_gen(self, video_input_file, video_export_file):
-        cap = cv2.VideoCapture(video_input_file)
-        frame_rate = cap.get(cv2.CAP_PROP_FPS)
-        frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        frame_num = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        fourcc = cv2.VideoWriter_fourcc(*'XVID')
-        out = cv2.VideoWriter(video_export_file, fourcc, frame_rate, (frame_width, frame_height))
-        yield frame_num
-        while cap.isOpened():
-            pos = int(cap.get(cv2.CAP_PROP_POS_MSEC) * 1e6)
-            ret, frame = cap.read()
-            if ret:
-                new_frame = frame.copy()
-                for point in self.markings['points']:
-                    if int(point.marking[-1]) == pos:
-                        scale_width = frame_width / point.marking[2]
-                        scale_height = frame_height / point.marking[3]
-                        center = (int(point.marking[0]*scale_width), int(point.marking[1]*scale_height))
-                        color = (int(point.color.green*255), int(point.color.blue*255), int(point.color.red*255))
-                        cv2.circle(new_frame, center, 10, color, -1)
-                for line in self.markings['lines']:
-                    if int(line.marking[-1]) == pos:
-                        scale_width = frame_width / line.marking[4]
-                        scale_height = frame_height / line.marking[5]
-                        point1 = (int(line.marking[0]*scale_width), int(line.marking[1]*scale_height))
-                        point2 = (int(line.marking[2]*scale_width), int(line.marking[3]*scale_height))
-                        color = (int(line.color.green * 255), int(line.color.blue * 255), int(line.color.red * 255))
-                        cv2.line(new_frame, point1, point2, color, 5)
-                out.write(new_frame)
-            else:
-                break
-            yield True
-        cap.release()
-        out.release()
-        yield False
+    def get_frame_buckets(self, video_file, frame_rate, time_tolerance=None):
+        """
+        Group the markings of a video by the frame they are drawn on.
 
+        A marking is drawn on every frame within time_tolerance seconds
+        of its video position, or only on the nearest frame if no
+        tolerance is given.
+        """
+        buckets = defaultdict(list)
+        for position, markings in self.markings.by_position.get(video_file, {}).items():
+            time = position * 1e-9
+            if time_tolerance is None:
+                frames = [int(round(time * frame_rate))]
+            else:
+                frames = range(int(np.ceil((time - time_tolerance) * frame_rate)), int(np.floor((time + time_tolerance) * frame_rate)) + 1)
+            for frame in frames:
+                buckets[frame].extend((self.markings.get_kind(marking), marking) for marking in markings)
+        return buckets
 
+    @staticmethod
+    def draw_marking_on_frame(frame, kind, marking):
+        frame_height, frame_width = frame.shape[:2]
+        color = (int(marking.color.green * 255), int(marking.color.blue * 255), int(marking.color.red * 255))
+        if kind == 'points':
+            scale_width = frame_width / marking.marking[2]
+            scale_height = frame_height / marking.marking[3]
+            center = (int(marking.marking[0]*scale_width), int(marking.marking[1]*scale_height))
+            cv2.circle(frame, center, 10, color, -1)
+        else:
+            scale_width = frame_width / marking.marking[4]
+            scale_height = frame_height / marking.marking[5]
+            point1 = (int(marking.marking[0]*scale_width), int(marking.marking[1]*scale_height))
+            point2 = (int(marking.marking[2]*scale_width), int(marking.marking[3]*scale_height))
+            cv2.line(frame, point1, point2, color, 5)
 
+    def get_video_exporter(self, video_input_file, video_export_file, time_tolerance=None, padding=None, split_by_name=False,
+                           encoder='opencv', quality=23, preset='medium'):
+        return VideoExporter(video_input_file, video_export_file, self.get_frame_buckets, self.draw_marking_on_frame, time_tolerance,
+                             padding, split_by_name, encoder, quality, preset)
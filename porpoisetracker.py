@@ -6,6 +6,7 @@ if sys.platform == 'win32':
     os.environ['GST_PLUGIN_PATH'] = './;./gst-plugins'
 import argparse
 import shutil
+from datetime import datetime
 from collections import OrderedDict
 import ffmpeg
 from gtk_modules import Menu, Video, VideoDrawHandler, Mouse
@@ -14,6 +15,13 @@ from mouse_draw_handler import MouseDrawHandler
 from tracker_grid_handler import GridHandler
 from drone_log import DroneLog
 from fov import Fov
+from srt_telemetry import SrtTelemetry
+from session_manifest import SessionManifest
+from video_exporter import VideoExporter
+from annotation_journal import AnnotationJournal
+from log_cache import LogCache
+from log_library import LogLibrary
+from redraw_scheduler import RedrawScheduler
 import gi
 
 gi.require_version('Gtk', '3.0')
@@ -21,6 +29,8 @@ from gi.repository import Gtk, Gio, GLib
 
 
 class PorpoiseTracker(Gtk.Application):
+    plot_playback_rate = 10
+
     def __init__(self):
         super().__init__(application_id='org.test',
                          flags=Gio.ApplicationFlags.FLAGS_NONE)
@@ -32,14 +42,18 @@ class PorpoiseTracker(Gtk.Application):
         self.add_menu()
         self.video = Video()
         self.mouse = Mouse(self.video.event_box)
-        self.draw_handler = VideoDrawHandler(self.video.emit_draw_signal)
+        self.redraw = RedrawScheduler()
+        self.redraw.add_subsystem('overlay', self.video.emit_draw_signal)
+        self.draw_handler = VideoDrawHandler(self.redraw.get_request_func('overlay'))
         self.video.signals.connect('video_draw', self.draw_handler.draw)
         self.grid_handler = GridHandler(self.video.jump_to_position)
         self.drone_log = DroneLog()
-        self.video.on_pause_and_slide_change_func = self.drone_log.update_plot
+        self.redraw.add_subsystem('plot', self.drone_log.update_plot)
+        self.video.on_pause_and_slide_change_func = self.request_plot
         self.fov = Fov()
         self.mouse_draw = MouseDrawHandler(self.mouse, self.draw_handler, self.video,
-                                           self.drone_log, self.fov, self.grid_handler, self.allow_draw)
+                                           self.drone_log, self.fov, self.grid_handler, self.allow_draw,
+                                           self.redraw.get_request_func('overlay'))
         self.window = None
         self.save_file = None
         self.video_file = None
@@ -48,6 +62,8 @@ class PorpoiseTracker(Gtk.Application):
         self.drone_log_open = False
         self.fov_file = None
         self.fov_open = False
+        self.log_library = None
+        self.video_creation_time = None
         self.camera_params_open = False
         self.current_folder = None
 
@@ -81,9 +97,11 @@ class PorpoiseTracker(Gtk.Application):
         self._file_menu.update({'separator1': None})
         self._file_menu.update({'_Open video': ('open-video', '&lt;Primary&gt;o', self.on_open_video)})
         self._file_menu.update({'_Import drone log': ('import-drone-log', '&lt;Primary&gt;i', self.on_import_drone_log)})
+        self._file_menu.update({'_Open flight log library': ('open-log-library', None, self.on_open_log_library)})
         self._file_menu.update({'_Import fov': ('import-fov', '&lt;Primary&gt;&lt;shift&gt;i', self.on_import_fov)})
         self._file_menu.update({'_Import camera params': ('import-camera-params', '&lt;Primary&gt;l', self.on_import_camera_params)})
         self._file_menu.update({'_Open annotations': ('open-annotations', '&lt;Primary&gt;&lt;shift&gt;o', self.on_open_annotations)})
+        self._file_menu.update({'_Open session': ('open-session', None, self.on_open_session)})
         self._file_menu.update({'_Change start height': ('change-start-height', None, self.on_change_start_height)})
         self._file_menu.update({'_Change video start time': ('change-video-start-time', None, self.on_change_video_start_time, False)})
         self._file_menu.update({'_Open drone log plot window': ('open-drone-log-plot', None, self.on_open_drone_log_plot, False)})
@@ -91,6 +109,8 @@ class PorpoiseTracker(Gtk.Application):
         self._file_menu.update({'_Save': ('save', '&lt;Primary&gt;s', self.on_save)})
         self._file_menu.update({'_Save as': ('save-as', '&lt;Primary&gt;&lt;shift&gt;s', self.on_save_as)})
         self._file_menu.update({'_Export video': ('export-video', '&lt;Primary&gt;e', self.on_export_video, False)})
+        self._file_menu.update({'_Export pose table': ('export-pose-table', None, self.on_export_pose_table)})
+        self._file_menu.update({'_Export annotated segments': ('export-segments', None, self.on_export_segments, False)})
         self._file_menu.update({'separator3': None})
         self._file_menu.update({'_Remove temp files': ('remove-temp-files', None, self.on_remove_temp_files)})
         self._file_menu.update({'_Quit': ('quit', '&lt;Primary&gt;q', self.on_quit)})
@@ -202,7 +222,7 @@ class PorpoiseTracker(Gtk.Application):
             menu = ['_Toggle drawing Horizon']
             self.enable_media_menu(menu, True)
             self.draw_handler.horizon = self.mouse_draw.draw_horizon
-            self.video.emit_draw_signal()
+            self.redraw.request('overlay')
 
     def on_open_video(self, *_):
         print("on_open_video")
@@ -239,16 +259,20 @@ class PorpoiseTracker(Gtk.Application):
             self.enable_draw_horizon_menu()
             self.video.playback_button.connect('clicked', self._enable_media_menu)
             self.drone_log.set_video_length(self.video.duration * 1e-9)
-            try:
-                video_location_string = ffmpeg.probe(file, cmd=cmd)['format']['tags']['location']
-                match = re.match(r'([-+]\d+.\d+)([-+]\d+.\d+)([-+]\d+.\d+)', video_location_string)
-                if match:
-                    lat = float(match.group(1))
-                    lon = float(match.group(2))
-                    self.drone_log.video_lat_lon = (lat, lon)
-            except KeyError:
-                pass
+            self.drone_log.set_srt_file(SrtTelemetry.find_srt_file(file))
+            probe = ffmpeg.probe(file, cmd=cmd)
+            tags = probe['format'].get('tags', {})
+            video_streams = [stream for stream in probe.get('streams', []) if stream.get('codec_type') == 'video']
+            if video_streams:
+                self.drone_log.set_frame_rate(self.get_frame_rate(video_streams[0]))
+            match = re.match(r'([-+]\d+.\d+)([-+]\d+.\d+)([-+]\d+.\d+)', tags.get('location', ''))
+            if match:
+                lat = float(match.group(1))
+                lon = float(match.group(2))
+                self.drone_log.video_lat_lon = (lat, lon)
+            self.video_creation_time = LogLibrary.parse_creation_time(tags.get('creation_time'))
             self.menu.enable_menu_item('_Export video', True)
+            self.menu.enable_menu_item('_Export annotated segments', True)
             self.mouse_draw.video = self.video_file
             self.video_open = True
             if self.drone_log_open:
@@ -256,9 +280,22 @@ class PorpoiseTracker(Gtk.Application):
                 self.drone_log.update_video_plot()
             self.grid_handler.on_open_video(self.video_file.split(os.sep)[-1])
             self.open_status()
+            self.propose_drone_log()
         except AttributeError:
             self.grid_handler.update_status('Error opening video', 'error')
 
+    @staticmethod
+    def get_frame_rate(stream):
+        for key in ('avg_frame_rate', 'r_frame_rate'):
+            numerator, _, denominator = stream.get(key, '0/0').partition('/')
+            try:
+                frame_rate = float(numerator) / float(denominator or 1)
+            except (ValueError, ZeroDivisionError):
+                continue
+            if frame_rate > 0:
+                return frame_rate
+        return None
+
     def on_import_drone_log(self, *_):
         dialog = FileDialog(self.window,
                             'Choose a drone log',
@@ -274,7 +311,81 @@ class PorpoiseTracker(Gtk.Application):
         else:
             dialog.destroy()
 
-    def open_drone_log_from_file(self, log_file):
+    def on_open_log_library(self, *_):
+        dialog = Gtk.FileChooserDialog(title='Choose the folder with the flight logs', parent=self.window,
+                                       action=Gtk.FileChooserAction.SELECT_FOLDER)
+        dialog.add_buttons(Gtk.STOCK_CANCEL, Gtk.ResponseType.CANCEL, Gtk.STOCK_OPEN, Gtk.ResponseType.OK)
+        response = dialog.run()
+        if response == Gtk.ResponseType.OK:
+            log_dir = dialog.get_filename()
+            dialog.destroy()
+            self.open_log_library(log_dir)
+        else:
+            dialog.destroy()
+
+    def open_log_library(self, log_dir):
+        log_library_generator = self.open_log_library_generator(log_dir)
+        GLib.timeout_add(100, log_library_generator.__next__)
+
+    def open_log_library_generator(self, log_dir):
+        """
+        Index the logs in a folder, parsing only the ones that changed since the last time.
+
+        Called from a GLib timeout, so the GUI stays responsive while
+        the logs are parsed in the background.
+        """
+        print("Indexing flight logs in: '%s'" % log_dir)
+        try:
+            log_library = LogLibrary(log_dir)
+            update_generator = log_library.update_generator(timeout=0)
+            next(update_generator)
+        except OSError:
+            self.grid_handler.update_status('Error indexing flight logs', 'error')
+            yield False
+            return
+        progress_dialog = ProgressDialog(self.window, 'Indexing flight logs', max(log_library.num_changed, 1))
+        progress_dialog.show()
+        progress_update_generator = progress_dialog.update_progress()
+        logs_shown = 0
+        try:
+            for logs_done in update_generator:
+                for _ in range(logs_done - logs_shown):
+                    next(progress_update_generator, None)
+                logs_shown = logs_done
+                yield True
+        except OSError:
+            progress_dialog.close()
+            self.grid_handler.update_status('Error indexing flight logs', 'error')
+            yield False
+            return
+        progress_dialog.close()
+        self.log_library = log_library
+        self.grid_handler.update_status('%d recordings in %d flight logs' % (len(self.log_library), len(self.log_library.logs)), 'ok')
+        self.propose_drone_log()
+        yield False
+
+    def propose_drone_log(self):
+        """
+        Offer to open the log and recording of the library that best matches the open video.
+        """
+        if self.log_library is None or not self.video_open or self.drone_log_open:
+            return
+        match = self.log_library.find_recording(self.drone_log.video_length, self.drone_log.video_lat_lon, self.video_creation_time)
+        if match is None:
+            return
+        dialog = Dialog(self.window, 'Open drone log', 'cancel_ok')
+        label = Gtk.Label(label="The video matches the recording at %s in '%s'\n(%s difference %.6g).\nOpen this log?" %
+                                (datetime.fromtimestamp(match['start']).strftime('%Y-%m-%d %H:%M:%S'), match['log file'],
+                                 match['method'], match['difference']))
+        dialog.box.add(label)
+        dialog.show_all()
+        response = dialog.run()
+        dialog.destroy()
+        if response == Gtk.ResponseType.OK:
+            has_srt_time = self.drone_log.srt_telemetry is not None and self.drone_log.srt_telemetry.has_time()
+            self.open_drone_log_from_file(match['log file'], None if has_srt_time else match['start'])
+
+    def open_drone_log_from_file(self, log_file, video_start_time=None):
         self.current_folder = log_file
         try:
             print("Opening log file: '%s'" % log_file)
@@ -282,7 +393,10 @@ class PorpoiseTracker(Gtk.Application):
             self.drone_log_file = log_file
             self.drone_log_open = True
             if self.video_open:
-                self.drone_log.get_video_start_time()
+                if video_start_time is None:
+                    self.drone_log.get_video_start_time()
+                else:
+                    self.drone_log.set_video_start_time(video_start_time)
                 self.drone_log.update_video_plot()
             self.mouse_draw.log_file = log_file
             self.enable_draw_horizon_menu()
@@ -299,7 +413,7 @@ class PorpoiseTracker(Gtk.Application):
             self.drone_log.convert_log(log_file)
             self.drone_log.parse_log()
         self.drone_log.plot_log_data()
-        self.video.emit_draw_signal()
+        self.redraw.request('overlay')
 
     def open_drone_log_generator(self, log_file):
         if log_file.endswith('.csv'):
@@ -309,7 +423,7 @@ class PorpoiseTracker(Gtk.Application):
         yield True
         for _ in log_generator:
             yield True
-        self.video.emit_draw_signal()
+        self.redraw.request('overlay')
         yield False
 
     def on_import_fov(self, *_):
@@ -372,12 +486,12 @@ class PorpoiseTracker(Gtk.Application):
         response = dialog.run()
         if response == Gtk.ResponseType.OK:
             start_height = spinner.get_value()
-            self.drone_log.height_difference = start_height
+            self.drone_log.set_height_difference(start_height)
         dialog.destroy()
 
     def on_change_video_start_time(self, *_):
-        log_length = self.drone_log.log_time_list[-1] - self.drone_log.log_time_list[0]
-        video_start_time_in = self.drone_log.video_start_time - self.drone_log.log_time_list[0]
+        log_length = self.drone_log.pose_store.time[-1] - self.drone_log.pose_store.time[0]
+        video_start_time_in = self.drone_log.video_start_time - self.drone_log.pose_store.time[0]
         dialog = Dialog(self.window, 'Video start time in log (s)', 'cancel_ok')
         adjustment = Gtk.Adjustment(video_start_time_in, 0.0, log_length, 1.0, 1.0, 1.0)
         spinner = Gtk.SpinButton()
@@ -416,27 +530,148 @@ class PorpoiseTracker(Gtk.Application):
             dialog.destroy()
 
     def on_export_video(self, *_):
-        dialog = FileDialog(self.window, 'Save as', 'save', 'untitled.avi')
+        self.export_video('Export video', segments=False)
+
+    def on_export_segments(self, *_):
+        self.export_video('Export annotated segments', segments=True)
+
+    def on_export_pose_table(self, *_):
+        pose_table = self.drone_log.frame_pose_table
+        if pose_table is None:
+            self.grid_handler.update_status('Open a video and a drone log to export the pose table', 'error')
+            return
+        dialog = FileDialog(self.window, 'Save as', 'save', 'pose_table.csv')
+        response = dialog.run()
+        if response == Gtk.ResponseType.OK:
+            pose_table_file = dialog.get_filename()
+            print("Saving pose table of %d frames to: '%s'" % (len(pose_table), pose_table_file))
+            try:
+                pose_table.save(pose_table_file)
+            except OSError:
+                self.grid_handler.update_status('Error saving pose table', 'error')
+        dialog.destroy()
+
+    def export_video(self, title, segments):
+        export_options = self.get_export_options(title, segments)
+        if export_options is None:
+            return
+        default_name = 'untitled.avi' if export_options['encoder'] == 'opencv' else 'untitled.mp4'
+        dialog = FileDialog(self.window, 'Save as', 'save', default_name)
         response = dialog.run()
         if response == Gtk.ResponseType.OK:
             video_export_file = dialog.get_filename()
             print("Exporting video file: '%s' to file: '%s" % (self.video_file, video_export_file))
-            video_export_generator = self.export_video_gen(self.window, self.video_file, video_export_file)
-            GLib.idle_add(video_export_generator.__next__)
+            video_export_generator = self.export_video_gen(self.window, self.video_file, video_export_file, **export_options)
+            GLib.timeout_add(100, video_export_generator.__next__)
+        dialog.destroy()
+
+    def get_export_options(self, title, segments):
+        dialog = Dialog(self.window, title, 'cancel_ok')
+        grid = Gtk.Grid()
+        label = Gtk.Label(label='Encoder:')
+        grid.attach(label, 0, 0, 1, 1)
+        encoder_combo = Gtk.ComboBoxText()
+        encoder_labels = {'opencv': 'XVID (OpenCV)', 'x264': 'H.264 (ffmpeg)', 'x265': 'H.265 (ffmpeg)', 'mjpeg': 'MJPEG (ffmpeg)'}
+        for encoder in VideoExporter.encoders:
+            encoder_combo.append(encoder, encoder_labels.get(encoder, encoder))
+        encoder_combo.set_active_id('opencv')
+        grid.attach(encoder_combo, 1, 0, 1, 1)
+        label = Gtk.Label(label='Quality (CRF / q:v):')
+        grid.attach(label, 0, 1, 1, 1)
+        quality_adjustment = Gtk.Adjustment(23, 0, 51, 1, 1, 0)
+        quality_spinner = Gtk.SpinButton()
+        quality_spinner.set_numeric(True)
+        quality_spinner.set_adjustment(quality_adjustment)
+        quality_spinner.set_value(23)
+        grid.attach(quality_spinner, 1, 1, 1, 1)
+        label = Gtk.Label(label='Preset:')
+        grid.attach(label, 0, 2, 1, 1)
+        preset_combo = Gtk.ComboBoxText()
+        for preset in ('ultrafast', 'superfast', 'veryfast', 'faster', 'fast', 'medium', 'slow', 'slower', 'veryslow'):
+            preset_combo.append(preset, preset)
+        preset_combo.set_active_id('medium')
+        grid.attach(preset_combo, 1, 2, 1, 1)
+        if segments:
+            label = Gtk.Label(label='Padding in seconds:')
+            grid.attach(label, 0, 3, 1, 1)
+            padding_adjustment = Gtk.Adjustment(2.0, 0.0, 600.0, 0.5, 1.0, 0)
+            padding_spinner = Gtk.SpinButton()
+            padding_spinner.set_adjustment(padding_adjustment)
+            padding_spinner.set_digits(1)
+            padding_spinner.set_value(2.0)
+            grid.attach(padding_spinner, 1, 3, 1, 1)
+            split_check = Gtk.CheckButton(label='One clip per name')
+            grid.attach(split_check, 0, 4, 2, 1)
+        dialog.box.add(grid)
+        dialog.show_all()
+        response = dialog.run()
+        export_options = {'encoder': encoder_combo.get_active_id(), 'quality': quality_spinner.get_value_as_int(),
+                          'preset': preset_combo.get_active_id()}
+        if segments:
+            export_options.update({'padding': padding_spinner.get_value(), 'split_by_name': split_check.get_active()})
+        dialog.destroy()
+        if response != Gtk.ResponseType.OK:
+            return None
+        return export_options
+
+    def export_video_gen(self, window, video_file, video_export_file, padding=None, split_by_name=False, encoder='opencv', quality=23,
+                         preset='medium'):
+        """
+        Follow an export running in the background and show its progress.
+
+        Called from a GLib timeout, so the GUI stays responsive. The
+        progress is shown in a plain Gtk.Dialog with a cancel button.
+        Cancelling or closing the dialog stops the export.
+        """
+        video_exporter = self.mouse_draw.get_video_exporter(video_file, video_export_file, padding=padding, split_by_name=split_by_name,
+                                                            encoder=encoder, quality=quality, preset=preset)
+        progress_dialog = Gtk.Dialog(title='Exporting Video', transient_for=window, modal=True)
+        progress_dialog.add_buttons(Gtk.STOCK_CANCEL, Gtk.ResponseType.CANCEL)
+        progress_dialog.set_default_size(300, 50)
+        progress_bar = Gtk.ProgressBar()
+        progress_dialog.get_content_area().add(progress_bar)
+        progress_dialog.connect('response', lambda *_: video_exporter.cancel())
+        progress_dialog.show_all()
+        video_exporter.start()
+        while not video_exporter.finished:
+            progress_bar.set_fraction(min(video_exporter.frames_done / max(video_exporter.frame_num, 1), 1))
+            yield True
+        progress_dialog.destroy()
+        if video_exporter.error is not None:
+            print('Error exporting video: %s' % video_exporter.error)
+            self.grid_handler.update_status('Error exporting video', 'error')
+        elif video_exporter.cancelled:
+            print('Video export cancelled')
+        yield False
+
+    def on_open_session(self, *_):
+        dialog = FileDialog(self.window, 'Choose a session file', 'open', current_folder=self.current_folder)
+        dialog.add_mime_filter('csv', 'text/csv')
+        response = dialog.run()
+        if response == Gtk.ResponseType.OK:
+            session_file = dialog.get_filename()
             dialog.destroy()
+            self.open_session(session_file)
         else:
             dialog.destroy()
 
-    def export_video_gen(self, window, video_file, video_export_file):
-        video_export_generator = self.mouse_draw.export_video_gen(video_file, video_export_file)
-        num_frame = next(video_export_generator)
-        progress_dialog = ProgressDialog(window, 'Exporting Video', num_frame)
-        progress_dialog.show()
-        progress_update_generator = progress_dialog.update_progress()
-        for _ in zip(progress_update_generator, video_export_generator):
-            yield True
-        progress_dialog.close()
-        yield False
+    def open_session(self, session_file):
+        """
+        Open video, log, FOV file and camera parameters from a session file written by survey_ingest.py.
+        """
+        try:
+            session = SessionManifest.read(session_file)
+        except (OSError, StopIteration, ValueError):
+            self.grid_handler.update_status('Error opening session', 'error')
+            return
+        print("Opening session: '%s'" % session_file)
+        self.video_file = session.video
+        self.open_video_from_file(self.video_file)
+        if session.fov_file:
+            self.open_fov_file(session.fov_file)
+        if session.camera_params:
+            self.open_camera_params_file(session.camera_params)
+        self.open_drone_log_from_file(session.log_file, session.video_start_time)
 
     def on_open_annotations(self, *_):
         dialog = FileDialog(self.window, 'Choose a annotations csv file', 'open')
@@ -455,18 +690,27 @@ class PorpoiseTracker(Gtk.Application):
         except ValueError:
             self.grid_handler.update_status('Error opening annotations file', 'error')
 
-    @staticmethod
-    def on_remove_temp_files(*_):
+    def on_remove_temp_files(self, *_):
         shutil.rmtree('temp/')
         os.mkdir('temp/')
+        self.drone_log.log_cache.clear()
 
     def on_quit(self, *_):
-        self.on_remove_temp_files()
+        if self.mouse_draw.journal is not None:
+            self.mouse_draw.journal.close()
+        self.drone_log.log_cache.evict()
         self.quit()
 
     def toggle_draw_horizon(self, *_):
         self.mouse_draw.toggle_draw_horizon()
 
+    def request_plot(self, time):
+        """
+        Redraw the plot cursor, at most plot_playback_rate times per second while playing.
+        """
+        self.redraw.set_max_rate('plot', None if self.video.player_paused else self.plot_playback_rate)
+        self.redraw.request('plot', time)
+
     def on_play_pause(self, *_):
         self.video.playback_button.clicked()
         self._enable_media_menu(None)
@@ -511,6 +755,27 @@ class PorpoiseTracker(Gtk.Application):
         dialog.run()
         dialog.destroy()
 
+    def start_autosave(self):
+        autosave_dir = os.path.join(LogCache.get_default_cache_dir(), 'autosave')
+        sessions = AnnotationJournal.find_sessions(autosave_dir)
+        self.mouse_draw.start_journal(AnnotationJournal.get_session_dir(autosave_dir))
+        for session_dir in sessions:
+            dialog = Dialog(self.window, 'Recover annotations', 'cancel_ok')
+            label = Gtk.Label(label="Annotations that were not saved were found in '%s'.\n"
+                                    "Recover them? Cancel deletes them." % session_dir)
+            dialog.box.add(label)
+            dialog.show_all()
+            response = dialog.run()
+            dialog.destroy()
+            if response == Gtk.ResponseType.OK:
+                try:
+                    print("Recovering annotations from: '%s'" % session_dir)
+                    self.mouse_draw.recover_journal(session_dir)
+                except (OSError, ValueError, KeyError):
+                    self.grid_handler.update_status('Error recovering annotations', 'error')
+                    continue
+            shutil.rmtree(session_dir, ignore_errors=True)
+
     def parse_args(self, _):
         parser = argparse.ArgumentParser(description='Measure porpoises')
         parser.add_argument('--video', type=str, help='Open video file')
@@ -518,7 +783,12 @@ class PorpoiseTracker(Gtk.Application):
         parser.add_argument('--fov', type=str, help='Open fov file')
         parser.add_argument('--cam', type=str, help='Open camera parameter file')
         parser.add_argument('--annotations', type=str, help='Open annotations file')
+        parser.add_argument('--session', type=str, help='Open session file made by survey_ingest.py')
+        parser.add_argument('--log-library', type=str, help='Index a folder of drone logs and propose the log matching the video')
         args = parser.parse_args()
+        self.start_autosave()
+        if args.session:
+            self.open_session(args.session)
         if args.video:
             self.video_file = os.path.abspath(args.video)
             self.open_video_from_file(self.video_file)
@@ -530,6 +800,8 @@ class PorpoiseTracker(Gtk.Application):
             self.open_annotations(args.annotations)
         if args.log:
             self.open_drone_log_from_file(args.log)
+        if args.log_library:
+            self.open_log_library(args.log_library)
 
 
 if __name__ == '__main__':
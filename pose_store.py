@@ -0,0 +1,117 @@
+import os
+from datetime import datetime
+import numpy as np
+
+
+class PoseStore:
+    """
+    Columnar storage of drone log samples.
+
+    Every sample is stored as one entry in a set of contiguous
+    typed arrays sorted by time. Angles are in radians and the
+    is video flag is kept as a packed bitmask.
+    """
+    column_names = ('time', 'height', 'yaw', 'pitch', 'roll', 'lat', 'lon', 'is_video_bits')
+
+    def __init__(self, time=None, height=None, yaw=None, pitch=None, roll=None, lat=None, lon=None, is_video=None):
+        if time is None:
+            time = []
+        order = np.argsort(np.asarray(time, dtype=np.float64), kind='stable')
+        self.time = self.column(time, np.float64, order)
+        self.height = self.column(height, np.float32, order)
+        self.yaw = self.column(yaw, np.float32, order)
+        self.pitch = self.column(pitch, np.float32, order)
+        self.roll = self.column(roll, np.float32, order)
+        self.lat = self.column(lat, np.float64, order)
+        self.lon = self.column(lon, np.float64, order)
+        self.is_video_bits = np.packbits(self.column(is_video, np.bool_, order))
+
+    def column(self, values, dtype, order):
+        if values is None:
+            return np.zeros(len(order), dtype=dtype)
+        return np.ascontiguousarray(np.asarray(values, dtype=dtype)[order])
+
+    @classmethod
+    def load(cls, directory, mmap_mode='r'):
+        """
+        Load columns saved with save, memory-mapped by default.
+        """
+        pose_store = cls.__new__(cls)
+        for name in cls.column_names:
+            setattr(pose_store, name, np.load(os.path.join(directory, name + '.npy'), mmap_mode=mmap_mode))
+        return pose_store
+
+    def save(self, directory):
+        for name in self.column_names:
+            np.save(os.path.join(directory, name + '.npy'), getattr(self, name))
+
+    def __len__(self):
+        return len(self.time)
+
+    @property
+    def is_video(self):
+        return np.unpackbits(self.is_video_bits, count=len(self.time)).astype(np.bool_)
+
+    def get_recordings(self):
+        """
+        Get start and end time of every recording in the log.
+
+        A recording ends at the first sample where the drone is
+        no longer recording, or at the last sample of the log.
+        """
+        is_video = self.is_video
+        if len(is_video) == 0:
+            return []
+        changes = np.diff(is_video.astype(np.int8))
+        start_idx = np.flatnonzero(changes == 1) + 1
+        end_idx = np.flatnonzero(changes == -1) + 1
+        if is_video[0]:
+            start_idx = np.insert(start_idx, 0, 0)
+        if is_video[-1]:
+            end_idx = np.append(end_idx, len(is_video) - 1)
+        return list(zip(self.time[start_idx].tolist(), self.time[end_idx].tolist()))
+
+    def get_nearest_index(self, log_times):
+        idx = np.searchsorted(self.time, log_times)
+        idx = np.clip(idx, 1, len(self.time) - 1)
+        left = self.time[idx - 1]
+        right = self.time[idx]
+        idx = idx - (log_times - left <= right - log_times)
+        return np.clip(idx, 0, len(self.time) - 1)
+
+    @staticmethod
+    def interpolate_angle(angle1, angle2, weight):
+        diff = np.mod(angle2 - angle1 + np.pi, 2 * np.pi) - np.pi
+        return np.mod(angle1 + weight * diff + np.pi, 2 * np.pi) - np.pi
+
+    def get_poses(self, log_times, interpolate=False):
+        """
+        Get height (N), yaw/pitch/roll (N, 3) and lat/lon (N, 2) for an array of log times.
+
+        With interpolate the values are linearly interpolated between
+        the neighbouring samples, taking the shortest way around the
+        circle for the angles.
+        """
+        log_times = np.asarray(log_times, dtype=np.float64)
+        if not interpolate or len(self.time) < 2:
+            idx = self.get_nearest_index(log_times)
+            rotation = np.stack((self.yaw[idx], self.pitch[idx], self.roll[idx]), axis=-1).astype(np.float64)
+            pos = np.stack((self.lat[idx], self.lon[idx]), axis=-1)
+            return self.height[idx].astype(np.float64), rotation, pos
+        idx = np.clip(np.searchsorted(self.time, log_times), 1, len(self.time) - 1)
+        span = self.time[idx] - self.time[idx - 1]
+        weight = np.divide(log_times - self.time[idx - 1], span, out=np.zeros_like(log_times), where=span > 0)
+        weight = np.clip(weight, 0, 1)
+        height = self.interpolate(self.height, idx, weight)
+        rotation = np.stack([self.interpolate_angle(angle[idx - 1].astype(np.float64), angle[idx], weight)
+                             for angle in (self.yaw, self.pitch, self.roll)], axis=-1)
+        pos = np.stack((self.interpolate(self.lat, idx, weight), self.interpolate(self.lon, idx, weight)), axis=-1)
+        return height, rotation, pos
+
+    @staticmethod
+    def interpolate(values, idx, weight):
+        value1 = values[idx - 1].astype(np.float64)
+        return value1 + weight * (values[idx] - value1)
+
+    def get_date_time(self, idx):
+        return datetime.fromtimestamp(self.time[idx])
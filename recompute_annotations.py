@@ -0,0 +1,223 @@
+import os
+import sys
+import csv
+import argparse
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import cv2
+from fov import Fov
+from log_cache import LogCache, UnsupportedLogError
+
+
+class NotAnnotationFileError(ValueError):
+    pass
+
+
+class AnnotationRecomputer:
+    """
+    Recompute the geo data of saved annotations without the GUI.
+
+    Every row of an annotation file holds the pixel coordinates, the
+    size of the video widget and the drone pose the marking was made
+    with. The rows are projected again with the FOV file (and camera
+    parameters) given, or the ones referenced in the file, and
+    length, lat/lon, easting/northing and zone are rewritten. With
+    the log pose source the drone rotation and position are read
+    from the referenced log instead of the saved drone columns.
+    """
+    pose_sources = ('csv', 'log')
+    required_fields = ('length', 'drone height', 'drone yaw', 'drone pitch', 'drone roll', 'drone lat', 'drone lon',
+                       'x1', 'y1', 'x2', 'y2', 'width', 'video name')
+    computed_fields = ('length', 'lat', 'lon', 'easting', 'northing', 'zone')
+
+    def __init__(self, fov_file=None, camera_params_file=None, video_size=None, pose_source='csv'):
+        self.fov_file = fov_file
+        self.camera_params_file = camera_params_file
+        self.video_size = video_size
+        self.pose_source = pose_source
+        self.fovs = {}
+        self.video_sizes = {}
+        self.pose_stores = {}
+        self.log_cache = LogCache()
+
+    def get_fov(self, fov_file):
+        fov = self.fovs.get(fov_file)
+        if fov is None:
+            fov = Fov()
+            fov.set_fov_from_file(fov_file)
+            if self.camera_params_file is not None:
+                fov.set_camera_params(self.camera_params_file)
+            self.fovs[fov_file] = fov
+        return fov
+
+    def get_video_size(self, video_file):
+        """
+        Get the frame size of a video, or the size given if it can not be opened.
+        """
+        if video_file not in self.video_sizes:
+            video_size = self.video_size
+            if video_file and os.path.isfile(video_file):
+                cap = cv2.VideoCapture(video_file)
+                if cap.isOpened():
+                    video_size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+                cap.release()
+            if video_size is None:
+                raise ValueError("Can not read the size of video '%s', use --video-size" % video_file)
+            self.video_sizes[video_file] = video_size
+        return self.video_sizes[video_file]
+
+    def get_pose_store(self, log_file):
+        pose_store = self.pose_stores.get(log_file)
+        if pose_store is None:
+            try:
+                pose_store = self.log_cache.get_pose_store(log_file)
+            except UnsupportedLogError:
+                raise ValueError("Log '%s' must be opened in PorpoiseTracker once before it can be used here" % log_file)
+            self.pose_stores[log_file] = pose_store
+        return pose_store
+
+    @staticmethod
+    def resolve_path(path, annotation_file):
+        """
+        Look for relative paths next to the annotation file if they are not found from the working directory.
+        """
+        if path and not os.path.isabs(path) and not os.path.exists(path):
+            beside_annotation_file = os.path.join(os.path.dirname(annotation_file), path)
+            if os.path.exists(beside_annotation_file):
+                return beside_annotation_file
+        return path
+
+    def recompute_file(self, annotation_file, output_file):
+        with open(annotation_file, 'r', newline='') as csv_file:
+            reader = csv.DictReader(csv_file)
+            field_names = reader.fieldnames
+            rows = list(reader)
+        if field_names is None or not all(field in field_names for field in self.required_fields):
+            raise NotAnnotationFileError('Not an annotation file')
+        groups = {}
+        for row in rows:
+            fov_file = self.fov_file or self.resolve_path(row.get('FOV file'), annotation_file)
+            video_size = self.get_video_size(self.resolve_path(row.get('video name'), annotation_file))
+            groups.setdefault((fov_file, video_size), []).append(row)
+        for (fov_file, video_size), group_rows in groups.items():
+            fov = self.get_fov(fov_file)
+            fov.set_image_size(*video_size)
+            self.recompute_rows(fov, video_size, group_rows, annotation_file)
+        field_names = field_names + [field for field in self.computed_fields if field not in field_names]
+        with open(output_file, 'w', newline='') as csv_file:
+            writer = csv.DictWriter(csv_file, field_names)
+            writer.writeheader()
+            writer.writerows(rows)
+        return len(rows)
+
+    def recompute_rows(self, fov, video_size, rows, annotation_file):
+        """
+        Project all markings of rows sharing FOV and video size in one go.
+
+        Points are projected at their image point, lines at both end
+        points and the midpoint, like MouseDrawHandler does.
+        """
+        is_line = np.array([bool(row.get('length')) for row in rows])
+        markings = np.array([[float(row[key]) for key in ('x1', 'y1', 'x2', 'y2', 'width')] if line else
+                             [float(row['x1']), float(row['y1']), float(row['x1']), float(row['y1']), float(row['width'])]
+                             for row, line in zip(rows, is_line)]).reshape(-1, 5)
+        heights, yaw_pitch_rolls, positions = self.get_poses(rows, annotation_file)
+        scale = video_size[0] / markings[:, 4]
+        start = markings[:, 0:2] * scale[:, np.newaxis]
+        end = markings[:, 2:4] * scale[:, np.newaxis]
+        image_points = np.stack((end, start, (start + end) / 2), axis=1).reshape(-1, 2)
+        world_points, zone_numbers, zone_letters = fov.get_world_points_with_poses(
+            image_points, np.repeat(heights, 3), np.repeat(yaw_pitch_rolls, 3, axis=0), np.repeat(positions, 3, axis=0))
+        world_points = world_points.reshape(-1, 3, 2)
+        zone_numbers = zone_numbers[::3]
+        zone_letters = zone_letters[::3]
+        lengths = np.linalg.norm(world_points[:, 1] - world_points[:, 0], axis=1)
+        centers = world_points[:, 2]
+        lat, lon = fov.convert_utm_array(centers[:, 0], centers[:, 1], zone_numbers, zone_letters)
+        for i, row in enumerate(rows):
+            if is_line[i]:
+                row['length'] = lengths[i]
+            row['lat'] = lat[i]
+            row['lon'] = lon[i]
+            row['easting'] = centers[i, 0]
+            row['northing'] = centers[i, 1]
+            row['zone'] = (int(zone_numbers[i]), str(zone_letters[i]))
+            if self.pose_source == 'log':
+                row['drone yaw'], row['drone pitch'], row['drone roll'] = yaw_pitch_rolls[i]
+                row['drone lat'], row['drone lon'] = positions[i]
+
+    def get_poses(self, rows, annotation_file):
+        heights = np.array([float(row['drone height']) for row in rows])
+        yaw_pitch_rolls = np.array([[float(row['drone yaw']), float(row['drone pitch']), float(row['drone roll'])] for row in rows]).reshape(-1, 3)
+        positions = np.array([[float(row['drone lat']), float(row['drone lon'])] for row in rows]).reshape(-1, 2)
+        if self.pose_source == 'log':
+            for log_file in set(row.get('log file') for row in rows):
+                idx = [i for i, row in enumerate(rows) if row.get('log file') == log_file]
+                log_times = [datetime.fromisoformat(rows[i]['time']).timestamp() for i in idx]
+                pose_store = self.get_pose_store(self.resolve_path(log_file, annotation_file))
+                _, yaw_pitch_rolls[idx], positions[idx] = pose_store.get_poses(log_times)
+        return heights, yaw_pitch_rolls, positions
+
+
+def recompute_annotation_file(annotation_file, output_file, settings):
+    recomputer = AnnotationRecomputer(**settings)
+    return annotation_file, recomputer.recompute_file(annotation_file, output_file)
+
+
+def get_annotation_files(paths):
+    annotation_files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                annotation_files.extend(os.path.join(root, file) for file in sorted(files)
+                                        if file.endswith('.csv') and not file.endswith('_recomputed.csv'))
+        else:
+            annotation_files.append(path)
+    return annotation_files
+
+
+def get_output_file(annotation_file, output_dir, in_place):
+    if in_place:
+        return annotation_file
+    base, extension = os.path.splitext(os.path.basename(annotation_file))
+    directory = output_dir if output_dir is not None else os.path.dirname(annotation_file)
+    return os.path.join(directory, base + '_recomputed' + extension)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Recompute lengths and positions of saved annotations')
+    parser.add_argument('annotations', nargs='+', help='Annotation files or folders to search for annotation files')
+    parser.add_argument('--fov', type=str, help='FOV file to use instead of the one saved with each annotation')
+    parser.add_argument('--cam', type=str, help='Camera parameter file')
+    parser.add_argument('--video-size', type=str, help='Video size WIDTHxHEIGHT for videos that can not be opened')
+    parser.add_argument('--pose', choices=AnnotationRecomputer.pose_sources, default='csv',
+                        help='Take the drone rotation and position from the annotation file (csv) or the referenced log (log)')
+    parser.add_argument('--output-dir', type=str, help='Folder for the recomputed files, default is next to the input')
+    parser.add_argument('--in-place', action='store_true', help='Overwrite the annotation files')
+    parser.add_argument('--jobs', type=int, default=None, help='Number of processes, default is the number of cores')
+    args = parser.parse_args()
+    video_size = tuple(int(size) for size in args.video_size.lower().split('x')) if args.video_size else None
+    settings = {'fov_file': args.fov, 'camera_params_file': args.cam, 'video_size': video_size, 'pose_source': args.pose}
+    if args.output_dir is not None:
+        os.makedirs(args.output_dir, exist_ok=True)
+    annotation_files = get_annotation_files(args.annotations)
+    failed = 0
+    with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+        futures = {executor.submit(recompute_annotation_file, annotation_file,
+                                   get_output_file(annotation_file, args.output_dir, args.in_place), settings): annotation_file
+                   for annotation_file in annotation_files}
+        for future in as_completed(futures):
+            try:
+                annotation_file, num_rows = future.result()
+                print("Recomputed %d annotations in '%s'" % (num_rows, annotation_file))
+            except NotAnnotationFileError:
+                print("Skipping '%s', not an annotation file" % futures[future])
+            except (OSError, ValueError, KeyError, IndexError) as e:
+                failed += 1
+                print("Error recomputing '%s': %s" % (futures[future], e))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
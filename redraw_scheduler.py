@@ -0,0 +1,125 @@
+import time
+import gi
+gi.require_version('GLib', '2.0')
+from gi.repository import GLib
+
+
+class RedrawSubsystem:
+    __slots__ = ('draw_func', 'max_rate', 'args', 'pending', 'last_draw', 'requested', 'drawn', 'merged', 'dropped')
+
+    def __init__(self, draw_func, max_rate):
+        self.draw_func = draw_func
+        self.max_rate = max_rate
+        self.args = ()
+        self.pending = False
+        self.last_draw = None
+        self.requested = 0
+        self.drawn = 0
+        self.merged = 0
+        self.dropped = 0
+
+    def get_next_time(self, frame_interval):
+        """
+        Get the earliest time the subsystem may draw again.
+        """
+        if self.last_draw is None:
+            return 0
+        interval = frame_interval if self.max_rate is None else max(1 / self.max_rate, frame_interval)
+        return self.last_draw + interval
+
+    def is_held(self, now):
+        return self.max_rate is not None and self.last_draw is not None and now < self.last_draw + 1 / self.max_rate
+
+
+class RedrawScheduler:
+    """
+    Merge the redraw requests of the overlay, the plot and other subsystems.
+
+    A request only stores its arguments and schedules a draw, so a
+    burst of requests draws once with the arguments of the last one.
+    Every subsystem draws at most once per display frame and at most
+    max_rate times per second when it has one. Requests that arrive
+    while a draw waits for the next frame are counted as merged,
+    requests that arrive while it waits for the rate limit as dropped.
+    """
+    frame_rate = 60
+
+    def __init__(self):
+        self.subsystems = {}
+        self.source_id = None
+        self.source_time = None
+
+    def add_subsystem(self, name, draw_func, max_rate=None):
+        self.subsystems[name] = RedrawSubsystem(draw_func, max_rate)
+
+    def set_max_rate(self, name, max_rate):
+        """
+        Set the maximum redraws per second of a subsystem, None for one per display frame.
+        """
+        self.subsystems[name].max_rate = max_rate
+
+    def get_request_func(self, name):
+        return lambda *args: self.request(name, *args)
+
+    def request(self, name, *args):
+        subsystem = self.subsystems[name]
+        now = time.monotonic()
+        subsystem.requested += 1
+        if subsystem.pending:
+            if subsystem.is_held(now):
+                subsystem.dropped += 1
+            else:
+                subsystem.merged += 1
+        subsystem.args = args
+        subsystem.pending = True
+        self.schedule(now)
+
+    def schedule(self, now):
+        frame_interval = 1 / self.frame_rate
+        next_time = min(subsystem.get_next_time(frame_interval) for subsystem in self.subsystems.values() if subsystem.pending)
+        next_time = max(next_time, now)
+        if self.source_id is not None:
+            if self.source_time <= next_time:
+                return
+            GLib.source_remove(self.source_id)
+        self.source_time = next_time
+        self.source_id = GLib.timeout_add(int(round((next_time - now) * 1000)), self.on_frame)
+
+    def on_frame(self):
+        self.source_id = None
+        now = time.monotonic()
+        frame_interval = 1 / self.frame_rate
+        for subsystem in self.subsystems.values():
+            # Half a frame of slack, as timeouts are rounded to milliseconds.
+            if subsystem.pending and subsystem.get_next_time(frame_interval) <= now + frame_interval / 2:
+                self.draw(subsystem, now)
+        if any(subsystem.pending for subsystem in self.subsystems.values()):
+            self.schedule(now)
+        return False
+
+    @staticmethod
+    def draw(subsystem, now):
+        args, subsystem.args = subsystem.args, ()
+        subsystem.pending = False
+        subsystem.last_draw = now
+        subsystem.drawn += 1
+        subsystem.draw_func(*args)
+
+    def flush(self):
+        """
+        Draw all pending requests now.
+        """
+        if self.source_id is not None:
+            GLib.source_remove(self.source_id)
+            self.source_id = None
+        now = time.monotonic()
+        for subsystem in self.subsystems.values():
+            if subsystem.pending:
+                self.draw(subsystem, now)
+
+    def get_counters(self):
+        """
+        Get the requested, drawn, merged and dropped redraws of every subsystem.
+        """
+        return {name: {'requested': subsystem.requested, 'drawn': subsystem.drawn, 'merged': subsystem.merged, 'dropped': subsystem.dropped}
+                for name, subsystem in self.subsystems.items()}
@@ -0,0 +1,62 @@
+import os
+import csv
+
+
+class SessionManifest:
+    """
+    The files of one video and where it starts in its flight log.
+
+    Written by survey_ingest.py for every video, so the GUI can open
+    the video, log and FOV file together with the video start time
+    without searching the log for the recording again.
+    """
+    field_names = ['video', 'log file', 'FOV file', 'camera params', 'video start time', 'start offset',
+                   'match method', 'match difference']
+    extension = '.session.csv'
+
+    def __init__(self, video=None, log_file=None, fov_file=None, camera_params=None, video_start_time=None,
+                 start_offset=None, match_method=None, match_difference=None):
+        self.video = video
+        self.log_file = log_file
+        self.fov_file = fov_file
+        self.camera_params = camera_params
+        self.video_start_time = video_start_time
+        self.start_offset = start_offset
+        self.match_method = match_method
+        self.match_difference = match_difference
+
+    @staticmethod
+    def get_session_file(video_file, output_dir=None):
+        base = os.path.splitext(os.path.basename(video_file))[0]
+        directory = output_dir if output_dir is not None else os.path.dirname(video_file)
+        return os.path.join(directory, base + SessionManifest.extension)
+
+    @classmethod
+    def read(cls, session_file):
+        with open(session_file, 'r', newline='') as csv_file:
+            row = next(csv.DictReader(csv_file))
+        directory = os.path.dirname(os.path.abspath(session_file))
+
+        def path(key):
+            value = row.get(key)
+            if not value:
+                return None
+            return os.path.join(directory, value)
+
+        def number(key):
+            value = row.get(key)
+            return float(value) if value else None
+        return cls(path('video'), path('log file'), path('FOV file'), path('camera params'), number('video start time'),
+                   number('start offset'), row.get('match method') or None, number('match difference'))
+
+    def write(self, session_file):
+        """
+        Save the manifest with absolute paths.
+        """
+        values = [self.video, self.log_file, self.fov_file, self.camera_params, self.video_start_time,
+                  self.start_offset, self.match_method, self.match_difference]
+        values[:4] = [os.path.abspath(value) if value else None for value in values[:4]]
+        with open(session_file, 'w', newline='') as csv_file:
+            writer = csv.writer(csv_file, delimiter=',')
+            writer.writerow(self.field_names)
+            writer.writerow(values)
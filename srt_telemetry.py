@@ -0,0 +1,136 @@
+import os
+import re
+from datetime import datetime
+import numpy as np
+from pose_store import PoseStore
+
+
+class SrtTelemetry:
+    """
+    Telemetry from the .SRT subtitle file DJI cameras write next to a video.
+
+    Every subtitle holds the telemetry of one frame (or one second on
+    older firmware): date and time, GPS position, height and on some
+    drones the gimbal angles. Values missing from the file are NaN and
+    are taken from the flight log when the pose store is built. Only the
+    height above the take off point is read; the absolute altitude some
+    firmware writes is left out and the height comes from the log.
+    """
+    timing_pattern = re.compile(r'(\d+):(\d+):(\d+)[,.](\d+)\s*-->')
+    date_time_pattern = re.compile(r'(\d{4})[-./](\d{2})[-./](\d{2})\s+(\d{2}):(\d{2}):(\d{2})(?:[,.](\d{1,3}))?(?:,(\d{3}))?')
+    number = r'\s*:?\s*([-+]?\d+(?:\.\d+)?)'
+    latitude_pattern = re.compile(r'\[latitude' + number)
+    longitude_pattern = re.compile(r'\[longt?itude' + number)
+    gps_pattern = re.compile(r'GPS\s*\(\s*([-+]?\d+(?:\.\d+)?)\s*,\s*([-+]?\d+(?:\.\d+)?)')
+    height_patterns = (re.compile(r'rel_alt' + number), re.compile(r'BAROMETER' + number))
+    gimbal_patterns = (re.compile(r'gb_yaw' + number), re.compile(r'gb_pitch' + number), re.compile(r'gb_roll' + number))
+
+    def __init__(self):
+        self.video_time = None
+        self.time = None
+        self.height = None
+        self.lat = None
+        self.lon = None
+        self.yaw = None
+        self.pitch = None
+        self.roll = None
+
+    @staticmethod
+    def find_srt_file(video_file):
+        base = os.path.splitext(video_file)[0]
+        for extension in ('.SRT', '.srt'):
+            if os.path.isfile(base + extension):
+                return base + extension
+        return None
+
+    def parse(self, srt_file):
+        columns = ([], [], [], [], [], [], [], [])
+        block = []
+        with open(srt_file, encoding='utf-8', errors='replace') as srt:
+            for line in srt:
+                if line.strip():
+                    block.append(line)
+                elif block:
+                    self.parse_block(''.join(block), columns)
+                    block = []
+        if block:
+            self.parse_block(''.join(block), columns)
+        self.video_time, self.time, self.height, self.lat, self.lon, yaw, pitch, roll = [np.array(column, dtype=np.float64) for column in columns]
+        self.yaw = np.radians(yaw)
+        self.pitch = np.radians(pitch)
+        self.roll = np.radians(roll)
+        return self
+
+    def parse_block(self, text, columns):
+        timing = self.timing_pattern.search(text)
+        if timing is None:
+            return
+        hours, minutes, seconds, milliseconds = timing.groups()
+        video_time = int(hours) * 3600 + int(minutes) * 60 + int(seconds) + int(milliseconds) / 10 ** len(milliseconds)
+        text = text[timing.end():]
+        sample = [video_time, self.parse_date_time(text), np.nan, np.nan, np.nan]
+        latitude = self.latitude_pattern.search(text)
+        longitude = self.longitude_pattern.search(text)
+        gps = self.gps_pattern.search(text)
+        if latitude and longitude:
+            sample[3:5] = float(latitude.group(1)), float(longitude.group(1))
+        elif gps:
+            sample[3:5] = float(gps.group(2)), float(gps.group(1))
+        if sample[3] == 0 and sample[4] == 0:
+            sample[3:5] = np.nan, np.nan
+        for pattern in self.height_patterns:
+            match = pattern.search(text)
+            if match:
+                sample[2] = float(match.group(1))
+                break
+        for pattern in self.gimbal_patterns:
+            match = pattern.search(text)
+            sample.append(float(match.group(1)) if match else np.nan)
+        for column, value in zip(columns, sample):
+            column.append(value)
+
+    def parse_date_time(self, text):
+        match = self.date_time_pattern.search(text)
+        if match is None:
+            return np.nan
+        year, month, day, hour, minute, second, milliseconds, microseconds = match.groups()
+        date_time = datetime(int(year), int(month), int(day), int(hour), int(minute), int(second))
+        fraction = 0
+        if milliseconds:
+            fraction += int(milliseconds) / 10 ** len(milliseconds)
+        if microseconds:
+            fraction += int(microseconds) * 1e-6
+        return date_time.timestamp() + fraction
+
+    def has_time(self):
+        return self.time is not None and np.any(np.isfinite(self.time))
+
+    def get_video_start_time(self):
+        """
+        Get the log time at the start of the video from the subtitle time stamps.
+
+        Older firmware only writes whole seconds, so the median
+        over all subtitles is used. Returns None if no subtitle has
+        a time stamp.
+        """
+        if not self.has_time():
+            return None
+        valid = np.isfinite(self.time)
+        return float(np.median(self.time[valid] - self.video_time[valid]))
+
+    def get_pose_store(self, video_start_time, log_pose_store=None):
+        """
+        Build a pose store with one sample per subtitle.
+
+        The samples are placed at log time video_start_time plus the
+        video time of the subtitle. Values missing in the subtitles
+        are looked up in the flight log, and stay NaN without one.
+        """
+        time = video_start_time + self.video_time
+        columns = [self.height, self.yaw, self.pitch, self.roll, self.lat, self.lon]
+        if log_pose_store is not None and len(log_pose_store) > 0:
+            height, rotation, pos = log_pose_store.get_poses(time, interpolate=True)
+            log_columns = [height, rotation[:, 0], rotation[:, 1], rotation[:, 2], pos[:, 0], pos[:, 1]]
+            columns = [np.where(np.isnan(column), log_column, column) for column, log_column in zip(columns, log_columns)]
+        height, yaw, pitch, roll, lat, lon = columns
+        return PoseStore(time, height, yaw, pitch, roll, lat, lon, np.ones(len(time), dtype=np.bool_))
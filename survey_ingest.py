@@ -0,0 +1,183 @@
+import os
+import re
+import sys
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import ffmpeg
+from log_cache import LogCache, UnsupportedLogError
+from srt_telemetry import SrtTelemetry
+from csv_log_parser import CsvLogParser
+from session_manifest import SessionManifest
+
+
+def probe_video(video_file):
+    """
+    Get length, location and SRT start time of a video.
+    """
+    if sys.platform == 'win32':
+        cmd = '.\\lib\\ffprobe'
+    else:
+        cmd = 'ffprobe'
+    probe = ffmpeg.probe(video_file, cmd=cmd)
+    video = {'video': video_file, 'length': float(probe['format']['duration']), 'lat_lon': None, 'srt_start_time': None}
+    match = re.match(r'([-+]\d+.\d+)([-+]\d+.\d+)([-+]\d+.\d+)', probe['format'].get('tags', {}).get('location', ''))
+    if match:
+        video['lat_lon'] = (float(match.group(1)), float(match.group(2)))
+    srt_file = SrtTelemetry.find_srt_file(video_file)
+    if srt_file is not None:
+        srt_telemetry = SrtTelemetry().parse(srt_file)
+        if srt_telemetry.has_time():
+            video['srt_start_time'] = srt_telemetry.get_video_start_time()
+    return video
+
+
+def read_log(log_file):
+    """
+    Parse a log into the log cache and get its recordings with the position at their start.
+    """
+    pose_store = LogCache().get_pose_store(log_file)
+    recordings = []
+    for start, end in pose_store.get_recordings():
+        idx = pose_store.get_nearest_index(start)
+        recordings.append((start, end, float(pose_store.lat[idx]), float(pose_store.lon[idx])))
+    return {'log file': log_file, 'start': float(pose_store.time[0]), 'end': float(pose_store.time[-1]), 'recordings': recordings}
+
+
+class SurveyIngest:
+    """
+    Pair all videos of a survey with their flight logs.
+
+    Videos are probed and logs parsed in a process pool. A video with
+    time stamps in its SRT file is placed in the log covering that
+    time. Other videos are matched to a recording in any log like
+    DroneLog.get_video_start_time does, by location if the video has
+    one and else by length, using every recording only once, best
+    matches first. Location differences are in degrees and length
+    differences in seconds, so they are not compared with each other:
+    all location matches are made before the length matches. A session
+    manifest is written for every video.
+    """
+    video_extensions = ('.mov', '.mp4')
+    log_extensions = ('.txt', '.csv')
+    match_methods = ('location', 'length')
+
+    def __init__(self, fov_file=None, camera_params=None, output_dir=None, jobs=None):
+        self.fov_file = fov_file
+        self.camera_params = camera_params
+        self.output_dir = output_dir
+        self.jobs = jobs
+
+    @staticmethod
+    def find_files(paths, extensions):
+        found = []
+        for path in paths:
+            if os.path.isdir(path):
+                for root, _, files in os.walk(path):
+                    found.extend(os.path.join(root, file) for file in sorted(files) if file.lower().endswith(extensions))
+            else:
+                found.append(path)
+        return found
+
+    @staticmethod
+    def is_log_file(log_file):
+        if not log_file.lower().endswith('.csv'):
+            return True
+        with open(log_file, 'rb') as fi:
+            return CsvLogParser.time_field.encode() in fi.readline()
+
+    def run(self, video_paths, log_paths):
+        video_files = self.find_files(video_paths, self.video_extensions)
+        log_files = [log_file for log_file in self.find_files(log_paths, self.log_extensions) if self.is_log_file(log_file)]
+        videos = []
+        logs = []
+        num_tasks = len(video_files) + len(log_files)
+        with ProcessPoolExecutor(max_workers=self.jobs) as executor:
+            futures = {executor.submit(probe_video, video_file): video_file for video_file in video_files}
+            futures.update({executor.submit(read_log, log_file): log_file for log_file in log_files})
+            for done, future in enumerate(as_completed(futures), 1):
+                file = futures[future]
+                try:
+                    result = future.result()
+                except UnsupportedLogError:
+                    print("[%d/%d] Skipping '%s', open it in PorpoiseTracker once to convert it" % (done, num_tasks, file))
+                    continue
+                except (OSError, ValueError, KeyError, IndexError, ffmpeg.Error) as e:
+                    print("[%d/%d] Error reading '%s': %s" % (done, num_tasks, file, e))
+                    continue
+                if 'log file' in result:
+                    logs.append(result)
+                    print("[%d/%d] Parsed log '%s', %d recordings" % (done, num_tasks, file, len(result['recordings'])))
+                else:
+                    videos.append(result)
+                    print("[%d/%d] Probed video '%s'" % (done, num_tasks, file))
+        manifests = self.match(sorted(videos, key=lambda video: video['video']), sorted(logs, key=lambda log: log['log file']))
+        for manifest in manifests:
+            session_file = SessionManifest.get_session_file(manifest.video, self.output_dir)
+            manifest.write(session_file)
+            print("%s: '%s' at %.1f s, %s difference %.2f" % (os.path.basename(session_file), manifest.log_file,
+                                                               manifest.start_offset, manifest.match_method, manifest.match_difference))
+        for video in videos:
+            if video['video'] not in [manifest.video for manifest in manifests]:
+                print("No log found for '%s'" % video['video'])
+        return manifests
+
+    def match(self, videos, logs):
+        manifests = []
+        candidates = []
+        used_recordings = set()
+        for video_idx, video in enumerate(videos):
+            if video['srt_start_time'] is not None:
+                best = None
+                for log in logs:
+                    start = video['srt_start_time']
+                    difference = max(log['start'] - start, 0) + max(start + video['length'] - log['end'], 0)
+                    if difference < video['length'] and (best is None or difference < best[0]):
+                        best = (difference, log)
+                if best is not None:
+                    manifests.append(self.get_manifest(video, best[1], video['srt_start_time'], 'srt', best[0]))
+                    continue
+            for log in logs:
+                for recording_idx, (start, end, lat, lon) in enumerate(log['recordings']):
+                    if video['lat_lon'] is not None:
+                        difference = abs(lat - video['lat_lon'][0]) + abs(lon - video['lat_lon'][1])
+                        method = 'location'
+                    else:
+                        difference = abs(end - start - video['length'])
+                        method = 'length'
+                    candidates.append((difference, video_idx, log['log file'], recording_idx, method))
+        matched_videos = set(manifest.video for manifest in manifests)
+        logs_by_file = {log['log file']: log for log in logs}
+        candidates.sort(key=lambda candidate: (self.match_methods.index(candidate[4]), candidate[0], candidate[1]))
+        for difference, video_idx, log_file, recording_idx, method in candidates:
+            video = videos[video_idx]
+            if video['video'] in matched_videos or (log_file, recording_idx) in used_recordings:
+                continue
+            log = logs_by_file[log_file]
+            manifests.append(self.get_manifest(video, log, log['recordings'][recording_idx][0], method, difference))
+            matched_videos.add(video['video'])
+            used_recordings.add((log_file, recording_idx))
+        return manifests
+
+    def get_manifest(self, video, log, video_start_time, method, difference):
+        return SessionManifest(video['video'], log['log file'], self.fov_file, self.camera_params, video_start_time,
+                               video_start_time - log['start'], method, float(np.round(difference, 6)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pair survey videos with flight logs and write a session file per video')
+    parser.add_argument('--videos', nargs='+', required=True, help='Video files or folders')
+    parser.add_argument('--logs', nargs='+', required=True, help='Drone log files or folders')
+    parser.add_argument('--fov', type=str, help='FOV file to add to the sessions')
+    parser.add_argument('--cam', type=str, help='Camera parameter file to add to the sessions')
+    parser.add_argument('--output-dir', type=str, help='Folder for the session files, default is next to the videos')
+    parser.add_argument('--jobs', type=int, default=None, help='Number of processes, default is the number of cores')
+    args = parser.parse_args()
+    if args.output_dir is not None:
+        os.makedirs(args.output_dir, exist_ok=True)
+    survey_ingest = SurveyIngest(args.fov, args.cam, args.output_dir, args.jobs)
+    survey_ingest.run(args.videos, args.logs)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+import os
+import sys
+import numpy as np
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from annotation_store import AnnotationStore
+from tracked_object import MarkObject
+
+size = (1000, 500)
+position = 2000000000
+
+
+def make_point(x, y):
+    return MarkObject('porpoise', None, np.array([x, y, size[0], size[1], position]), None, 'video.mp4', '', '')
+
+
+def make_line(x1, y1, x2, y2):
+    return MarkObject('porpoise', None, np.array([x1, y1, x2, y2, size[0], size[1], position]), None, 'video.mp4', '', '')
+
+
+def hit_test(store, point):
+    return store.hit_test('video.mp4', position, 0, point, size, 10)
+
+
+def test_hit_test_finds_nearest_marking():
+    store = AnnotationStore()
+    point = make_point(100, 100)
+    line = make_line(200, 200, 400, 200)
+    store.add('points', point)
+    store.add('lines', line)
+    assert hit_test(store, (103, 104))[0] is point
+    hit = hit_test(store, (300, 205))
+    assert hit[0] is line
+    assert np.isclose(hit[1], np.hypot(100, 5)) and np.isclose(hit[2], np.hypot(100, 5))
+    assert hit_test(store, (600, 400)) is None
+
+
+def test_hit_test_skips_hidden_point():
+    store = AnnotationStore()
+    point = make_point(100, 100)
+    store.add('points', point)
+    point.hide = True
+    assert hit_test(store, (100, 100)) is None
+    shown_point = make_point(106, 100)
+    store.add('points', shown_point)
+    assert hit_test(store, (100, 100))[0] is shown_point
+
+
+def test_hit_test_skips_hidden_line():
+    store = AnnotationStore()
+    line = make_line(200, 200, 400, 200)
+    store.add('lines', line)
+    line.hide = True
+    assert hit_test(store, (300, 200)) is None
+    line.hide = False
+    assert hit_test(store, (300, 200))[0] is line
@@ -0,0 +1,117 @@
+import os
+import sys
+import csv
+from datetime import datetime
+import numpy as np
+import pytest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from csv_log_parser import CsvLogParser
+from pose_store import PoseStore
+
+field_names = ['CUSTOM.updateTime', 'OSD.flyTime [s]', 'OSD.latitude', 'OSD.longitude', 'OSD.height [m]', 'OSD.flycState',
+               'GIMBAL.pitch', 'GIMBAL.roll', 'GIMBAL.yaw', 'GIMBAL.mode', 'CUSTOM.isPhoto', 'CUSTOM.isVideo']
+
+
+def parse_row_by_row(log_file):
+    """
+    The csv module parser the vectorized one replaced, one row at a time, into a PoseStore.
+    """
+    with open(log_file, 'rb') as fi:
+        text = fi.read().replace(b'\x00', b'').decode('iso8859_10')
+    reader = csv.reader(text.splitlines())
+    header = next(reader)
+    idx = [header.index(name) for name in ('CUSTOM.updateTime', 'OSD.height [m]', 'GIMBAL.yaw', 'GIMBAL.pitch', 'GIMBAL.roll',
+                                           'OSD.latitude', 'OSD.longitude', 'CUSTOM.isVideo')]
+    columns = ([], [], [], [], [], [], [], [])
+    for row in reader:
+        if not row or row[idx[0]] == '':
+            continue
+        try:
+            time = datetime.strptime(row[idx[0]], '%Y/%m/%d %H:%M:%S.%f').timestamp()
+        except ValueError:
+            time = datetime.strptime(row[idx[0]], '%Y/%m/%d %H:%M:%S').timestamp()
+        try:
+            sample = (time,) + tuple(float(row[i]) for i in idx[1:7]) + (row[idx[7]] != '',)
+        except ValueError:
+            continue
+        for column, value in zip(columns, sample):
+            column.append(value)
+    time, height, yaw, pitch, roll, lat, lon, is_video = [np.array(column) for column in columns]
+    return PoseStore(time, height, np.radians(yaw), np.radians(pitch), np.radians(roll), lat, lon, is_video.astype(np.bool_))
+
+
+def make_row(rng, i):
+    seconds = i // 10
+    update_time = '2021/03/%02d %02d:%02d:%02d' % (27 + seconds // 86400, seconds // 3600 % 24, seconds // 60 % 60, seconds % 60)
+    if i % 10:
+        update_time += '.%s' % ('%06d' % (i % 10 * 100000))[:1 + i % 6]
+    row = [update_time, '%.1f' % (i / 10), '%.8f' % (55.7 + rng.normal() * 1e-3), '%.8f' % (12.5 + rng.normal() * 1e-3),
+           '%.1f' % rng.uniform(0, 120), 'GPS_Atti', '%.1f' % rng.uniform(-90, 0), '0.0', '%.1f' % rng.uniform(-180, 180), 'YawFollow',
+           '', 'Recording' if i // 200 % 2 else '']
+    kind = i % 97
+    if kind == 1:
+        row[0] = ''
+    elif kind == 2:
+        row[4] = ''
+    elif kind == 3:
+        row[2] = 'n/a'
+    elif kind == 4:
+        row[5] = 'Atti, "manual"'
+    elif kind == 5:
+        row[8] = '1e2'
+    elif kind == 6:
+        row[6] = '-0'
+    return row
+
+
+def write_log(path, num_rows, newline='\n', nul_bytes=False):
+    rng = np.random.default_rng(1)
+    lines = [','.join(field_names)]
+    for i in range(num_rows):
+        row = make_row(rng, i)
+        if '"' in row[5]:
+            row[5] = '"%s"' % row[5].replace('"', '""')
+        lines.append(','.join(row))
+    data = (newline.join(lines) + newline).encode('iso8859_10')
+    if nul_bytes:
+        data = data.replace(b',', b'\x00,')
+    with open(path, 'wb') as fo:
+        fo.write(data)
+
+
+def assert_same(log_file, chunk_size, jobs=1):
+    expected = parse_row_by_row(log_file)
+    actual = CsvLogParser(chunk_size, jobs).parse(log_file)
+    assert len(actual) == len(expected)
+    for column in ('time', 'height', 'yaw', 'pitch', 'roll', 'lat', 'lon', 'is_video'):
+        assert np.array_equal(getattr(actual, column), getattr(expected, column)), column
+    assert actual.get_recordings() == expected.get_recordings()
+
+
+@pytest.mark.parametrize('chunk_size', [16, 257, 4096, 1 << 24])
+@pytest.mark.parametrize('newline', ['\n', '\r\n'])
+def test_parser_matches_row_by_row_parser(tmp_path, chunk_size, newline):
+    log_file = str(tmp_path / 'log.csv')
+    write_log(log_file, 1500, newline)
+    assert_same(log_file, chunk_size)
+
+
+@pytest.mark.parametrize('chunk_size', [16, 1000, 1 << 24])
+def test_parser_strips_nul_bytes(tmp_path, chunk_size):
+    log_file = str(tmp_path / 'log.csv')
+    write_log(log_file, 1000, nul_bytes=True)
+    assert_same(log_file, chunk_size)
+
+
+def test_parser_in_process_pool(tmp_path):
+    log_file = str(tmp_path / 'log.csv')
+    write_log(log_file, 1500, '\r\n', nul_bytes=True)
+    assert_same(log_file, 10000, jobs=2)
+
+
+def test_parser_reads_last_line_without_newline(tmp_path):
+    log_file = str(tmp_path / 'log.csv')
+    write_log(log_file, 500)
+    with open(log_file, 'rb+') as fo:
+        fo.truncate(os.path.getsize(log_file) - 1)
+    assert_same(log_file, 1000)
@@ -0,0 +1,100 @@
+import os
+import sys
+import numpy as np
+import pytest
+import utm
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fov import Fov
+
+width = 3840
+height = 2160
+tolerance = 0.05
+
+
+def make_fov(k1, k2):
+    fov = Fov()
+    fov.camera_matrix = np.array([[2800.0, 0, width / 2], [0, 2800.0, height / 2], [0, 0, 1]])
+    fov.dist_coefficients = np.array([k1, k2, 0, 0, 0])
+    fov.set_image_size(width, height)
+    return fov
+
+
+@pytest.mark.parametrize('k1, k2', [(-0.45, 0.2), (-0.1, 0.05), (0.0, 0.0), (0.2, -0.05)])
+def test_undistortion_table_matches_opencv(k1, k2):
+    """
+    The middle of every grid cell is where bilinear lookup is furthest from OpenCV.
+    """
+    fov = make_fov(k1, k2)
+    assert fov.undistortion_table is not None
+    x, y = fov.undistortion_grid
+    centers = np.stack(np.meshgrid((x[:-1] + x[1:]) / 2, (y[:-1] + y[1:]) / 2), axis=-1).reshape(-1, 2)
+    error = fov.undistort_points(centers) - fov.undistort_points_cv2(centers)
+    assert np.max(np.linalg.norm(error, axis=1)) <= tolerance
+
+
+def test_points_outside_image_use_opencv():
+    fov = make_fov(-0.2, 0.05)
+    points = np.array([[-10.0, 50.0], [width + 1.0, height / 2], [100.0, height + 5.0]])
+    assert np.array_equal(fov.undistort_points(points), fov.undistort_points_cv2(points))
+
+
+def test_image_size_from_undistorted_corners():
+    fov = make_fov(-0.2, 0.05)
+    corners = fov.undistort_points_cv2(np.array([[0, 0], [width, 0], [width, height], [0, height]], dtype=np.float64))
+    assert fov.image_size[0] == pytest.approx((corners[1][0] - corners[0][0] + corners[2][0] - corners[3][0]) / 2, abs=tolerance)
+    assert fov.image_size[1] == pytest.approx((corners[3][1] - corners[0][1] + corners[2][1] - corners[1][1]) / 2, abs=tolerance)
+
+
+def get_world_point_one_by_one(fov, image_point, drone_height, yaw_pitch_roll, pos):
+    """
+    The projection of a single point as it was before the batched API.
+    """
+    image_plane_size = np.tan(np.array([fov.horizontal_fov, fov.vertical_fov]) / 2) * 2
+    from_center = np.asarray(image_point, dtype=np.float64) - np.array(fov.image_size) / 2
+    unit_vector = np.array([from_center[0] / fov.image_size[0] * image_plane_size[0], 1,
+                            -from_center[1] / fov.image_size[1] * image_plane_size[1]])
+    rotated_vector = np.matmul(fov.rotation(-yaw_pitch_roll[0], yaw_pitch_roll[1], yaw_pitch_roll[2]), unit_vector)
+    ground_vector = rotated_vector / rotated_vector[2] * -drone_height
+    east, north, zone_number, zone_letter = utm.from_latlon(*pos)
+    return ground_vector[:2] + np.array([east, north]), zone_number, zone_letter
+
+
+def make_poses(num_points):
+    rng = np.random.default_rng(7)
+    image_points = rng.uniform((0, 0), (width, height), (num_points, 2))
+    heights = rng.uniform(5, 120, num_points)
+    yaw_pitch_rolls = np.stack((rng.uniform(-np.pi, np.pi, num_points), rng.uniform(-np.pi / 2, -0.3, num_points),
+                                rng.uniform(-0.1, 0.1, num_points)), axis=-1)
+    positions = np.stack((rng.uniform(55.5, 56, num_points), rng.uniform(11.5, 12.5, num_points)), axis=-1)
+    return image_points, heights, yaw_pitch_rolls, positions
+
+
+def test_rotations_match_rotation():
+    _, _, yaw_pitch_rolls, _ = make_poses(50)
+    rotations = Fov.rotations(*yaw_pitch_rolls.T)
+    for rotation, yaw_pitch_roll in zip(rotations, yaw_pitch_rolls):
+        assert np.allclose(rotation, Fov().rotation(*yaw_pitch_roll), rtol=0, atol=1e-12)
+
+
+def test_world_points_with_poses_match_one_by_one():
+    fov = Fov()
+    fov.set_fov(80, 50)
+    fov.set_image_size(width, height)
+    image_points, heights, yaw_pitch_rolls, positions = make_poses(200)
+    world_points, zone_numbers, zone_letters = fov.get_world_points_with_poses(image_points, heights, yaw_pitch_rolls, positions)
+    for i in range(len(image_points)):
+        world_point, zone_number, zone_letter = get_world_point_one_by_one(fov, image_points[i], heights[i], yaw_pitch_rolls[i], positions[i])
+        assert np.allclose(world_points[i], world_point, rtol=0, atol=1e-6)
+        assert (zone_numbers[i], zone_letters[i]) == (zone_number, zone_letter)
+
+
+def test_world_points_of_one_pose_match_one_by_one():
+    fov = Fov()
+    fov.set_fov(80, 50)
+    fov.set_image_size(width, height)
+    image_points, heights, yaw_pitch_rolls, positions = make_poses(20)
+    world_points = fov.get_world_points(image_points, heights[0], yaw_pitch_rolls[0], positions[0])
+    for image_point, world_point in zip(image_points, world_points):
+        expected = get_world_point_one_by_one(fov, image_point, heights[0], yaw_pitch_rolls[0], positions[0])[0]
+        assert np.allclose(world_point, expected, rtol=0, atol=1e-6)
+        assert np.allclose(fov.get_world_point(image_point, heights[0], yaw_pitch_rolls[0], positions[0]), expected, rtol=0, atol=1e-6)
@@ -0,0 +1,109 @@
+import os
+import sys
+import json
+import pytest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import log_library
+from log_library import LogLibrary
+from log_cache import UnsupportedLogError
+
+
+def fake_read_log(log_file):
+    """
+    Read the recordings written as json into a fake log, instead of parsing a flight log.
+    """
+    with open(log_file) as fi:
+        content = json.load(fi)
+    if content == 'unsupported':
+        raise UnsupportedLogError('Not converted with TXTlogToCSVtool yet')
+    if content == 'broken':
+        raise ValueError('Broken log')
+    return {'log file': log_file, 'start': content[0][0], 'end': content[-1][1], 'recordings': content}
+
+
+def write_log(log_dir, name, content):
+    with open(os.path.join(log_dir, name), 'w') as fo:
+        json.dump(content, fo)
+
+
+@pytest.fixture
+def log_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(log_library, 'read_log', fake_read_log)
+    log_dir = tmp_path / 'logs'
+    log_dir.mkdir()
+    write_log(log_dir, 'a.txt', [[1000, 1100, 55.0, 12.0], [1200, 1500, 55.1, 12.1]])
+    write_log(log_dir, 'b.txt', [[5000, 5060, 56.0, 10.0]])
+    return str(log_dir)
+
+
+def make_library(log_dir):
+    return LogLibrary(log_dir, cache_dir=os.path.join(os.path.dirname(log_dir), 'cache'), jobs=1)
+
+
+def test_update_only_parses_new_and_changed_logs(log_dir):
+    library = make_library(log_dir)
+    assert library.update() == 2
+    assert len(library) == 3
+    library = make_library(log_dir)
+    assert len(library) == 3
+    assert library.update() == 0
+    write_log(log_dir, 'b.txt', [[5000, 5060, 56.0, 10.0], [6000, 6100, 56.0, 10.1]])
+    write_log(log_dir, 'c.txt', [[9000, 9010, 57.0, 11.0]])
+    assert library.update() == 2
+    assert len(library) == 5
+    os.remove(os.path.join(log_dir, 'a.txt'))
+    assert library.update() == 0
+    assert sorted(library.logs) == ['b.txt', 'c.txt']
+    assert len(library) == 3
+
+
+def test_failing_logs_are_skipped_and_parsed_again(log_dir):
+    write_log(log_dir, 'broken.txt', 'broken')
+    write_log(log_dir, 'unsupported.txt', 'unsupported')
+    library = make_library(log_dir)
+    assert library.update() == 4
+    assert sorted(library.logs) == ['a.txt', 'b.txt']
+    assert library.update() == 2
+    write_log(log_dir, 'broken.txt', [[7000, 7100, 55.5, 12.5]])
+    library.update()
+    assert sorted(library.logs) == ['a.txt', 'b.txt', 'broken.txt']
+
+
+def test_stopped_update_keeps_the_logs_parsed_so_far(log_dir):
+    library = make_library(log_dir)
+    update = library.update_generator()
+    assert next(update) == 0
+    assert library.num_changed == 2
+    for done in update:
+        if done > 0:
+            break
+    update.close()
+    with open(library.index_file) as fi:
+        saved = json.load(fi)['logs']
+    assert len(saved) >= 1
+    assert make_library(log_dir).update() == 2 - len(saved)
+
+
+def test_get_by_time(log_dir):
+    library = make_library(log_dir)
+    library.update()
+    names = lambda found: sorted((library.recordings[idx][0], library.recordings[idx][1]) for idx in found)
+    assert names(library.get_by_time(1050, 1060)) == [('a.txt', 1000)]
+    assert names(library.get_by_time(1100, 1200)) == [('a.txt', 1000), ('a.txt', 1200)]
+    assert names(library.get_by_time(1499, 5001)) == [('a.txt', 1200), ('b.txt', 5000)]
+    assert library.get_by_time(2000, 4000) == []
+
+
+def test_find_recording(log_dir):
+    library = make_library(log_dir)
+    assert library.find_recording(60) is None
+    library.update()
+    by_location = library.find_recording(300, lat_lon=(55.1001, 12.1))
+    assert (os.path.basename(by_location['log file']), by_location['start'], by_location['method']) == ('a.txt', 1200, 'location')
+    by_time = library.find_recording(60, creation_time=5010)
+    assert (os.path.basename(by_time['log file']), by_time['start'], by_time['method']) == ('b.txt', 5000, 'time')
+    by_length = library.find_recording(99)
+    assert (os.path.basename(by_length['log file']), by_length['start'], by_length['method']) == ('a.txt', 1000, 'length')
+    assert by_length['difference'] == pytest.approx(1)
+    in_time_away_from_location = library.find_recording(60, lat_lon=(55.1, 12.1), creation_time=5010)
+    assert (in_time_away_from_location['start'], in_time_away_from_location['method']) == (5000, 'location')
@@ -0,0 +1,110 @@
+import os
+import sys
+import types
+from unittest import mock
+import pytest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeGLib:
+    """
+    GLib timeouts on a fake clock, run by advance.
+    """
+    def __init__(self):
+        self.now = 0.0
+        self.sources = {}
+        self.next_id = 1
+
+    def monotonic(self):
+        return self.now
+
+    def timeout_add(self, interval, func):
+        source_id = self.next_id
+        self.next_id += 1
+        self.sources[source_id] = (self.now + interval / 1000, func)
+        return source_id
+
+    def source_remove(self, source_id):
+        del self.sources[source_id]
+
+    def advance(self, seconds):
+        end = self.now + seconds
+        while self.sources:
+            source_id, (due, func) = min(self.sources.items(), key=lambda item: item[1][0])
+            if due > end:
+                break
+            del self.sources[source_id]
+            self.now = max(self.now, due)
+            func()
+        self.now = end
+
+
+gi = types.ModuleType('gi')
+gi.require_version = lambda *_: None
+gi.repository = types.ModuleType('gi.repository')
+gi.repository.GLib = None
+with mock.patch.dict(sys.modules, {'gi': gi, 'gi.repository': gi.repository}):
+    import redraw_scheduler
+
+
+@pytest.fixture
+def glib(monkeypatch):
+    fake_glib = FakeGLib()
+    monkeypatch.setattr(redraw_scheduler, 'GLib', fake_glib)
+    monkeypatch.setattr(redraw_scheduler, 'time', fake_glib)
+    return fake_glib
+
+
+def make_scheduler(max_rate=None):
+    draws = []
+    scheduler = redraw_scheduler.RedrawScheduler()
+    scheduler.add_subsystem('plot', lambda *args: draws.append(args), max_rate)
+    return scheduler, draws
+
+
+def request_every(glib, scheduler, interval, duration):
+    num_requests = int(round(duration / interval))
+    for i in range(num_requests):
+        scheduler.request('plot', i)
+        glib.advance(interval)
+    glib.advance(1)
+    return num_requests
+
+
+def test_burst_draws_once_with_last_arguments(glib):
+    scheduler, draws = make_scheduler()
+    for i in range(100):
+        scheduler.request('plot', i)
+    glib.advance(1)
+    assert draws == [(99,)]
+    assert scheduler.get_counters()['plot'] == {'requested': 100, 'drawn': 1, 'merged': 99, 'dropped': 0}
+
+
+def test_draws_at_most_once_per_frame(glib):
+    scheduler, draws = make_scheduler()
+    num_requests = request_every(glib, scheduler, 0.001, 1)
+    counters = scheduler.get_counters()['plot']
+    assert counters['drawn'] <= redraw_scheduler.RedrawScheduler.frame_rate + 1
+    assert counters['drawn'] + counters['merged'] + counters['dropped'] == num_requests
+    assert counters['dropped'] == 0
+    assert draws[-1] == (num_requests - 1,)
+
+
+def test_max_rate_drops_requests(glib):
+    scheduler, draws = make_scheduler(max_rate=10)
+    num_requests = request_every(glib, scheduler, 0.01, 1)
+    counters = scheduler.get_counters()['plot']
+    assert 9 <= counters['drawn'] <= 11
+    assert counters['dropped'] > counters['merged']
+    assert counters['drawn'] + counters['merged'] + counters['dropped'] == num_requests
+    assert draws[-1] == (num_requests - 1,)
+
+
+def test_flush_draws_pending_requests_now(glib):
+    scheduler, draws = make_scheduler(max_rate=1)
+    scheduler.request('plot', 1)
+    glib.advance(0.1)
+    scheduler.request('plot', 2)
+    scheduler.flush()
+    assert draws == [(1,), (2,)]
+    assert not glib.sources
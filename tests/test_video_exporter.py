@@ -0,0 +1,127 @@
+import os
+import sys
+import time
+import numpy as np
+import cv2
+import pytest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from video_exporter import VideoExporter
+
+num_frames = 30
+
+
+class FakeWriter:
+    def __init__(self, write_error=None, release_error=None):
+        self.write_error = write_error
+        self.release_error = release_error
+        self.frames = []
+        self.released = False
+
+    def write(self, frame):
+        if self.write_error is not None:
+            raise self.write_error
+        self.frames.append(int(frame[0, 0, 0]))
+
+    def release(self):
+        self.released = True
+        if self.release_error is not None:
+            raise self.release_error
+
+
+class FailingCapture:
+    def __init__(self):
+        self.released = False
+
+    def read(self):
+        raise cv2.error('Decoding failed')
+
+    def set(self, *_):
+        return True
+
+    def release(self):
+        self.released = True
+
+
+@pytest.fixture
+def video_file(tmp_path):
+    video_file = str(tmp_path / 'video.avi')
+    writer = cv2.VideoWriter(video_file, cv2.VideoWriter_fourcc(*'MJPG'), 10, (64, 48))
+    for i in range(num_frames):
+        writer.write(np.full((48, 64, 3), 8 * i, dtype=np.uint8))
+    writer.release()
+    return video_file
+
+
+def make_exporter(video_file, writer, buckets=None, drawn=None, **kwargs):
+    exporter = VideoExporter(video_file, video_file + '.out.avi', lambda *_: buckets or {},
+                             lambda frame, kind, marking: drawn.append(marking), **kwargs)
+    exporter.get_writer = lambda clip_idx: writer
+    return exporter
+
+
+def run(exporter, timeout=10):
+    exporter.start()
+    end = time.monotonic() + timeout
+    while not exporter.finished and time.monotonic() < end:
+        time.sleep(0.01)
+    assert exporter.finished
+    exporter.join()
+
+
+def test_export_writes_all_frames(video_file):
+    writer = FakeWriter()
+    drawn = []
+    exporter = make_exporter(video_file, writer, {3: [('points', 'a')], 7: [('lines', 'b')]}, drawn)
+    run(exporter)
+    assert exporter.error is None and not exporter.cancelled
+    assert exporter.frames_done == len(writer.frames) == num_frames
+    assert writer.released
+    assert drawn == ['a', 'b']
+
+
+def test_export_of_segments(video_file):
+    writer = FakeWriter()
+    exporter = make_exporter(video_file, writer, {5: [('points', 'a')], 20: [('points', 'b')]}, [], padding=0.2)
+    assert [clip[1:3] for clip in exporter.clips] == [(3, 8), (18, 23)]
+    run(exporter)
+    assert exporter.error is None
+    assert exporter.frames_done == exporter.frame_num == 10
+
+
+@pytest.mark.parametrize('writer', [FakeWriter(release_error=RuntimeError('ffmpeg exited with code 1')),
+                                    FakeWriter(release_error=BrokenPipeError()),
+                                    FakeWriter(write_error=BrokenPipeError(), release_error=BrokenPipeError())])
+def test_failing_writer_finishes_with_error(video_file, writer):
+    exporter = make_exporter(video_file, writer)
+    run(exporter)
+    assert exporter.error is not None
+    assert exporter.cancelled
+    assert writer.released
+
+
+def test_writer_that_can_not_be_opened(video_file):
+    exporter = make_exporter(video_file, None)
+
+    def get_writer(clip_idx):
+        raise FileNotFoundError('ffmpeg')
+    exporter.get_writer = get_writer
+    run(exporter)
+    assert isinstance(exporter.error, FileNotFoundError)
+
+
+def test_failing_decoder_releases_the_capture(video_file):
+    exporter = make_exporter(video_file, FakeWriter())
+    exporter.cap.release()
+    exporter.cap = FailingCapture()
+    run(exporter)
+    assert isinstance(exporter.error, cv2.error)
+    assert exporter.cap.released
+
+
+def test_cancel(video_file):
+    writer = FakeWriter()
+    exporter = make_exporter(video_file, writer)
+    exporter.cancel()
+    run(exporter)
+    assert exporter.cancelled
+    assert exporter.error is None
@@ -1,4 +1,6 @@
 class MarkObject:
+    __slots__ = ('video', 'log_file', 'fov_file', 'name', 'color', 'marking', 'data', 'hide')
+
     def __init__(self, name, color, marking, data, from_video, log_file, fov_file):
         self.video = from_video
         self.log_file = log_file
@@ -11,8 +11,12 @@ class GridHandler:
         self.current_video_iter = None
         self.current_video = None
         self.video_dict = {}
+        self.name_dict = {}
+        self.pending_markings = {}
+        self.selected_path = None
         self.remove_marking_func = None
         self.update_draw_markings_func = None
+        self.marking_changed_func = None
         self.current_selection = None
         self.current_iter = None
         self.current_name = None
@@ -85,6 +89,7 @@ class GridHandler:
         self.tree_view.append_column(self.hide_column)
         self.scrolled_window.add(self.tree_view)
         self.tree_view.set_expander_column(self.name_column)
+        self.tree_view.connect('test-expand-row', self.on_test_expand_row)
 
     def selection_function(self, selection, tree_store, path, other):
         str_path = str(path).split(':')
@@ -100,11 +105,17 @@ class GridHandler:
             self.tree_view.collapse_row(self.tree_store.get_path(self.current_video_iter))
         if video in self.video_dict:
             self.current_video_iter = self.video_dict[video]
-            self.tree_view.expand_row(self.tree_store.get_path(self.current_video_iter), True)
+            if any(key[0] == video for key in self.pending_markings):
+                self.detach_model()
+                self.materialise_video(self.current_video_iter)
+                self.attach_model()
+            else:
+                self.tree_view.expand_row(self.tree_store.get_path(self.current_video_iter), True)
         else:
             self.current_video_iter = self.tree_store.append(None, [video, '', '', False, None, Gdk.RGBA()])
             self.video_dict.update({video: self.current_video_iter})
             tree_iter = self.tree_store.append(self.current_video_iter, ['Doodles', '', '', False, None, self.color])
+            self.name_dict[(video, 'Doodles')] = tree_iter
             self.tree_view.expand_row(self.tree_store.get_path(self.current_video_iter), True)
             self.tree_select.select_iter(tree_iter)
         self.update_draw_markings_func()
@@ -114,19 +125,30 @@ class GridHandler:
         if self.current_selection:
             marking = self.tree_store[self.current_iter][4]
             marking.color = color
+            self.marking_changed_func(marking)
         else:
             n_children = self.tree_store.iter_n_children(self.current_iter)
             for i in range(n_children):
                 child = self.tree_store.iter_nth_child(self.current_iter, i)
                 marking = self.tree_store[child][4]
+                if marking is None:
+                    continue
                 marking.color = color
+                self.marking_changed_func(marking)
                 self.tree_store[child][5] = color
+            for marking in self.get_pending_markings(self.current_iter):
+                marking.color = color
+                self.marking_changed_func(marking)
         self.tree_store[self.current_iter][5] = color
         self.update_draw_markings_func()
 
     def on_jump_to_frame(self, button):
-        position = self.current_selection.marking[-1] * 1e-9
-        self.jump_to_frame_func(position)
+        marking = self.current_selection
+        if marking is None and self.current_iter is not None:
+            markings = self.get_markings(self.current_iter)
+            marking = markings[0] if markings else None
+        if marking is not None:
+            self.jump_to_frame_func(marking.marking[-1] * 1e-9)
 
     def on_show_hide(self, button, path):
         self._on_show_hide(path)
@@ -139,6 +161,7 @@ class GridHandler:
                 marking.hide = False
             else:
                 marking.hide = True
+            self.marking_changed_func(marking)
             self.tree_store[path][3] = not self.tree_store[path][3]
         else:
             tree_iter = self.tree_store.get_iter(path)
@@ -147,6 +170,9 @@ class GridHandler:
                 child = self.tree_store.iter_nth_child(tree_iter, i)
                 new_path = self.tree_store.get_path(child)
                 self._on_show_hide(new_path)
+            for marking in self.get_pending_markings(tree_iter):
+                marking.hide = not marking.hide
+                self.marking_changed_func(marking)
             self.tree_store[tree_iter][3] = not self.tree_store[tree_iter][3]
 
     def on_tree_change(self, selection):
@@ -167,11 +193,16 @@ class GridHandler:
             self.current_path = None
             self.current_name = None
 
-    def add_marking(self, marking):
+    @staticmethod
+    def get_marking_row(marking, name=''):
         time = str('%.1f' % (marking.marking[-1] * 1e-9))
         length = str('%.2f' % (marking.data[0]) if marking.data[0] else '')
+        return [name, time, length, marking.hide, marking, marking.color]
+
+    def add_marking(self, marking):
         tree_iter = self.tree_store.get_iter_from_string(self.current_path)
-        self.tree_store.append(tree_iter, [self.current_name, time, length, False, marking, marking.color])
+        self.materialise(tree_iter)
+        self.tree_store.append(tree_iter, self.get_marking_row(marking, self.current_name))
 
     def on_add(self, button):
         dialog = TrackerPopUp(self.window)
@@ -180,27 +211,137 @@ class GridHandler:
             name = dialog.get_text()
             dialog.destroy()
             tree_iter = self.tree_store.append(self.current_video_iter, [name, '', '', False, None, self.color])
+            self.name_dict.setdefault((self.current_video, name), tree_iter)
             self.tree_select.select_iter(tree_iter)
         else:
             dialog.destroy()
 
     def add_marking_from_csv(self, marking):
-        time = str('%.1f' % (marking.marking[-1] * 1e-9))
-        length = str('%.2f' % (marking.data[0]) if marking.data[0] else '')
+        """
+        Add a marking under its video and tracker name, creating them if needed.
+
+        Videos and names are found in video_dict and name_dict. The
+        marking rows of a name are only added to the tree when the name
+        is expanded, until then its markings wait in pending_markings
+        and a placeholder row gives the name an expander.
+        """
         video_name = marking.video.split(os.sep)[-1]
-        for video in self.tree_store:
-            if video_name == str(video[0]):
-                for name in video.iterchildren():
-                    if marking.name == str(name[0]):
-                        self.tree_store.append(name.iter, ['', time, length, False, marking, marking.color])
-                        return None
-                tree_iter = self.tree_store.append(video.iter, [marking.name, '', '', False, None, marking.color])
-                self.tree_store.append(tree_iter, ['', time, length, False, marking, marking.color])
-                return None
-        tree_iter1 = self.tree_store.append(None, [video_name, '', '', False, None, Gdk.RGBA()])
-        self.video_dict.update({video_name: tree_iter1})
-        tree_iter2 = self.tree_store.append(tree_iter1, [marking.name, '', '', False, None, marking.color])
-        self.tree_store.append(tree_iter2, ['', time, length, False, marking, marking.color])
+        video_iter = self.video_dict.get(video_name)
+        if video_iter is None:
+            video_iter = self.tree_store.append(None, [video_name, '', '', False, None, Gdk.RGBA()])
+            self.video_dict.update({video_name: video_iter})
+        key = (video_name, marking.name)
+        name_iter = self.name_dict.get(key)
+        if name_iter is None:
+            name_iter = self.tree_store.append(video_iter, [marking.name, '', '', False, None, marking.color])
+            self.name_dict[key] = name_iter
+        if key in self.pending_markings:
+            self.pending_markings[key].append(marking)
+        elif not self.tree_store.iter_has_child(name_iter):
+            self.pending_markings[key] = [marking]
+            self.tree_store.append(name_iter, ['', '', '', False, None, marking.color])
+        else:
+            self.tree_store.append(name_iter, self.get_marking_row(marking))
+
+    def get_name_key(self, tree_iter):
+        video_iter = self.tree_store.iter_parent(tree_iter)
+        if video_iter is None or self.tree_store.iter_parent(video_iter) is not None:
+            return None
+        return self.tree_store[video_iter][0], self.tree_store[tree_iter][0]
+
+    def get_pending_markings(self, tree_iter):
+        return self.pending_markings.get(self.get_name_key(tree_iter), [])
+
+    def get_markings(self, tree_iter):
+        """
+        Get the markings of a name node, also the ones not in the tree yet.
+        """
+        markings = []
+        child = self.tree_store.iter_children(tree_iter)
+        while child is not None:
+            if self.tree_store[child][4] is not None:
+                markings.append(self.tree_store[child][4])
+            child = self.tree_store.iter_next(child)
+        return markings + self.get_pending_markings(tree_iter)
+
+    def materialise(self, tree_iter):
+        """
+        Replace the placeholder row of a name node with its marking rows.
+        """
+        markings = self.pending_markings.pop(self.get_name_key(tree_iter), None)
+        if markings is None:
+            return
+        placeholder = self.tree_store.iter_children(tree_iter)
+        for marking in markings:
+            self.tree_store.append(tree_iter, self.get_marking_row(marking))
+        self.tree_store.remove(placeholder)
+
+    def materialise_video(self, video_iter):
+        child = self.tree_store.iter_children(video_iter)
+        while child is not None:
+            self.materialise(child)
+            child = self.tree_store.iter_next(child)
+
+    def find_marking(self, marking):
+        """
+        Get the row of a marking, materialising its name node if needed.
+        """
+        name_iter = self.name_dict.get((marking.video.split(os.sep)[-1], marking.name))
+        if name_iter is None:
+            return None
+        self.materialise(name_iter)
+        child = self.tree_store.iter_children(name_iter)
+        while child is not None:
+            if self.tree_store[child][4] is marking:
+                return child
+            child = self.tree_store.iter_next(child)
+        return None
+
+    def select_marking(self, marking):
+        tree_iter = self.find_marking(marking)
+        if tree_iter is not None:
+            path = self.tree_store.get_path(tree_iter)
+            self.tree_view.expand_to_path(path)
+            self.tree_select.select_iter(tree_iter)
+            self.tree_view.scroll_to_cell(path, None, False, 0, 0)
+
+    def update_marking(self, marking):
+        tree_iter = self.find_marking(marking)
+        if tree_iter is not None:
+            row = self.get_marking_row(marking)
+            self.tree_store[tree_iter][1] = row[1]
+            self.tree_store[tree_iter][2] = row[2]
+
+    def on_test_expand_row(self, tree_view, tree_iter, path):
+        self.materialise(tree_iter)
+        return False
+
+    def detach_model(self):
+        """
+        Detach the tree store from the view, so rows can be added without updating the view.
+        """
+        model, tree_iter = self.tree_select.get_selected()
+        self.selected_path = self.tree_store.get_path(tree_iter).to_string() if tree_iter else None
+        self.tree_view.set_model(None)
+
+    def attach_model(self):
+        self.tree_view.set_model(self.tree_store)
+        if self.current_video_iter is not None:
+            self.tree_view.expand_row(self.tree_store.get_path(self.current_video_iter), True)
+        if self.selected_path is not None:
+            try:
+                self.tree_select.select_iter(self.tree_store.get_iter_from_string(self.selected_path))
+            except ValueError:
+                pass
+            self.selected_path = None
+
+    def begin_bulk_load(self):
+        self.detach_model()
+
+    def end_bulk_load(self):
+        if self.current_video_iter is not None:
+            self.materialise_video(self.current_video_iter)
+        self.attach_model()
 
     def on_remove(self, button):
         if self.current_iter:
@@ -211,11 +352,11 @@ class GridHandler:
             self.tree_store.remove(self.current_iter)
 
     def remove_branch(self):
-        n_children = self.tree_store.iter_n_children(self.current_iter)
-        for i in range(n_children):
-            child = self.tree_store.iter_nth_child(self.current_iter, i)
-            marking = self.tree_store[child][4]
+        for marking in self.get_markings(self.current_iter):
             self.remove_marking_func(marking)
+        key = self.get_name_key(self.current_iter)
+        self.pending_markings.pop(key, None)
+        self.name_dict.pop(key, None)
 
     def on_status_button(self, button):
         self.popover.set_relative_to(button)
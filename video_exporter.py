@@ -0,0 +1,267 @@
+import os
+import sys
+import queue
+import threading
+import cv2
+import ffmpeg
+
+
+class FfmpegWriter:
+    """
+    Encode frames by piping them to ffmpeg.
+
+    The raw BGR frames are encoded by a multi-threaded x264, x265 or
+    MJPEG encoder. Audio and container metadata, like the location
+    tag, are copied from the same time range of the source video.
+    quality is the CRF for x264 and x265 and the q:v scale (2-31)
+    for MJPEG.
+    """
+    codecs = {'x264': 'libx264', 'x265': 'libx265', 'mjpeg': 'mjpeg'}
+
+    def __init__(self, export_file, frame_rate, frame_size, source_file, codec='x264', quality=23, preset='medium',
+                 start_time=0, duration=None):
+        if sys.platform == 'win32':
+            cmd = '.\\lib\\ffmpeg'
+        else:
+            cmd = 'ffmpeg'
+        frames = ffmpeg.input('pipe:', format='rawvideo', pix_fmt='bgr24', s='%dx%d' % frame_size, framerate=frame_rate)
+        source_args = {'ss': start_time}
+        if duration is not None:
+            source_args['t'] = duration
+        source = ffmpeg.input(source_file, **source_args)
+        # The source is always input 1, so its metadata is copied also
+        # when it has no audio stream to map.
+        streams = [frames['v'], source['a?']]
+        output_args = {'vcodec': self.codecs[codec], 'acodec': 'copy', 'map_metadata': 1, 'threads': 0}
+        if codec == 'mjpeg':
+            output_args.update({'pix_fmt': 'yuvj420p', 'q:v': min(max(int(quality), 2), 31)})
+        else:
+            output_args.update({'pix_fmt': 'yuv420p', 'crf': quality, 'preset': preset})
+        if os.path.splitext(export_file)[1].lower() in ('.mp4', '.mov'):
+            output_args['movflags'] = 'use_metadata_tags'
+        output = ffmpeg.output(*streams, export_file, **output_args).global_args('-loglevel', 'error').overwrite_output()
+        self.process = output.run_async(cmd=cmd, pipe_stdin=True)
+
+    def write(self, frame):
+        self.process.stdin.write(frame.data if frame.flags.c_contiguous else frame.tobytes())
+
+    def release(self):
+        self.process.stdin.close()
+        if self.process.wait() != 0:
+            raise RuntimeError('ffmpeg exited with code %d' % self.process.returncode)
+
+
+class VideoExporter:
+    """
+    Export a video with markings drawn on it, off the GTK main loop.
+
+    Decoding, drawing and encoding run in their own threads connected
+    by bounded queues, so the stages overlap and at most a few frames
+    are held in memory. OpenCV releases the GIL while decoding,
+    drawing and encoding, so the threads run in parallel. Frames are
+    drawn on in place, as every decoded frame is a new array.
+
+    With padding given only the annotated parts are exported, as
+    clips from padding seconds before the first to padding seconds
+    after the last marking of every group of markings closer than
+    twice the padding. The decoder seeks to the start of every clip.
+    With split_by_name every tracked name gets its own clips.
+
+    The frames are encoded by OpenCV as XVID, or with encoder set to
+    one of FfmpegWriter.codecs by ffmpeg with the given quality and
+    preset.
+
+    frames_done, finished, cancelled and error can be polled from the
+    GUI while the export runs.
+    """
+    queue_size = 8
+    encoders = ('opencv',) + tuple(FfmpegWriter.codecs)
+
+    def __init__(self, video_input_file, video_export_file, get_frame_buckets, draw_marking_on_frame, time_tolerance=None,
+                 padding=None, split_by_name=False, encoder='opencv', quality=23, preset='medium'):
+        self.video_input_file = video_input_file
+        self.encoder = encoder
+        self.quality = quality
+        self.preset = preset
+        self.video_export_file = video_export_file
+        self.draw_marking_on_frame = draw_marking_on_frame
+        self.cap = cv2.VideoCapture(video_input_file)
+        self.frame_rate = self.cap.get(cv2.CAP_PROP_FPS)
+        self.frame_width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.frame_height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.frame_count = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        buckets = get_frame_buckets(video_input_file, self.frame_rate, time_tolerance)
+        if padding is None:
+            self.clips = [(video_export_file, 0, None, buckets)]
+            self.frame_num = self.frame_count
+        else:
+            self.clips = self.get_clips(buckets, int(round(padding * self.frame_rate)), split_by_name)
+            self.frame_num = sum(end - start for _, start, end, _ in self.clips)
+        self.frames_done = 0
+        self.finished = False
+        self.cancelled = False
+        self.error = None
+        self.cancel_event = threading.Event()
+        self.threads = []
+
+    def get_clips(self, buckets, padding_frames, split_by_name):
+        """
+        Get export file, start frame, end frame and markings of every clip.
+        """
+        if split_by_name:
+            names = sorted(set(marking.name for bucket in buckets.values() for _, marking in bucket), key=str)
+            groups = [(name, {frame: [(kind, marking) for kind, marking in bucket if marking.name == name]
+                              for frame, bucket in buckets.items()}) for name in names]
+        else:
+            groups = [(None, buckets)]
+        base, extension = os.path.splitext(self.video_export_file)
+        clips = []
+        for name, group_buckets in groups:
+            frames = [frame for frame, bucket in group_buckets.items() if bucket]
+            for clip_idx, (start, end) in enumerate(self.get_segments(frames, padding_frames)):
+                clip_base = base if name is None else '%s_%s' % (base, str(name).replace(os.sep, '_'))
+                clip_file = '%s_%03d%s' % (clip_base, clip_idx, extension)
+                clips.append((clip_file, start, end, group_buckets))
+        return clips
+
+    def get_segments(self, frames, padding_frames):
+        """
+        Pad the annotated frames and merge overlapping ranges into segments [start, end).
+        """
+        segments = []
+        for frame in sorted(frames):
+            start = max(frame - padding_frames, 0)
+            end = frame + padding_frames + 1
+            if self.frame_count > 0:
+                end = min(end, self.frame_count)
+            if start >= end:
+                continue
+            if segments and start <= segments[-1][1]:
+                segments[-1][1] = max(segments[-1][1], end)
+            else:
+                segments.append([start, end])
+        return [tuple(segment) for segment in segments]
+
+    def start(self):
+        decoded_frames = queue.Queue(self.queue_size)
+        drawn_frames = queue.Queue(self.queue_size)
+        self.threads = [threading.Thread(target=self.run_stage, args=(self.decode, None, decoded_frames), daemon=True),
+                        threading.Thread(target=self.run_stage, args=(self.draw, decoded_frames, drawn_frames), daemon=True),
+                        threading.Thread(target=self.run_stage, args=(self.encode, drawn_frames, None), daemon=True)]
+        for thread in self.threads:
+            thread.start()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def join(self):
+        for thread in self.threads:
+            thread.join()
+
+    def put(self, out_queue, item):
+        while not self.cancel_event.is_set():
+            try:
+                out_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def get(self, in_queue):
+        while not self.cancel_event.is_set():
+            try:
+                return in_queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        return None
+
+    def run_stage(self, stage, in_queue, out_queue):
+        """
+        Run a stage and pass the end of the frames on to the next one.
+
+        The last stage sets finished when it is done, after any error
+        of the export has been stored, so error is final once the GUI
+        sees finished.
+        """
+        try:
+            try:
+                stage(in_queue, out_queue)
+            except Exception as e:
+                self.error = e
+                self.cancel_event.set()
+            if out_queue is not None:
+                self.put(out_queue, None)
+        finally:
+            if out_queue is None:
+                self.cancelled = self.cancel_event.is_set()
+                self.finished = True
+
+    def decode(self, _, out_queue):
+        try:
+            for clip_idx, (_, start, end, _) in enumerate(self.clips):
+                if start > 0 or clip_idx > 0:
+                    self.cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+                frame_idx = start
+                while not self.cancel_event.is_set() and (end is None or frame_idx < end):
+                    ret, frame = self.cap.read()
+                    if not ret:
+                        break
+                    if not self.put(out_queue, (clip_idx, frame_idx, frame)):
+                        break
+                    frame_idx += 1
+                if self.cancel_event.is_set():
+                    break
+        finally:
+            self.cap.release()
+
+    def draw(self, in_queue, out_queue):
+        while True:
+            item = self.get(in_queue)
+            if item is None:
+                break
+            clip_idx, frame_idx, frame = item
+            for kind, marking in self.clips[clip_idx][3].get(frame_idx, []):
+                self.draw_marking_on_frame(frame, kind, marking)
+            if not self.put(out_queue, item):
+                break
+
+    def get_writer(self, clip_idx):
+        clip_file, start, end, _ = self.clips[clip_idx]
+        frame_size = (self.frame_width, self.frame_height)
+        if self.encoder == 'opencv':
+            return cv2.VideoWriter(clip_file, cv2.VideoWriter_fourcc(*'XVID'), self.frame_rate, frame_size)
+        duration = None if end is None else (end - start) / self.frame_rate
+        return FfmpegWriter(clip_file, self.frame_rate, frame_size, self.video_input_file, self.encoder, self.quality, self.preset,
+                            start / self.frame_rate, duration)
+
+    def encode(self, in_queue, _):
+        out = None
+        out_clip_idx = None
+        try:
+            while True:
+                item = self.get(in_queue)
+                if item is None:
+                    break
+                clip_idx, _, frame = item
+                if clip_idx != out_clip_idx:
+                    if out is not None:
+                        out, previous_out = None, out
+                        previous_out.release()
+                    out = self.get_writer(clip_idx)
+                    out_clip_idx = clip_idx
+                out.write(frame)
+                self.frames_done += 1
+        finally:
+            if out is not None:
+                self.release_writer(out)
+
+    def release_writer(self, out):
+        """
+        Release a writer, recording an error of ffmpeg instead of raising it.
+        """
+        try:
+            out.release()
+        except (OSError, RuntimeError) as e:
+            if self.error is None:
+                self.error = e
+            self.cancel_event.set()